@@ -1,7 +1,12 @@
 from openai import OpenAI
 import os
+import sys
 from dotenv import load_dotenv
 
+# Add src directory to path for the shared LLM cache
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from api.llm_cache import cached_completion
+
 # 1. Load the .env file first
 load_dotenv()
 
@@ -15,14 +20,16 @@ client = OpenAI(api_key=open_ai_api_key)
 
 # 4. Function to ask a question
 def ask_openai(question):
-    response = client.chat.completions.create(
-        model="gpt-5-nano",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": question}
-        ],
-    )
-    return response.choices[0].message.content
+    model = "gpt-5-nano"
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": question}
+    ]
+
+    def generate():
+        response = client.chat.completions.create(model=model, messages=messages)
+        return response.choices[0].message.content
+    return cached_completion("openai", model, messages, generate)
 
 # Example usage
 # question = "What is the capital of France?"
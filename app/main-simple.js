@@ -299,7 +299,7 @@ function sendEmailReport() {
   .then(response => response.json())
   .then(data => {
     if (data.success) {
-      showToast(`Analysis report sent successfully to ${email}`, 'success');
+      showToast(`Analysis report queued for delivery to ${email}`, 'success');
       modal.remove();
     } else {
       throw new Error(data.error || 'Failed to send email');
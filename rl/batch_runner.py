@@ -0,0 +1,199 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import importlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+
+# ---------------------- Batch Runner ----------------------
+# Runs a per-feature pipeline over a spreadsheet with several rows in flight at once.
+# Every finished row is appended to the output immediately, so an interrupted run
+# can be restarted with the same arguments and only the missing rows are processed.
+#
+#   python rl/batch_runner.py reasoning features.xlsx results.csv --concurrency 4
+#   python rl/batch_runner.py reward features.xlsx results_parquet/ --format parquet
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from api.llm_scheduler import llm_priority, PRIORITIES
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# pipeline name -> (module, row function, result columns)
+PIPELINES = {
+    "reasoning": (
+        "llama_reasoning_generation", "process_feature",
+        ["classification", "ollama_reasoning", "related_regulation", "retrieved_sources", "retrieval_score",
+         "entities_ms", "retrieval_ms", "classify_ms"]
+    ),
+    "reward": (
+        "gemini_and_llama_classifer_generator", "score_feature",
+        ["ollama_classification", "gemini_classification", "reward", "related_regulation", "retrieval_score",
+         "entities_ms", "retrieval_ms", "ollama_ms", "gemini_ms"]
+    ),
+}
+BASE_COLUMNS = ["row_id", "feature_name", "feature_description", "status", "error", "started_at", "duration_ms"]
+
+# ---------------------- Output Writers ----------------------
+
+class CsvOutput:
+    """Append-only CSV: one line per finished row, flushed as soon as it is written."""
+
+    def __init__(self, path: str, columns: list):
+        self.path = path
+        self.columns = columns
+        self._lock = threading.Lock()
+
+    def completed(self) -> dict:
+        """{row_id: status} for rows already in the file; a later line for the same row wins."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return {}
+        # A crash can leave a torn last line; skip anything unparsable
+        df = pd.read_csv(self.path, usecols=["row_id", "status"], on_bad_lines="skip")
+        df = df.dropna(subset=["row_id", "status"])
+        return dict(zip(df["row_id"].astype(int), df["status"]))
+
+    def append(self, record: dict):
+        line = pd.DataFrame([record], columns=self.columns)
+        with self._lock:
+            write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, "a", encoding="utf-8", newline="") as f:
+                line.to_csv(f, header=write_header, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class ParquetOutput:
+    """
+    Directory of single-row Parquet part files named by row id. Retrying a row
+    replaces its part file; read the whole directory with pd.read_parquet(path).
+    """
+
+    def __init__(self, path: str, columns: list):
+        self.path = path
+        self.columns = columns
+        os.makedirs(path, exist_ok=True)
+
+    def _part_path(self, row_id: int) -> str:
+        return os.path.join(self.path, f"part-{row_id:06d}.parquet")
+
+    def completed(self) -> dict:
+        status = {}
+        for part in glob.glob(os.path.join(self.path, "part-*.parquet")):
+            try:
+                df = pd.read_parquet(part, columns=["row_id", "status"])
+            except Exception:
+                continue  # partially written part: the row is redone
+            status.update(zip(df["row_id"].astype(int), df["status"]))
+        return status
+
+    def append(self, record: dict):
+        part_path = self._part_path(record["row_id"])
+        tmp_path = part_path + ".tmp"
+        pd.DataFrame([record], columns=self.columns).astype({"error": "string"}).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, part_path)
+
+# ---------------------- Running ----------------------
+
+def load_features(input_path: str) -> pd.DataFrame:
+    """Read the input sheet; rows keep their position in the file as row_id."""
+    if input_path.lower().endswith(".csv"):
+        df = pd.read_csv(input_path)
+    else:
+        df = pd.read_excel(input_path)
+    missing = {"feature_name", "feature_description"} - set(df.columns)
+    if missing:
+        raise ValueError(f"Input is missing columns: {', '.join(sorted(missing))}")
+    return df.reset_index(drop=True)
+
+def run_row(row_fn, priority: str, row_id: int, feature_name: str, feature_description: str) -> dict:
+    """Run the pipeline for one row; failures are recorded in the row instead of raised."""
+    llm_priority.set(priority)  # worker threads start from an empty context
+    record = {
+        "row_id": row_id,
+        "feature_name": feature_name,
+        "feature_description": feature_description,
+        "started_at": datetime.now().isoformat(timespec="seconds")
+    }
+    start = time.perf_counter()
+    try:
+        record.update(row_fn(feature_name, feature_description))
+        record["status"] = "ok"
+        record["error"] = ""
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+def run_batch(pipeline: str, input_path: str, output_path: str, output_format: str = "csv",
+              concurrency: int = BATCH_CONCURRENCY, retry_errors: bool = False, limit: int = None,
+              priority: str = "batch") -> dict:
+    """
+    Process every row of input_path not yet completed in output_path.
+    LLM calls are scheduled at the given priority, behind interactive API traffic by default.
+    Returns counts of rows processed, skipped and failed in this run.
+    """
+    module_name, fn_name, result_columns = PIPELINES[pipeline]
+    columns = BASE_COLUMNS + result_columns
+    output = ParquetOutput(output_path, columns) if output_format == "parquet" else CsvOutput(output_path, columns)
+
+    df = load_features(input_path)
+    done = output.completed()
+    pending = [
+        (row_id, row.feature_name, row.feature_description)
+        for row_id, row in enumerate(df.itertuples(index=False))
+        if row_id not in done or (retry_errors and done[row_id] != "ok")
+    ]
+    skipped = len(df) - len(pending)
+    if limit is not None:
+        pending = pending[:limit]
+    print(f"{len(df)} rows in {input_path}: {skipped} already done, {len(pending)} to run")
+    if not pending:
+        return {"processed": 0, "skipped": skipped, "failed": 0}
+
+    # Imported here: the pipeline modules connect to Qdrant on import
+    row_fn = getattr(importlib.import_module(module_name), fn_name)
+
+    failed = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_row, row_fn, priority, *row) for row in pending]
+        for i, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            output.append(record)
+            if record["status"] != "ok":
+                failed += 1
+                print(f"[ERROR] Row {record['row_id']}: {record['error']}")
+            elapsed = time.perf_counter() - started
+            print(f"[{i}/{len(pending)}] row {record['row_id']} {record['status']} "
+                  f"in {record['duration_ms'] / 1000:.1f}s ({i / elapsed:.2f} rows/s)")
+
+    return {"processed": len(pending), "skipped": skipped, "failed": failed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an RL/evaluation pipeline over a feature spreadsheet, resumably.")
+    parser.add_argument("pipeline", choices=sorted(PIPELINES), help="per-feature pipeline to run")
+    parser.add_argument("input", help="xlsx or csv with feature_name and feature_description columns")
+    parser.add_argument("output", help="CSV file, or directory for --format parquet")
+    parser.add_argument("--format", dest="output_format", choices=["csv", "parquet"],
+                        help="output format (default: parquet if output ends with / or .parquet, else csv)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="rows in flight at once")
+    parser.add_argument("--retry-errors", action="store_true", help="rerun rows whose last attempt failed")
+    parser.add_argument("--limit", type=int, help="process at most this many pending rows")
+    parser.add_argument("--priority", default="batch", choices=sorted(PRIORITIES), help="LLM scheduling class")
+    args = parser.parse_args()
+
+    output_format = args.output_format
+    if output_format is None:
+        output_format = "parquet" if args.output.endswith(("/", ".parquet")) else "csv"
+
+    summary = run_batch(args.pipeline, args.input, args.output, output_format,
+                        concurrency=args.concurrency, retry_errors=args.retry_errors, limit=args.limit,
+                        priority=args.priority)
+    print(f"Done: {summary['processed']} processed, {summary['failed']} failed, {summary['skipped']} skipped")
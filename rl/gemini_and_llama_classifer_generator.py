@@ -2,10 +2,19 @@ import os
 import requests
 from qdrant_client import QdrantClient
 from dotenv import load_dotenv
-import google.generativeai as genai
 import json
+import time
+import sys
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
+# Add src directory to path for shared api modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from api.gemini_api import get_gemini_client
+from api.llm_scheduler import get_scheduler
+from api.llm_cache import cached_completion, LLMCacheMiss
+
 # ---------------------- Load Environment ----------------------
 load_dotenv()
 QDRANT_ENDPOINT = os.getenv("QDRANT_ENDPOINT")
@@ -44,11 +53,14 @@ def query_qdrant(embedding: list, collection_name: str, top_k: int = 5):
     return results
 
 def chat_with_ollama(messages: list) -> str:
-    """Send messages to Ollama chat model and return response."""
-    payload = {"model": OLLAMA_CHAT_MODEL, "messages": messages, "stream": False}
-    response = requests.post(f"{OLLAMA_URL}/api/chat", json=payload)
-    response.raise_for_status()
-    return response.json()["message"]["content"]
+    """Send messages to Ollama chat model and return response (served from the LLM cache when recorded)."""
+    def generate():
+        payload = {"model": OLLAMA_CHAT_MODEL, "messages": messages, "stream": False}
+        with get_scheduler("ollama_chat").slot():
+            response = requests.post(f"{OLLAMA_URL}/api/chat", json=payload)
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+    return cached_completion("ollama", OLLAMA_CHAT_MODEL, messages, generate)
 
 # ---------------------- Source Mapping ----------------------
 SOURCE_COLLECTION_MAP = {
@@ -121,8 +133,8 @@ def retrieve_best_regulation_text(feature_description: str, top_k: int = 3):
     Returns a list of dicts: [{"collection": ..., "source_file": ..., "texts": [...]}]
     """
     results = []
+    embedding = get_embedding(feature_description)
     for source_file, collection_name in SOURCE_COLLECTION_MAP.items():
-        embedding = get_embedding(feature_description)
         top_docs = query_qdrant(embedding, collection_name, top_k=top_k)
         texts = [doc.payload.get("text", "") for doc in top_docs if "text" in doc.payload]
         if texts:
@@ -183,10 +195,7 @@ def classify_stage_gemini(entities: str, regulation_context: str, feature_desc:
     Output JSON with keys: classification, reasoning, related_regulation.
     The output should be a single JSON object.
     """
-    genai.configure(api_key=GEMINI_KEY)
     try:
-        model_name = "models/gemini-2.0-flash-exp"
-        model = genai.GenerativeModel(model_name)
         prompt = f"""
         Feature Description:
         {feature_desc}
@@ -213,9 +222,10 @@ def classify_stage_gemini(entities: str, regulation_context: str, feature_desc:
 
         - Do not create lists or nested objects. Combine all reasoning into one string.
         """
-        response = model.generate_content(prompt)
+        # Shared client: pooled connection, rate limited and retried on 429
+        response_text = get_gemini_client().generate(prompt)
         # --- Clean Gemini output before parsing ---
-        text = response.text.strip()
+        text = response_text.strip()
         if text.startswith("```"):
             lines = text.splitlines()
             lines = [line for line in lines if not line.strip().startswith("```") and not line.strip().endswith("```")]
@@ -224,6 +234,8 @@ def classify_stage_gemini(entities: str, regulation_context: str, feature_desc:
             return json.loads(text)
         except Exception:
             return {"classification": "Maybe", "reasoning": "Gemini output not valid JSON", "related_regulation": ""}
+    except LLMCacheMiss:
+        raise  # replay mode must fail loudly, not score a made-up "Maybe"
     except Exception as e:
         print("Gemini model error:", e)
         return {"classification": "Maybe", "reasoning": "Gemini model error", "related_regulation": ""}
@@ -244,9 +256,78 @@ def compute_reward(ollama_result, gemini_result):
     else:
         return -5  
 
+# Runs the two classifiers of a row side by side; sized for a few rows in flight at once
+CLASSIFIER_WORKERS = int(os.getenv("CLASSIFIER_WORKERS", "8"))
+_classifier_pool = ThreadPoolExecutor(max_workers=CLASSIFIER_WORKERS)
+
+def _timed(fn, *args):
+    """Call fn and return (result, elapsed milliseconds)."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+def score_feature(feature_name: str, feature_description: str) -> dict:
+    """
+    Run the reward pipeline for one feature: entities, retrieval, Ollama and Gemini
+    classification, and the reward comparing them. Stage timings are returned as *_ms.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    # Step 1: Extract entities
+    entities = extract_entities(feature_name, feature_description)
+    timings["entities_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    # Step 2: Search all laws for best match
+    start = time.perf_counter()
+    regulation_results = retrieve_best_regulation_text(feature_description, top_k=3)
+    if not regulation_results:
+        regulation_context = ""
+        related_regulation = ""
+        retrieval_score = None
+    else:
+        best = regulation_results[0]
+        regulation_context = "\n\n".join(best["texts"])
+        related_regulation = best["source_file"]
+        retrieval_score = best["score"]
+    timings["retrieval_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    # Steps 3 and 4: Ollama and Gemini classify concurrently, so a row takes as long as the slower model
+    # (run in a copy of this thread's context so the row's LLM priority carries over)
+    ollama_future = _classifier_pool.submit(contextvars.copy_context().run, _timed, classify_stage,
+                                            entities, feature_description, regulation_context)
+    gemini_future = _classifier_pool.submit(contextvars.copy_context().run, _timed, classify_stage_gemini,
+                                            entities, regulation_context, feature_description)
+    classification, timings["ollama_ms"] = ollama_future.result()
+    gemini_result, timings["gemini_ms"] = gemini_future.result()
+
+    try:
+        ollama_result = json.loads(classification)
+        ollama_cls = ollama_result.get("classification", "")
+    except Exception:
+        ollama_result = {"classification": "Maybe", "reasoning": "Ollama output not valid JSON", "related_regulation": ""}
+        ollama_cls = "Maybe"
+
+    gemini_cls = gemini_result.get("classification", "")
+    if gemini_cls == "":
+        print(f"Gemini classification is empty for feature '{feature_name}'. Reasoning: {gemini_result.get('reasoning', '')}")
+
+    # Step 5: Reward calculation
+    reward = compute_reward(ollama_result, gemini_result)
+
+    return {
+        "ollama_classification": ollama_cls,
+        "gemini_classification": gemini_cls,
+        "reward": reward,
+        "related_regulation": related_regulation,
+        "retrieval_score": retrieval_score,
+        **timings
+    }
+
 # ---------------------- Example Usage ----------------------
 if __name__ == "__main__":
     # Read features from Excel file
+    # For concurrent, resumable runs use: python rl/batch_runner.py reward <input> <output>
     input_path = "/Users/caophuong/Documents/features.xlsx"
     output_path = "/Users/caophuong/Documents/features_analysis.csv"
     df = pd.read_excel(input_path)
@@ -257,51 +338,21 @@ if __name__ == "__main__":
         feature_description = row["feature_description"]
 
         try:
-            # Step 1: Extract entities
-            entities = extract_entities(feature_name, feature_description)
-
-            # Step 2: Search all laws for best match
-            regulation_results = retrieve_best_regulation_text(feature_description, top_k=3)
-            if not regulation_results:
-                regulation_context = ""
-                related_regulation = ""
-            else:
-                best = regulation_results[0]
-                regulation_context = "\n\n".join(best["texts"])
-                related_regulation = best["source_file"]
-
-            # Step 3: Classification (Ollama)
-            import json
-            classification = classify_stage(entities, feature_description, regulation_context)
-            try:
-                ollama_result = json.loads(classification)
-                ollama_cls = ollama_result.get("classification", "")
-            except Exception:
-                ollama_result = {"classification": "Maybe", "reasoning": "Ollama output not valid JSON", "related_regulation": ""}
-                ollama_cls = "Maybe"
-
-            # Step 4: Classification (Gemini)
-            gemini_result = classify_stage_gemini(entities, regulation_context, feature_description)
-            gemini_cls = gemini_result.get("classification", "")
-            if gemini_cls == "":
-                print(f"Gemini classification is empty for feature '{feature_name}'. Reasoning: {gemini_result.get('reasoning', '')}")
-
-            # Step 5: Reward calculation
-            reward = compute_reward(ollama_result, gemini_result)
+            scored = score_feature(feature_name, feature_description)
 
             # Debug output for each row
             print(f"[DEBUG] Row {idx}: feature_name='{feature_name}'")
-            print(f"        Ollama classification: {ollama_cls}")
-            print(f"        Gemini classification: {gemini_cls}")
-            print(f"        Reward: {reward}")
+            print(f"        Ollama classification: {scored['ollama_classification']}")
+            print(f"        Gemini classification: {scored['gemini_classification']}")
+            print(f"        Reward: {scored['reward']}")
 
             # Store result
             results.append({
                 "feature_name": feature_name,
                 "feature_description": feature_description,
-                "ollama_classification": ollama_cls,
-                "gemini_classification": gemini_cls,
-                "reward": reward
+                "ollama_classification": scored["ollama_classification"],
+                "gemini_classification": scored["gemini_classification"],
+                "reward": scored["reward"]
             })
         except Exception as e:
             print(f"[ERROR] Row {idx}: feature_name='{feature_name}' Exception: {e}")
@@ -316,4 +367,3 @@ if __name__ == "__main__":
     # Save results to CSV
     out_df = pd.DataFrame(results)
     out_df.to_csv(output_path, index=False)
-    print(f"Analysis complete. Results saved to {output_path}")
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
 import requests
 from qdrant_client import QdrantClient
+from qdrant_client.http.models import Filter, FieldCondition, MatchAny, IsEmptyCondition, PayloadField
 from dotenv import load_dotenv
 import google.generativeai as genai
 import json
@@ -12,6 +13,22 @@ import jsonschema
 import numpy as np
 import nltk
 import pandas as pd
+import sys
+import time
+
+# Add src directory to path for shared api/config modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import api.qdrant_api as qdrant_api
+from docstore import get_docstore
+from api.llm_scheduler import get_scheduler
+from api.llm_cache import cached_completion
+from api.embedding_batcher import get_embedding_batcher
+from cascade import run_cascade
+from router import get_router, SECTION_FIELD
+from api.health_monitor import (
+    get_breaker, qdrant_dependency, OLLAMA_CHAT, OLLAMA_CHAT_TIMEOUT_SECONDS, QDRANT_TIMEOUT_SECONDS
+)
+from deadline import call_timeout, raise_if_expired, budget_is_short
 
 # ---------------------- Load Environment ----------------------
 load_dotenv()
@@ -29,33 +46,87 @@ GEMINI_KEY = os.getenv("GEMINI_API_KEY")
 # ---------------------- Initialize Qdrant ----------------------
 qdrant_client = QdrantClient(
     url=QDRANT_ENDPOINT,
-    api_key=QDRANT_API_KEY
+    api_key=QDRANT_API_KEY,
+    timeout=QDRANT_TIMEOUT_SECONDS
 )
 
 # ---------------------- Helper Functions ----------------------
 
 def get_embedding(text: str):
-    """Get embedding from Ollama server for semantic search."""
-    payload = {"model": OLLAMA_EMBED_MODEL, "prompt": text}
-    response = requests.post(f"{OLLAMA_URL}/api/embeddings", json=payload)
-    response.raise_for_status()
-    return response.json()["embedding"]
-
-def query_qdrant(embedding: list, collection_name: str, top_k: int = 5):
-    """Search Qdrant collection for top-k similar documents."""
-    results = qdrant_client.search(
-        collection_name=collection_name,
-        query_vector=embedding,
-        limit=top_k
-    )
-    return results
-
-def chat_with_ollama(messages: list) -> str:
-    """Send messages to Ollama chat model and return response."""
-    payload = {"model": OLLAMA_CHAT_MODEL, "messages": messages, "stream": False}
-    response = requests.post(f"{OLLAMA_URL}/api/chat", json=payload)
-    response.raise_for_status()
-    return response.json()["message"]["content"]
+    """
+    Get embedding from Ollama server for semantic search. Calls from concurrent
+    requests are micro-batched into one /api/embed request.
+    """
+    return get_embedding_batcher().embed(text)
+
+def query_qdrant(embedding: list, collection_name: str, top_k: int = 5, profile: str = None, with_payload=True,
+                 sections: list = None):
+    """
+    Search Qdrant collection for top-k similar documents using the profile's search params.
+    Pass with_payload=False to get back only ids and scores, and sections to search only
+    chunks whose metadata.section_number is one of them; chunks without a section number
+    (preambles, recitals, sources chunked without section headers) always stay searchable.
+    """
+    query_filter = None
+    if sections:
+        section_key = f"metadata.{SECTION_FIELD}"
+        query_filter = Filter(should=[
+            FieldCondition(key=section_key, match=MatchAny(any=sections)),
+            IsEmptyCondition(is_empty=PayloadField(key=section_key))
+        ])
+    with get_breaker(qdrant_dependency(collection_name)).protect():
+        timeout = call_timeout(QDRANT_TIMEOUT_SECONDS, f"search of {collection_name}")
+        try:
+            return qdrant_api.query_qdrant(qdrant_client, embedding, collection_name, top_k=top_k,
+                                           profile=profile, with_payload=with_payload, query_filter=query_filter,
+                                           timeout=max(1, int(timeout)))
+        except Exception:
+            raise_if_expired(f"search of {collection_name}")
+            raise
+
+def fetch_texts(collection_name: str, top_docs: list) -> list:
+    """
+    Fetch chunk texts for ranked points, in order. Texts come from the local docstore,
+    where each hit is expanded to its parent section or neighbouring chunks within the
+    context budget; points missing from it (e.g. ingested before the docstore existed)
+    are fetched from Qdrant with only the text field.
+    """
+    ids = [str(doc.id) for doc in top_docs]
+    docstore = get_docstore()
+    found = docstore.get_many(ids)
+    missing = [point_id for point_id in ids if point_id not in found]
+    if not missing:
+        return docstore.expand(ids)
+    with get_breaker(qdrant_dependency(collection_name)).protect():
+        timeout = call_timeout(QDRANT_TIMEOUT_SECONDS, f"retrieve from {collection_name}")
+        records = qdrant_client.retrieve(collection_name=collection_name, ids=missing, with_payload=["text"],
+                                         timeout=max(1, int(timeout)))
+    for record in records:
+        if record.payload and "text" in record.payload:
+            found[str(record.id)] = {"text": record.payload["text"]}
+    return [found[point_id]["text"] for point_id in ids if point_id in found]
+
+def chat_with_ollama(messages: list, model: str = None, options: dict = None) -> str:
+    """
+    Send messages to an Ollama chat model (OLLAMA_CHAT_MODEL unless given) and return response.
+    Served from the LLM cache when recorded.
+    """
+    model = model or OLLAMA_CHAT_MODEL
+    def generate():
+        payload = {"model": model, "messages": messages, "stream": False}
+        if options:
+            payload["options"] = options
+        with get_breaker(OLLAMA_CHAT).protect():
+            with get_scheduler("ollama_chat").slot():
+                timeout = call_timeout(OLLAMA_CHAT_TIMEOUT_SECONDS, "chat")
+                try:
+                    response = requests.post(f"{OLLAMA_URL}/api/chat", json=payload, timeout=timeout)
+                except requests.Timeout:
+                    raise_if_expired("chat")
+                    raise
+            response.raise_for_status()
+        return response.json()["message"]["content"]
+    return cached_completion("ollama", model, messages, generate, options=options)
 
 # ---------------------- Source Mapping ----------------------
 SOURCE_COLLECTION_MAP = {
@@ -67,6 +138,16 @@ SOURCE_COLLECTION_MAP = {
 }
 
 # ---------------------- Pipeline Steps ----------------------
+# Both LLM steps run through the small-model cascade (src/cascade.py); these decide
+# whether a small-model answer is usable and what its samples have to agree on.
+
+def _entities_label(entities: dict):
+    location = entities.get("location", "")
+    return location.strip().upper() if isinstance(location, str) else None
+
+def _classification_label(result: dict):
+    classification = str(result.get("classification", "")).strip().capitalize()
+    return classification if classification in ("Yes", "No") else None
 
 def extract_entities(feature_name: str, feature_description: str):
     """Extract structured entities from feature using LLM."""
@@ -94,42 +175,65 @@ def extract_entities(feature_name: str, feature_description: str):
         {"role": "system", "content": "You are an expert compliance entity extractor."},
         {"role": "user", "content": prompt}
     ]
-    return chat_with_ollama(messages)
+    return run_cascade("extract_entities", chat_with_ollama, messages, _entities_label)
 
 def retrieve_best_regulation_text(feature_description, entities, top_k):
     """
     Search only the relevant collection (based on entities['location']) and 
-    return top-k matching texts.
+    return top-k matching texts. Without a usable location, the centroid router picks
+    the few most likely collections (and sections) to search instead of all of them;
+    collections whose circuit is open (or that fail) are skipped there, as are all but the
+    first collection with results when the deadline budget is short.
     """
     embedding = get_embedding(feature_description)
 
     target_collection = None
     target_source = None
-    for source_file, collection_name in SOURCE_COLLECTION_MAP.items():
-        if entities.get("location", "").lower() in source_file.lower():
-            target_collection = collection_name
-            target_source = source_file
-            break
+    location = entities.get("location", "")
+    location = location.strip().upper() if isinstance(location, str) else ""
+    if location in SOURCE_COLLECTION_MAP:
+        target_collection = SOURCE_COLLECTION_MAP[location]
+        target_source = location
 
     if not target_collection:
-        # fallback: pick all, but keep only the best collection (like before)
-        results = []
-        for source_file, collection_name in SOURCE_COLLECTION_MAP.items():
-            top_docs = query_qdrant(embedding, collection_name, top_k=top_k)
-            texts = [doc.payload.get("text", "") for doc in top_docs if "text" in doc.payload]
+        # fallback: search the routed collections (every collection if no centroids are built)
+        # with ids and scores only, then fetch texts for the best collection
+        source_by_collection = {collection: source for source, collection in SOURCE_COLLECTION_MAP.items()}
+        router = get_router()
+        routes = router.route(embedding, collections=source_by_collection) if router is not None else []
+        if not routes:
+            routes = [{"collection": collection, "sections": None} for collection in source_by_collection]
+
+        candidates = []
+        errors = []
+        for route in routes:
+            collection_name = route["collection"]
+            try:
+                top_docs = query_qdrant(embedding, collection_name, top_k=top_k, with_payload=False,
+                                        sections=route["sections"])
+            except Exception as e:
+                errors.append(e)
+                continue
+            if top_docs:
+                candidates.append((top_docs[0].score, collection_name, source_by_collection[collection_name], top_docs))
+                if budget_is_short():
+                    break
+        if errors and not candidates:
+            raise errors[0]
+        for score, collection_name, source_file, top_docs in sorted(candidates, key=lambda x: x[0], reverse=True):
+            texts = fetch_texts(collection_name, top_docs)
             if texts:
-                results.append({
+                return [{   # only keep the best collection
                     "collection": collection_name,
                     "source_file": source_file,
                     "texts": texts,
-                    "score": top_docs[0].score if top_docs else 0
-                })
-        results = sorted(results, key=lambda x: x["score"], reverse=True)
-        return results[:1]   # only keep the best collection
+                    "score": score
+                }]
+        return []
 
     # if we know the right collection, query only it
-    top_docs = query_qdrant(embedding, target_collection, top_k=top_k)
-    texts = [doc.payload.get("text", "") for doc in top_docs if "text" in doc.payload]
+    top_docs = query_qdrant(embedding, target_collection, top_k=top_k, with_payload=False)
+    texts = fetch_texts(target_collection, top_docs)
 
     return [{
         "collection": target_collection,
@@ -171,7 +275,57 @@ def classify_stage(entities: str, regulation_context: str):
         {"role": "system", "content": "You are a compliance classifier."},
         {"role": "user", "content": prompt}
     ]
-    return chat_with_ollama(messages)
+    return run_cascade("classify_stage", chat_with_ollama, messages, _classification_label)
+
+def process_feature(feature_name: str, feature_description: str) -> dict:
+    """
+    Run the reasoning pipeline for one feature: entities, retrieval and Ollama classification.
+    Returns the classification fields plus retrieval details and per-stage timings (*_ms).
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    # Step 1: Extract entities
+    entities = json.loads(extract_entities(feature_name, feature_description))
+    timings["entities_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    # Step 2: Search all laws for best match
+    start = time.perf_counter()
+    regulation_results = retrieve_best_regulation_text(feature_description, entities, top_k=3)
+    if not regulation_results:
+        regulation_context = ""
+        retrieved_sources = ""
+        retrieval_score = None
+    else:
+        # combine top 3 collections’ texts
+        regulation_context = "\n\n".join(
+            "\n\n".join(r["texts"]) for r in regulation_results
+        )
+        retrieved_sources = ", ".join(r["source_file"] for r in regulation_results)
+        retrieval_score = regulation_results[0]["score"]
+    timings["retrieval_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    # Step 3: Classification and Reasoning(Ollama)
+    start = time.perf_counter()
+    classification = classify_stage(entities, regulation_context)
+    try:
+        ollama_result = json.loads(classification)
+        if isinstance(ollama_result, list):
+            final_result = ollama_result[0]  # take first item
+        else:
+            final_result = ollama_result  # it's already a single object
+    except Exception:
+        final_result = {"classification": "Maybe", "reasoning": "Ollama output not valid JSON", "related_regulation": ""}
+    timings["classify_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    return {
+        "classification": final_result.get("classification", ""),
+        "ollama_reasoning": final_result.get("reasoning", ""),
+        "related_regulation": final_result.get("related_regulation", ""),
+        "retrieved_sources": retrieved_sources,
+        "retrieval_score": retrieval_score,
+        **timings
+    }
 
 # ---------------------- Example Usage ----------------------
 # Remove or guard the following lines so they do not run on import
@@ -181,6 +335,7 @@ def classify_stage(entities: str, regulation_context: str):
 # regulation_list = []
 
 if __name__ == "__main__":
+    # For concurrent, resumable runs use: python rl/batch_runner.py reasoning <input> <output>
     dataset_file_path = "/Users/zerongpeh/Desktop/Y4S1/hackathon_documents/tiktok_dataset.xlsx"
     try:
         df = pd.read_excel(dataset_file_path)
@@ -193,43 +348,11 @@ if __name__ == "__main__":
             }
 
             try:
-                # Step 1: Extract entities
-                entities = json.loads(extract_entities(feature["feature_name"], feature["feature_description"]))
-                print("\n--- Extracted Entities ---")
-                print(entities)
-
-                # Step 2: Search all laws for best match
-                regulation_results = retrieve_best_regulation_text(feature["feature_description"], entities, top_k=3)
-                if not regulation_results:
-                    print("\n--- Regulation Context ---")
-                    print("No relevant regulation found.")
-                    regulation_context = ""
-                    related_regulation = ""
-                else:
-                    # combine top 3 collections’ texts
-                    regulation_context = "\n\n".join(
-                        "\n\n".join(r["texts"]) for r in regulation_results
-                    )
-                    related_regulation = ", ".join(r["source_file"] for r in regulation_results)
-                                
-                    print("\n--- Regulation Context ---")
-                    print(f"Matched Law: {related_regulation}")
-                    print(regulation_context[:1000], "...")  # print preview
-
-                # Step 3: Classification and Reasoning(Ollama)
-                classification = classify_stage(entities, regulation_context)
+                result = process_feature(feature["feature_name"], feature["feature_description"])
                 print("\n--- Classification (Ollama) ---")
-                print(classification)
-                try:
-                    ollama_result = json.loads(classification)
-                    if isinstance(ollama_result, list):
-                        final_result = ollama_result[0]  # take first item
-                    else:
-                        final_result = ollama_result  # it's already a single object
-                except Exception:
-                    final_result = {"classification": "Maybe", "reasoning": "Ollama output not valid JSON", "related_regulation": ""}
-                reasoning_list.extend([final_result['reasoning']])
-                regulation_list.extend([final_result['related_regulation']])
+                print(result)
+                reasoning_list.extend([result['ollama_reasoning']])
+                regulation_list.extend([result['related_regulation']])
             except Exception as e:
                 print("Error:", e)
                 reasoning_list.append("Error during reasoning")
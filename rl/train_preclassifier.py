@@ -0,0 +1,157 @@
+import os
+import sys
+import glob
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+# ---------------------- Pre-classifier Training ----------------------
+# Fits the pre-classifier on labels that earlier LLM runs produced, as written by
+# rl/batch_runner.py. Two label sources are supported:
+# - reasoning runs: the Ollama classification;
+# - reward runs: the Gemini classification.
+# The model is scored with out-of-fold predictions over the whole labelled set. Each
+# label then gets the lowest confidence at which those held-out predictions still
+# reach --target-precision. Finally the model is refit on all rows and saved as a new
+# version.
+#
+#   python rl/train_preclassifier.py results.csv reward_parquet/ --target-precision 0.95
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from preclassifier import normalize_label, feature_frame, build_model, save_model, PRECLASSIFIER_DIR
+
+TARGET_PRECISION = float(os.getenv("PRECLASSIFIER_TARGET_PRECISION", "0.95"))
+MIN_SUPPORT = int(os.getenv("PRECLASSIFIER_MIN_SUPPORT", "20"))  # held-out answers needed above a threshold
+SERVED_LABELS = ("Yes", "No")  # "Maybe" always goes to the LLM for its reasoning
+# Label column per pipeline output, in order of preference
+LABEL_COLUMNS = ("classification", "gemini_classification")
+
+# ---------------------- Loading ----------------------
+
+def read_output(path: str) -> pd.DataFrame:
+    """A batch runner output: CSV file, parquet file or parquet part directory."""
+    if os.path.isdir(path):
+        parts = sorted(glob.glob(os.path.join(path, "*.parquet")))
+        return pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True) if parts else pd.DataFrame()
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, on_bad_lines="skip")
+
+def load_examples(paths, label_column: str = None) -> pd.DataFrame:
+    """Successful rows with a usable label: feature_name, feature_description, retrieval_score, label."""
+    frames = []
+    for path in paths:
+        df = read_output(path)
+        if df.empty:
+            continue
+        if "status" in df.columns:
+            df = df[df["status"] == "ok"]
+        if "row_id" in df.columns:
+            df = df.drop_duplicates("row_id", keep="last")  # a rerun row supersedes its earlier attempt
+        column = label_column or next((c for c in LABEL_COLUMNS if c in df.columns), None)
+        if column is None or column not in df.columns:
+            raise ValueError(f"{path} has no label column (tried {', '.join([label_column] if label_column else LABEL_COLUMNS)})")
+        frames.append(pd.DataFrame({
+            "feature_name": df["feature_name"].fillna("").astype(str),
+            "feature_description": df["feature_description"].fillna("").astype(str),
+            "retrieval_score": df["retrieval_score"] if "retrieval_score" in df.columns else np.nan,
+            "label": df[column].map(normalize_label)
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["feature_name", "feature_description", "retrieval_score", "label"])
+    examples = pd.concat(frames, ignore_index=True).dropna(subset=["label"])
+    # The same feature labelled in several runs: keep the latest label
+    return examples.drop_duplicates(["feature_name", "feature_description"], keep="last").reset_index(drop=True)
+
+# ---------------------- Calibration ----------------------
+
+def calibrate_threshold(confidences: np.ndarray, correct: np.ndarray, target_precision: float, min_support: int):
+    """
+    Lowest confidence t such that the predictions at or above t are right at least
+    target_precision of the time, over at least min_support of them; None if none is.
+    """
+    order = np.argsort(-confidences)
+    confidences, correct = confidences[order], correct[order]
+    precision = np.cumsum(correct) / np.arange(1, len(correct) + 1)
+    threshold = None
+    for i in range(len(confidences)):
+        # Only cut between distinct confidences, so every prediction at the threshold is counted
+        if i + 1 < len(confidences) and confidences[i + 1] == confidences[i]:
+            continue
+        if i + 1 >= min_support and precision[i] >= target_precision:
+            threshold = float(confidences[i])
+    return threshold
+
+def holdout_report(labels, predicted, confidences, thresholds) -> dict:
+    """How the thresholds would have done on the held-out predictions."""
+    served = np.array([label in thresholds and thresholds[label] is not None and confidence >= thresholds[label]
+                       for label, confidence in zip(predicted, confidences)])
+    correct = predicted == labels
+    return {
+        "examples": int(len(labels)),
+        "accuracy": round(float(correct.mean()), 4),
+        "coverage": round(float(served.mean()), 4),
+        "served_accuracy": round(float(correct[served].mean()), 4) if served.any() else None,
+        "served_by_label": {label: int(((predicted == label) & served).sum()) for label in SERVED_LABELS}
+    }
+
+# ---------------------- Training ----------------------
+
+def train(paths, output_dir: str = PRECLASSIFIER_DIR, label_column: str = None,
+          target_precision: float = TARGET_PRECISION, min_support: int = MIN_SUPPORT, folds: int = 5) -> dict:
+    examples = load_examples(paths, label_column)
+    counts = examples["label"].value_counts()
+    if len(counts) < 2 or counts.min() < folds:
+        raise ValueError(f"Not enough labelled rows to train: {counts.to_dict()} (each label needs at least {folds})")
+
+    X = feature_frame(examples["feature_name"], examples["feature_description"], examples["retrieval_score"])
+    y = examples["label"].to_numpy()
+    model = build_model()
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=0)
+    probabilities = cross_val_predict(model, X, y, cv=splitter, method="predict_proba")
+    classes = np.array(sorted(set(y)))  # predict_proba column order
+    predicted = classes[probabilities.argmax(axis=1)]
+    confidences = probabilities.max(axis=1)
+
+    thresholds = {}
+    for label in SERVED_LABELS:
+        mask = predicted == label
+        thresholds[label] = (calibrate_threshold(confidences[mask], (y[mask] == label), target_precision, min_support)
+                             if mask.any() else None)
+
+    model.fit(X, y)
+    digest = hashlib.sha1(pd.util.hash_pandas_object(examples, index=False).to_numpy().tobytes()).hexdigest()[:8]
+    meta = {
+        "version": f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{digest}",
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "sources": [os.path.abspath(path) for path in paths],
+        "label_counts": {label: int(count) for label, count in counts.items()},
+        "target_precision": target_precision,
+        "min_support": min_support,
+        "thresholds": thresholds,
+        "holdout": holdout_report(y, predicted, confidences, thresholds),
+        "sklearn_version": sklearn.__version__
+    }
+    meta["path"] = save_model(model, meta, output_dir)
+    return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the pre-classifier on batch runner outputs.")
+    parser.add_argument("outputs", nargs="+", help="batch runner outputs (CSV files or parquet directories)")
+    parser.add_argument("--output-dir", default=PRECLASSIFIER_DIR, help="where model versions are kept")
+    parser.add_argument("--label-column", help=f"label column (default: first of {', '.join(LABEL_COLUMNS)} present)")
+    parser.add_argument("--target-precision", type=float, default=TARGET_PRECISION,
+                        help="held-out precision a label's served answers must reach")
+    parser.add_argument("--min-support", type=int, default=MIN_SUPPORT,
+                        help="held-out answers needed above a threshold")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds for the held-out predictions")
+    args = parser.parse_args()
+
+    meta = train(args.outputs, args.output_dir, args.label_column, args.target_precision, args.min_support, args.folds)
+    print(json.dumps({key: meta[key] for key in ("version", "path", "label_counts", "thresholds", "holdout")}, indent=2))
@@ -0,0 +1,156 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+import requests
+from api.llm_scheduler import get_scheduler, llm_priority, PRIORITIES
+from api.health_monitor import get_breaker, CircuitOpen, OLLAMA_EMBED
+from deadline import call_timeout, raise_if_expired
+
+# ---------------------- Embedding Batcher Settings ----------------------
+# Concurrent callers' texts are gathered for up to EMBED_BATCH_WINDOW_MS (or until
+# EMBED_BATCH_MAX_SIZE texts are waiting) and sent to Ollama as one multi-input call.
+OLLAMA_EMBED_URL = os.getenv("OLLAMA_EMBED_URL", "http://127.0.0.1:11434/api/embed")
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "mxbai-embed-large")
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "8"))
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_TIMEOUT_SECONDS = float(os.getenv("EMBED_TIMEOUT_SECONDS", "60"))
+METRICS_WINDOW = 1000  # recent batches/waits kept for percentiles
+
+
+def _percentile(values, q: float) -> float:
+    return round(float(np.percentile(values, q)), 2) if values else 0.0
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches embedding requests from concurrent threads. embed() enqueues a text
+    and blocks; a single background thread drains the queue into /api/embed calls and
+    hands each caller its vector. Identical texts in one batch are embedded once.
+    """
+
+    def __init__(self, url: str = OLLAMA_EMBED_URL, model: str = OLLAMA_EMBED_MODEL,
+                 window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+                 timeout: float = EMBED_TIMEOUT_SECONDS):
+        self.url = url
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._pending = deque()  # (text, future, enqueued_at, priority)
+        self._cond = threading.Condition()
+        self._thread = None
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self._queue_waits_ms = deque(maxlen=METRICS_WINDOW)
+        self._request_ms = deque(maxlen=METRICS_WINDOW)
+
+    def embed(self, text: str) -> list:
+        """Embedding for one text, batched with whatever else arrives in the same window."""
+        breaker = get_breaker(OLLAMA_EMBED)
+        if breaker.is_open:
+            # Fail before queueing; the batch itself goes through the breaker (and its half-open trial)
+            raise CircuitOpen(breaker.name, breaker.reset_seconds)
+        future = Future()
+        with self._cond:
+            self._ensure_worker()
+            self._pending.append((text, future, time.perf_counter(), llm_priority.get()))
+            self._cond.notify()
+        try:
+            return future.result(timeout=call_timeout(self.timeout * 2, "embedding"))
+        except TimeoutError:
+            raise_if_expired("embedding")
+            raise
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self) -> list:
+        """Block until a batch is ready: the window since the oldest item has passed or the batch is full."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0][2] + self.window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            sent_at = time.perf_counter()
+            unique_texts = list(dict.fromkeys(text for text, _, _, _ in batch))
+            # The batch is scheduled at the priority of its most urgent caller
+            priority = min((p for _, _, _, p in batch), key=PRIORITIES.get)
+            try:
+                with get_breaker(OLLAMA_EMBED).protect():
+                    with get_scheduler("ollama_embed").slot(priority):
+                        response = self.session.post(self.url, json={"model": self.model, "input": unique_texts},
+                                                     timeout=self.timeout)
+                    response.raise_for_status()
+                vectors = dict(zip(unique_texts, response.json()["embeddings"]))
+                error = None
+            except Exception as e:
+                vectors, error = {}, e
+            finished_at = time.perf_counter()
+
+            # Every caller gets an answer, even when Ollama returns fewer vectors than texts,
+            # so nobody is left waiting for the timeout and the worker keeps running
+            if error is None and len(vectors) < len(unique_texts):
+                error = RuntimeError(f"Ollama returned {len(vectors)} embeddings for {len(unique_texts)} texts")
+            for text, future, _, _ in batch:
+                if text in vectors:
+                    future.set_result(vectors[text])
+                else:
+                    future.set_exception(error)
+            with self._cond:
+                self._batches += 1
+                self._items += len(batch)
+                self._errors += error is not None
+                self._batch_sizes.append(len(batch))
+                self._queue_waits_ms.extend((sent_at - enqueued_at) * 1000 for _, _, enqueued_at, _ in batch)
+                self._request_ms.append((finished_at - sent_at) * 1000)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            sizes = list(self._batch_sizes)
+            waits = list(self._queue_waits_ms)
+            request_ms = list(self._request_ms)
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "errors": self._errors,
+                "queued": len(self._pending),
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "batch_size_mean": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                "batch_size_max": max(sizes) if sizes else 0,
+                "queue_wait_ms_p50": _percentile(waits, 50),
+                "queue_wait_ms_p95": _percentile(waits, 95),
+                "request_ms_p50": _percentile(request_ms, 50),
+                "request_ms_p95": _percentile(request_ms, 95)
+            }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Shared batcher for the process, so every request thread feeds the same queue."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = EmbeddingBatcher()
+        return _batcher
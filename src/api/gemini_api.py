@@ -0,0 +1,171 @@
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+import requests
+from api.llm_cache import cached_completion
+
+# ---------------------- Gemini Settings ----------------------
+# Gemini is called over its REST API with one pooled HTTP session per process.
+# Point GEMINI_API_ENDPOINT at utils/gemini_stub_server.py to run without the real service.
+GEMINI_DEFAULT_ENDPOINT = "https://generativelanguage.googleapis.com"
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", GEMINI_DEFAULT_ENDPOINT).rstrip("/")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.0-flash-exp")
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "10"))              # sustained requests per minute
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "2"))             # requests allowed back to back
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+RETRYABLE_STATUS = {429, 500, 503}
+MAX_BACKOFF_SECONDS = 60
+
+
+class GeminiError(Exception):
+    """Gemini request failed after all retries, or returned no text."""
+
+
+# ---------------------- Rate Limiting ----------------------
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at rate tokens per second up to capacity,
+    and acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Empty the bucket so no request is sent for the next seconds (server asked us to back off)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+def retry_after_seconds(response) -> float:
+    """
+    Delay the server asked for, from the Retry-After header (seconds or HTTP date)
+    or the RetryInfo detail Gemini puts in 429 bodies ("retryDelay": "12s"). None if absent.
+    """
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        details = response.json().get("error", {}).get("details", [])
+    except ValueError:
+        return None
+    for detail in details:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                return max(0.0, float(delay[:-1]))
+            except ValueError:
+                continue
+    return None
+
+# ---------------------- Client ----------------------
+
+class GeminiClient:
+    """
+    Reusable Gemini client: pooled HTTP session, shared token-bucket rate limit,
+    and retries that honour Retry-After on 429/503 and back off exponentially otherwise.
+    """
+
+    def __init__(self, api_key: str = None, model: str = GEMINI_MODEL, endpoint: str = GEMINI_API_ENDPOINT,
+                 rpm: float = GEMINI_RPM, burst: int = GEMINI_BURST, max_retries: int = GEMINI_MAX_RETRIES,
+                 timeout: float = GEMINI_TIMEOUT_SECONDS):
+        self.api_key = api_key if api_key is not None else os.getenv("GEMINI_API_KEY")
+        self.model = model if model.startswith("models/") else f"models/{model}"
+        self.endpoint = endpoint.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.limiter = TokenBucket(rpm / 60.0, burst)
+        self.session = requests.Session()
+
+    def generate(self, prompt: str) -> str:
+        """Send a single-turn prompt and return the response text (served from the LLM cache when recorded)."""
+        messages = [{"role": "user", "content": prompt}]
+        # Responses from another endpoint (e.g. the stub server) are cached apart from the real API's
+        options = {"endpoint": self.endpoint} if self.endpoint != GEMINI_DEFAULT_ENDPOINT else None
+        return cached_completion("gemini", self.model, messages, lambda: self._generate(prompt), options=options)
+
+    def _generate(self, prompt: str) -> str:
+        url = f"{self.endpoint}/v1beta/{self.model}:generateContent"
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        headers = {"x-goog-api-key": self.api_key} if self.api_key else {}
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt == self.max_retries:
+                    raise GeminiError(f"Gemini request failed: {e}") from e
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                delay = retry_after_seconds(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                else:
+                    # Quota is shared by every thread, so hold them all back
+                    self.limiter.pause(delay)
+                time.sleep(delay)
+                continue
+            if response.status_code != 200:
+                raise GeminiError(f"Gemini returned HTTP {response.status_code}: {response.text[:300]}")
+            return self._response_text(response.json())
+
+        raise GeminiError("Gemini request failed after retries")
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(MAX_BACKOFF_SECONDS, 2 ** attempt) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _response_text(body: dict) -> str:
+        candidates = body.get("candidates") or []
+        if not candidates:
+            reason = body.get("promptFeedback", {}).get("blockReason", "no candidates")
+            raise GeminiError(f"Gemini returned no text ({reason})")
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_gemini_client() -> GeminiClient:
+    """Shared Gemini client for the process, so every thread draws from one rate limit."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
@@ -0,0 +1,250 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import requests
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from api.llm_scheduler import SchedulerOverloaded
+from deadline import DeadlineExceeded
+from config.collections import SOURCE_COLLECTION_MAP
+
+# ---------------------- Health Monitor Settings ----------------------
+# A background thread probes the embedding model, the chat model and every collection
+# each HEALTH_PROBE_INTERVAL_SECONDS. Each dependency has a circuit breaker: after
+# BREAKER_FAILURE_THRESHOLD consecutive failures (from probes or real calls) it opens and
+# calls fail fast with CircuitOpen. After BREAKER_RESET_SECONDS, or as soon as a probe
+# succeeds, it goes half-open and lets one trial call through; only a successful real call
+# closes it again (a reachable /api/tags does not mean generation works).
+load_dotenv()
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
+OLLAMA_EMBED_URL = os.getenv("OLLAMA_EMBED_URL", f"{OLLAMA_URL}/api/embed")
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "mxbai-embed-large")
+OLLAMA_CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.1:8b")
+QDRANT_ENDPOINT = os.getenv("QDRANT_ENDPOINT")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "15"))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "5"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Per-call timeouts for real traffic, so a hung dependency cannot hold a worker indefinitely
+OLLAMA_CHAT_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_CHAT_TIMEOUT_SECONDS", "120"))
+QDRANT_TIMEOUT_SECONDS = int(os.getenv("QDRANT_TIMEOUT_SECONDS", "10"))
+
+OLLAMA_EMBED = "ollama_embed"
+OLLAMA_CHAT = "ollama_chat"
+
+
+def qdrant_dependency(collection_name: str) -> str:
+    """Breaker name of a collection; each collection is tracked on its own."""
+    return f"qdrant:{collection_name}"
+
+
+class CircuitOpen(Exception):
+    """A dependency is known to be down; the call was not attempted."""
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} is unavailable (circuit open)")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+# ---------------------- Circuit Breaker ----------------------
+
+class CircuitBreaker:
+    """
+    closed -> open after failure_threshold consecutive failures -> half_open after reset_seconds
+    (or a successful probe) -> closed after a successful real call.
+    """
+
+    # Raised inside protect() without saying anything about the dependency's health
+    NOT_FAILURES = (CircuitOpen, SchedulerOverloaded, DeadlineExceeded)
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpen unless the call may go ahead (closed, or the single half-open trial)."""
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if not self._trial_in_flight and (self.state == "half_open" or remaining <= 0):
+                self.state = "half_open"
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpen(self.name, round(max(remaining, 1.0), 1))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_probe_success(self):
+        """A probe reached the dependency: let the next call through as a trial, but do not close."""
+        with self._lock:
+            if self.state == "open":
+                self.state = "half_open"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def record_probe_failure(self):
+        """
+        A probe could not reach the dependency. Counts like a failed call, except that it
+        leaves a half-open trial in flight alone: only that call's own outcome settles it.
+        """
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight:
+                return
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be rejected (a half-open breaker whose trial is due counts as closed)."""
+        with self._lock:
+            if self.state == "closed" or (self.state == "half_open" and not self._trial_in_flight):
+                return False
+            return self._trial_in_flight or time.monotonic() < self.opened_at + self.reset_seconds
+
+    @contextmanager
+    def protect(self):
+        """Run the block as a call to this dependency: fail fast when open, record the outcome."""
+        self.before_call()
+        try:
+            yield
+        except self.NOT_FAILURES:
+            with self._lock:
+                self._trial_in_flight = False
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(dependency: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if dependency not in _breakers:
+            _breakers[dependency] = CircuitBreaker(dependency)
+        return _breakers[dependency]
+
+# ---------------------- Probes ----------------------
+
+class HealthMonitor:
+    """
+    Periodically probes each dependency and caches the result. A failed probe counts as a
+    failure of the dependency's breaker; a successful one only lets an open breaker try again.
+    """
+
+    def __init__(self, collections=None, interval: float = HEALTH_PROBE_INTERVAL_SECONDS,
+                 timeout: float = HEALTH_PROBE_TIMEOUT_SECONDS):
+        self.collections = sorted(set(collections or SOURCE_COLLECTION_MAP.values()))
+        self.interval = interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.qdrant = QdrantClient(url=QDRANT_ENDPOINT, api_key=QDRANT_API_KEY, timeout=max(1, int(timeout)))
+        self._results = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _probe_embed(self) -> dict:
+        response = self.session.post(OLLAMA_EMBED_URL, json={"model": OLLAMA_EMBED_MODEL, "input": ["health check"]},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return {"model": OLLAMA_EMBED_MODEL, "dimensions": len(response.json()["embeddings"][0])}
+
+    def _probe_chat(self) -> dict:
+        # Listing models is enough to see the server is up and the model pulled; a generation
+        # probe would occupy the (single) chat slot that real requests are waiting for
+        response = self.session.get(f"{OLLAMA_URL}/api/tags", timeout=self.timeout)
+        response.raise_for_status()
+        models = {model["name"] for model in response.json().get("models", [])}
+        if OLLAMA_CHAT_MODEL not in models:
+            raise RuntimeError(f"model {OLLAMA_CHAT_MODEL} is not available on the Ollama server")
+        return {"model": OLLAMA_CHAT_MODEL}
+
+    def _probe_collection(self, collection_name: str) -> dict:
+        info = self.qdrant.get_collection(collection_name)
+        return {"status": str(getattr(info.status, "value", info.status)), "points": info.points_count}
+
+    def probes(self) -> dict:
+        probes = {OLLAMA_EMBED: self._probe_embed, OLLAMA_CHAT: self._probe_chat}
+        for collection_name in self.collections:
+            probes[qdrant_dependency(collection_name)] = (lambda name=collection_name: self._probe_collection(name))
+        return probes
+
+    def probe_all(self):
+        for dependency, probe in self.probes().items():
+            started = time.perf_counter()
+            breaker = get_breaker(dependency)
+            try:
+                details, error = probe(), None
+                breaker.record_probe_success()
+            except Exception as e:
+                details, error = None, f"{type(e).__name__}: {e}"
+                breaker.record_probe_failure()
+            result = {
+                "available": error is None,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                "checked_at": time.time(),
+                "error": error,
+                "details": details
+            }
+            with self._lock:
+                self._results[dependency] = result
+
+    def _run(self):
+        while True:
+            self.probe_all()
+            time.sleep(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+            self._thread.start()
+
+    def status(self) -> dict:
+        """Latest probe result and breaker state per dependency (empty until the first round finishes)."""
+        with self._lock:
+            results = dict(self._results)
+        return {dependency: {**result, "circuit": get_breaker(dependency).snapshot()}
+                for dependency, result in results.items()}
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def get_health_monitor() -> HealthMonitor:
+    """Shared monitor; probing starts with the first call."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = HealthMonitor()
+            _monitor.start()
+        return _monitor
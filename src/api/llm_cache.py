@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# ---------------------- LLM Cache Settings ----------------------
+# Modes:
+#   off           always call the model, never touch the cache
+#   read_through  serve hits from the cache, call the model and store on a miss (default)
+#   record        always call the model and overwrite the stored response
+#   replay        only serve from the cache; a miss raises LLMCacheMiss (deterministic offline runs)
+LLM_CACHE_MODES = ("off", "read_through", "record", "replay")
+data_folder = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(data_folder, "llm_cache.sqlite"))
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "read_through")
+
+
+class LLMCacheMiss(LookupError):
+    """Replay mode found no recorded response for a request."""
+
+
+def make_key(provider: str, model: str, messages, options: dict = None) -> str:
+    """Hash of everything that determines a completion: provider, model, options and the full messages."""
+    request = {"provider": provider, "model": model, "options": options or {}, "messages": messages}
+    encoded = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+# ---------------------- Cache Store ----------------------
+
+class LLMCache:
+    """Persistent SQLite (WAL) store of model responses keyed by make_key()."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, provider: str, model: str, response: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, provider, model, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, provider, model, response, time.time())
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMCache:
+    """Shared LLM cache for the process, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+# ---------------------- Cached Calls ----------------------
+
+def cached_completion(provider: str, model: str, messages, generate, options: dict = None, mode: str = None) -> str:
+    """
+    Return the response for (provider, model, options, messages), calling generate()
+    only when the cache mode requires it. generate takes no arguments and returns the text.
+    """
+    mode = mode or LLM_CACHE_MODE
+    if mode not in LLM_CACHE_MODES:
+        raise ValueError(f"Unknown LLM_CACHE_MODE '{mode}', expected one of {', '.join(LLM_CACHE_MODES)}")
+    if mode == "off":
+        return generate()
+
+    cache = get_llm_cache()
+    key = make_key(provider, model, messages, options)
+    if mode in ("read_through", "replay"):
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        if mode == "replay":
+            raise LLMCacheMiss(f"No recorded {provider}/{model} response for request {key[:12]}")
+
+    response = generate()
+    cache.put(key, provider, model, response)
+    return response
@@ -0,0 +1,176 @@
+import os
+import math
+import heapq
+import itertools
+import threading
+import time
+import contextvars
+from contextlib import contextmanager
+from deadline import time_remaining, DeadlineExceeded
+
+# ---------------------- Scheduler Settings ----------------------
+# Every Ollama chat/embedding call takes a slot from its backend's scheduler. Waiting
+# calls are served by priority class (interactive > batch > background), the queue is
+# bounded, and a call whose estimated wait is longer than its class allows is rejected
+# right away with SchedulerOverloaded, which the API turns into 429 + Retry-After.
+PRIORITIES = {"interactive": 0, "batch": 1, "background": 2}
+BACKEND_CONCURRENCY = {
+    "ollama_chat": int(os.getenv("OLLAMA_CHAT_CONCURRENCY", "1")),
+    "ollama_embed": int(os.getenv("OLLAMA_EMBED_CONCURRENCY", "2")),
+}
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))  # waiting calls per backend and priority class
+# Longest estimated wait a class accepts before being turned away; None waits as long as it takes
+MAX_WAIT_SECONDS = {
+    "interactive": float(os.getenv("LLM_INTERACTIVE_MAX_WAIT_SECONDS", "30")),
+    "batch": None,
+    "background": None,
+}
+EWMA_ALPHA = 0.2
+INITIAL_SERVICE_SECONDS = 5.0  # service time assumed until the first calls complete
+
+# Priority of LLM calls made by the current request/job; scripts can set LLM_PRIORITY=batch
+llm_priority = contextvars.ContextVar("llm_priority", default=os.getenv("LLM_PRIORITY", "interactive"))
+
+
+class SchedulerOverloaded(Exception):
+    """The backend queue is full or the estimated wait exceeds what the caller's class allows."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# ---------------------- Scheduler ----------------------
+
+class LLMScheduler:
+    """
+    Priority slot scheduler for one backend. acquire() returns once the caller holds one
+    of max_concurrency slots; release() hands the slot to the highest-priority waiter.
+    Service time is tracked as an EWMA to estimate how long a new caller would wait.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int = LLM_MAX_QUEUE):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = []           # heap of [priority, seq, event, granted]
+        self._seq = itertools.count()
+        self._service_ewma = INITIAL_SERVICE_SECONDS
+        self._queued_by_class = {name: 0 for name in PRIORITIES}
+        self._rejected = {name: 0 for name in PRIORITIES}
+        self._completed = 0
+
+    def estimated_wait(self, priority: str) -> float:
+        """Seconds a new call of this class would wait, from the waiters ahead of it and the EWMA service time."""
+        with self._lock:
+            return self._estimate_locked(PRIORITIES[priority])
+
+    def is_saturated(self, priority: str = None) -> bool:
+        """True if a new call of this class would be turned away right now (queue full or wait too long)."""
+        priority = priority or llm_priority.get()
+        max_wait = MAX_WAIT_SECONDS[priority]
+        with self._lock:
+            if self._queued_by_class[priority] >= self.max_queue:
+                return True
+            return max_wait is not None and self._estimate_locked(PRIORITIES[priority]) > max_wait
+
+    def _estimate_locked(self, rank: int) -> float:
+        if self._active < self.max_concurrency and not self._waiters:
+            return 0.0
+        ahead = sum(1 for waiter in self._waiters if waiter[0] <= rank)
+        return (ahead // self.max_concurrency + 1) * self._service_ewma
+
+    def acquire(self, priority: str = None):
+        priority = priority or llm_priority.get()
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {', '.join(PRIORITIES)}")
+        rank = PRIORITIES[priority]
+        max_wait = MAX_WAIT_SECONDS[priority]
+        remaining = time_remaining()
+
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                return
+            estimate = self._estimate_locked(rank)
+            if self._queued_by_class[priority] >= self.max_queue:
+                self._rejected[priority] += 1
+                raise SchedulerOverloaded(f"{self.name} queue is full for {priority} calls", math.ceil(estimate))
+            if max_wait is not None and estimate > max_wait:
+                self._rejected[priority] += 1
+                raise SchedulerOverloaded(
+                    f"{self.name} estimated wait {estimate:.0f}s exceeds {max_wait:.0f}s for {priority} calls",
+                    math.ceil(estimate)
+                )
+            if remaining is not None and estimate > remaining:
+                # The call could not even start before the caller's deadline
+                raise DeadlineExceeded(f"{self.name} queue")
+            waiter = [rank, next(self._seq), threading.Event(), False]
+            heapq.heappush(self._waiters, waiter)
+            self._queued_by_class[priority] += 1
+
+        # Interactive callers give up after twice their budget rather than hang on a stalled backend
+        timeout = max_wait * 2 if max_wait is not None else None
+        if remaining is not None:
+            timeout = min(timeout, remaining) if timeout is not None else remaining
+        granted = waiter[2].wait(timeout)
+        with self._lock:
+            self._queued_by_class[priority] -= 1
+            if granted or waiter[3]:
+                return
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self._rejected[priority] += 1
+        if remaining is not None and timeout == remaining:
+            raise DeadlineExceeded(f"{self.name} queue")
+        raise SchedulerOverloaded(f"{self.name} slot not granted within {timeout:.0f}s", math.ceil(self._service_ewma))
+
+    def release(self, service_seconds: float = None):
+        with self._lock:
+            if service_seconds is not None:
+                self._service_ewma = (1 - EWMA_ALPHA) * self._service_ewma + EWMA_ALPHA * service_seconds
+                self._completed += 1
+            if self._waiters:
+                waiter = heapq.heappop(self._waiters)
+                waiter[3] = True  # slot passes straight to the waiter; _active is unchanged
+                waiter[2].set()
+            else:
+                self._active -= 1
+
+    @contextmanager
+    def slot(self, priority: str = None):
+        """Hold a slot for the duration of the block and feed its duration into the wait estimate."""
+        self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "queued": dict(self._queued_by_class),
+                "rejected": dict(self._rejected),
+                "completed": self._completed,
+                "service_seconds_ewma": round(self._service_ewma, 3)
+            }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(backend: str) -> LLMScheduler:
+    """Shared scheduler for a backend ('ollama_chat' or 'ollama_embed')."""
+    with _schedulers_lock:
+        if backend not in _schedulers:
+            _schedulers[backend] = LLMScheduler(backend, BACKEND_CONCURRENCY[backend])
+        return _schedulers[backend]
+
+def scheduler_metrics() -> dict:
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: scheduler.metrics() for name, scheduler in schedulers.items()}
@@ -1,4 +1,8 @@
 import requests
+from api.llm_cache import cached_completion
+from api.llm_scheduler import get_scheduler
+from api.embedding_batcher import EMBED_TIMEOUT_SECONDS
+from api.health_monitor import get_breaker, OLLAMA_EMBED, OLLAMA_CHAT, OLLAMA_CHAT_TIMEOUT_SECONDS
 # ---------------------- Ollama Settings ----------------------
 OLLAMA_URL = "http://127.0.0.1:11434/api/embeddings"  # Ollama local embed endpoint
 OLLAMA_MODEL = "mxbai-embed-large"                     # Replace with your embedding model
@@ -12,8 +16,10 @@ def get_embedding(text: str) -> list:
         "model": OLLAMA_MODEL,
         "prompt": text
     }
-    response = requests.post(f"{OLLAMA_URL}", json=payload)
-    response.raise_for_status()
+    with get_breaker(OLLAMA_EMBED).protect():
+        with get_scheduler("ollama_embed").slot():
+            response = requests.post(f"{OLLAMA_URL}", json=payload, timeout=EMBED_TIMEOUT_SECONDS)
+        response.raise_for_status()
     return response.json()["embedding"]
 
 def generate_response(context_text: str, question: str) -> str:
@@ -25,6 +31,11 @@ def generate_response(context_text: str, question: str) -> str:
         ],
         "stream": False
     }
-    response = requests.post("http://127.0.0.1:11434/api/chat", json=payload)
-    response.raise_for_status()
-    return response.json()["message"]["content"]
\ No newline at end of file
+    def generate():
+        with get_breaker(OLLAMA_CHAT).protect():
+            with get_scheduler("ollama_chat").slot():
+                response = requests.post("http://127.0.0.1:11434/api/chat", json=payload,
+                                         timeout=OLLAMA_CHAT_TIMEOUT_SECONDS)
+            response.raise_for_status()
+        return response.json()["message"]["content"]
+    return cached_completion("ollama", OLLAMA_CHAT_MODEL, payload["messages"], generate)
\ No newline at end of file
@@ -1,6 +1,26 @@
 from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    HnswConfigDiff,
+    Prefetch,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
 import os
+import math
 from dotenv import load_dotenv
+from config.collections import (
+    COLLECTION_PROFILES,
+    DEFAULT_COLLECTION_PROFILE,
+    FULL_VECTOR_NAME,
+    TRUNCATED_VECTOR_NAME,
+)
 
 
 # ---------------------- Load Environment ----------------------
@@ -17,14 +37,120 @@ def init_qdrant(url=QDRANT_ENDPOINT, api_key=QDRANT_API_KEY):
    
 )
     return(qdrant_client)
-    
-def query_qdrant(qdrant_client, embedding: list, collection_name: str, top_k: int = 5):
+
+# ---------------------- Collection Profiles ----------------------
+
+def get_profile(profile=None) -> dict:
+    """Look up a collection profile by name (None means DEFAULT_COLLECTION_PROFILE)."""
+    name = profile or DEFAULT_COLLECTION_PROFILE
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile: {name}. Available: {', '.join(COLLECTION_PROFILES)}")
+    return COLLECTION_PROFILES[name]
+
+def create_collection(qdrant_client, collection_name: str, vector_size: int, profile=None):
+    """Create a cosine collection laid out according to the given profile."""
+    settings = get_profile(profile)
+
+    quantization_config = None
+    if settings.get("quantization") == "scalar":
+        quantization_config = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    elif settings.get("quantization") == "binary":
+        quantization_config = BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=True)
+        )
+
+    vectors_config = VectorParams(
+        size=vector_size,
+        distance=Distance.COSINE,
+        on_disk=settings.get("on_disk_vectors")
+    )
+    if settings.get("matryoshka_dim"):
+        # Full vectors are only read to rescore candidates, so on_disk applies to them alone
+        vectors_config = {
+            FULL_VECTOR_NAME: vectors_config,
+            TRUNCATED_VECTOR_NAME: VectorParams(size=settings["matryoshka_dim"], distance=Distance.COSINE)
+        }
+
+    qdrant_client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vectors_config,
+        hnsw_config=HnswConfigDiff(**settings["hnsw"]) if "hnsw" in settings else None,
+        quantization_config=quantization_config,
+        on_disk_payload=settings.get("on_disk_payload")
+    )
+
+def truncate_embedding(embedding: list, dim: int) -> list:
+    """Keep the first dim components of a Matryoshka embedding and re-normalize to unit length."""
+    head = list(embedding[:dim])
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+def point_vector(embedding: list, profile=None):
+    """Vector(s) to upsert for a point, matching the collection layout of the profile."""
+    dim = get_profile(profile).get("matryoshka_dim")
+    if not dim:
+        return embedding
+    return {FULL_VECTOR_NAME: embedding, TRUNCATED_VECTOR_NAME: truncate_embedding(embedding, dim)}
+
+def search_params_for_profile(profile=None):
+    """Build the search-time parameters (hnsw_ef, exact, rescoring) for a profile."""
+    settings = get_profile(profile)
+    quantization = None
+    if settings.get("quantization"):
+        quantization = QuantizationSearchParams(
+            rescore=settings.get("rescore", True),
+            oversampling=settings.get("oversampling")
+        )
+    if not (settings.get("hnsw_ef") or settings.get("exact") or quantization):
+        return None
+    return SearchParams(
+        hnsw_ef=settings.get("hnsw_ef"),
+        exact=settings.get("exact", False),
+        quantization=quantization
+    )
+
+def query_qdrant(qdrant_client, embedding: list, collection_name: str, top_k: int = 5, search_params=None, profile=None, with_payload=True, query_filter=None, timeout=None):
     """
     Query Qdrant collection for top-k most similar points using query_points.
+    search_params is passed through unchanged (e.g. SearchParams(exact=True));
+    otherwise the search parameters of the collection profile are used.
+    with_payload=False returns only ids and scores (texts live in the docstore).
+    query_filter (a qdrant Filter) restricts the search, e.g. to routed sections.
+    timeout (whole seconds) bounds the search on the server side.
+
+    Profiles with matryoshka_dim run two phases in one request: a candidate search over
+    the truncated vectors, then exact rescoring of those candidates with the full vectors.
     """
+    if search_params is None:
+        search_params = search_params_for_profile(profile)
+    settings = get_profile(profile)
+    if settings.get("matryoshka_dim"):
+        response = qdrant_client.query_points(
+            collection_name=collection_name,
+            prefetch=Prefetch(
+                query=truncate_embedding(embedding, settings["matryoshka_dim"]),
+                using=TRUNCATED_VECTOR_NAME,
+                limit=top_k * settings.get("candidate_multiplier", 4),
+                params=search_params,
+                filter=query_filter
+            ),
+            query=embedding,
+            using=FULL_VECTOR_NAME,
+            limit=top_k,
+            query_filter=query_filter,
+            with_payload=with_payload,
+            timeout=timeout
+        )
+        return response.points
     results = qdrant_client.search(
         collection_name=collection_name,
         query_vector=embedding,
-        limit=3
+        limit=top_k,
+        search_params=search_params,
+        query_filter=query_filter,
+        with_payload=with_payload,
+        timeout=timeout
     )
-    return results
\ No newline at end of file
+    return results
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import sys
@@ -6,14 +6,13 @@ import traceback
 from datetime import datetime
 import uuid
 from dotenv import load_dotenv
-import fitz  # PyMuPDF for PDF parsing
-import docx  # python-docx for DOCX parsing
 import re
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import io
+import csv
 import json
+import zlib
 import logging
+from werkzeug.exceptions import RequestEntityTooLarge
 from logging.handlers import RotatingFileHandler
 
 # Load environment variables
@@ -30,10 +29,36 @@ if project_root not in sys.path:
 # Import backend modules
 from main import retrieve_top_documents, formulate_response
 from config.collections import SOURCE_COLLECTION_MAP
-from rl.llama_reasoning_generation import extract_entities, retrieve_best_regulation_text, classify_stage
+from rl.llama_reasoning_generation import (
+    extract_entities, retrieve_best_regulation_text, classify_stage, get_embedding,
+    OLLAMA_EMBED_MODEL, OLLAMA_CHAT_MODEL
+)
+from document_parser import (
+    save_upload, parse_saved_document, warm_parse_pool,
+    DocumentTooLargeError, MAX_UPLOAD_BYTES, PARSER_VERSION
+)
+from parse_cache import get_parse_cache
+from feature_extraction import extract_features, extract_feature_info
+from api.embedding_batcher import get_embedding_batcher
+from api.llm_scheduler import SchedulerOverloaded, scheduler_metrics, get_scheduler
+from api.health_monitor import get_health_monitor, get_breaker, CircuitOpen, OLLAMA_EMBED, OLLAMA_CHAT
+from lite_classifier import extract_entities_rules, classify_lite, age_group
+from preclassifier import get_preclassifier
+from deadline import (
+    DeadlineExceeded, REQUEST_DEADLINE_HEADER, parse_deadline_ms, set_request_deadline, reset_request_deadline, stage
+)
+from cascade import get_cascade_stats, OLLAMA_SMALL_CHAT_MODEL
+from semantic_cache import get_semantic_cache, cache_version, SEMANTIC_CACHE_ENABLED
+from corpus_store import load_manifest
+from router import get_router
+from email_outbox import get_email_outbox
+from audit_store import get_audit_store, AUDIT_PAGE_MAX, FEATURE_COLUMNS
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend integration
+# Headroom for multipart framing and form fields: the streaming check in save_upload enforces
+# MAX_UPLOAD_BYTES on the file itself, this only stops requests far beyond it
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
 
 # Configure logging
 if not os.path.exists('logs'):
@@ -63,15 +88,81 @@ print(f"Qdrant endpoint: {os.getenv('QDRANT_ENDPOINT', 'Not configured')}")
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """
+    Health check endpoint, from the health monitor's latest probes.
+    unhealthy (503): the embedding or chat model is down; degraded: some collections are down.
+    """
     app.logger.info("Health check requested")
+    dependencies = get_health_monitor().status()
+    models_up = all(dependencies.get(name, {}).get("available", True) for name in (OLLAMA_EMBED, OLLAMA_CHAT))
+    if not models_up:
+        status = "unhealthy"
+    elif not all(dependency["available"] for dependency in dependencies.values()):
+        status = "degraded"
+    else:
+        status = "healthy" if dependencies else "starting"
     return jsonify({
-        "status": "healthy", 
-        "backend_available": True,
+        "status": status,
+        "backend_available": models_up,
         "qdrant_configured": bool(os.getenv('QDRANT_ENDPOINT')),
+        "dependencies": dependencies,
+        "timestamp": datetime.now().isoformat()
+    }), 503 if status == "unhealthy" else 200
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Runtime metrics for the shared model clients"""
+    return jsonify({
+        "embedding_batcher": get_embedding_batcher().metrics(),
+        "llm_scheduler": scheduler_metrics(),
+        "cascade": get_cascade_stats().snapshot(),
+        "semantic_cache": get_semantic_cache(analysis_cache_version()).stats() if SEMANTIC_CACHE_ENABLED else None,
+        "email_outbox": get_email_outbox().stats(),
+        "audit_store": get_audit_store().stats(),
+        "dependencies": get_health_monitor().status(),
+        "preclassifier": get_preclassifier().stats() if get_preclassifier() else None,
         "timestamp": datetime.now().isoformat()
     })
 
+def analysis_cache_version():
+    """Models and corpus build behind an analysis; semantic cache entries are only reused within one version"""
+    manifest = load_manifest()
+    corpus_version = manifest["created_at"] if manifest else "unversioned"
+    # embed_documents.py rebuilds the router centroids on every ingestion, so their
+    # timestamp changes whenever the collections are re-chunked or re-indexed
+    router = get_router()
+    ingestion_version = router.meta.get("created_at", "-") if router else "unrouted"
+    preclassifier = get_preclassifier()
+    return cache_version(OLLAMA_EMBED_MODEL, OLLAMA_CHAT_MODEL, OLLAMA_SMALL_CHAT_MODEL or "-", corpus_version,
+                         ingestion_version, preclassifier.version if preclassifier else "-")
+
+def upload_too_large_response():
+    return jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"}), 413
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(error):
+    """Request body over MAX_CONTENT_LENGTH: same answer as an oversized upload"""
+    return upload_too_large_response()
+
+@app.errorhandler(SchedulerOverloaded)
+def handle_scheduler_overloaded(error):
+    """Model backends are saturated: fail fast and tell the client when to retry"""
+    app.logger.warning(f"Request rejected by LLM scheduler: {error}")
+    response = jsonify({"error": "Analysis backend is busy, please retry shortly", "retry_after": error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@app.errorhandler(CircuitOpen)
+def handle_circuit_open(error):
+    """A dependency is down: fail fast instead of waiting on it"""
+    app.logger.warning(f"Request failed fast: {error}")
+    response = jsonify({"error": f"{error.dependency} is currently unavailable, please retry shortly",
+                        "retry_after": error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(int(error.retry_after))
+    return response
+
 def parse_structured_feature_text(text):
     """
     Parse structured feature input that contains:
@@ -133,14 +224,29 @@ def analyze_feature():
         "title": "Feature Title",
         "description": "Feature Description", 
         "prd_text": "Full PRD Text",
-        "source_file": "eu_dsa.pdf" (optional, defaults to eu_dsa.pdf)
+        "source_file": "eu_dsa.pdf" (optional, defaults to eu_dsa.pdf),
+        "deadline_ms": 8000 (optional time budget; the X-Request-Deadline-Ms header takes precedence),
+        "mode": "auto" | "ai" | "lite" (optional, defaults to auto)
     }
     
     Also supports structured text input in prd_text with formats like:
     Feature Title: Some title
     Description: Some description
+
+    Under a deadline, a stage that runs out of time is skipped and the result is marked
+    "degraded" (listing the skipped stages) instead of failing.
+
+    mode "lite" skips both LLM calls (rule-based entities + retrieval score + keyword cues).
+    "auto" runs the LLM pipeline but answers in lite mode when the chat model's circuit is
+    open or its queue is saturated; "ai" never falls back (429/503 instead).
+
+    When a trained pre-classifier is confident about the feature (text + retrieval score),
+    its label is returned with mode "preclassifier" and the classification LLM call is
+    skipped; "bypass_preclassifier": true always asks the LLM.
     """
     start_time = datetime.now()
+    deadline_token = None
+    mode = None
     try:
         data = request.get_json()
         
@@ -168,6 +274,21 @@ def analyze_feature():
         if not title or not description:
             app.logger.error(f"Missing required fields - Title: {bool(title)}, Description: {bool(description)}")
             return jsonify({"error": "Title and description are required. Provide them directly or in structured format within prd_text."}), 400
+
+        try:
+            budget_ms = parse_deadline_ms(request.headers.get(REQUEST_DEADLINE_HEADER), data.get('deadline_ms'))
+        except (TypeError, ValueError):
+            return jsonify({"error": "deadline must be a positive number of milliseconds"}), 400
+        deadline_token = set_request_deadline(budget_ms)
+        degraded_stages = []
+        if budget_ms:
+            app.logger.info(f"Deadline budget: {budget_ms:.0f}ms")
+
+        mode = data.get('mode', 'auto')
+        if mode not in ('auto', 'ai', 'lite'):
+            return jsonify({"error": "mode must be one of auto, ai, lite"}), 400
+        if mode == 'lite':
+            return jsonify(run_lite_analysis(title, description, data, start_time))
             
         # Combine all text for analysis
         feature_desc = f"{title}\n{description}\n{prd_text}" if prd_text else f"{title}\n{description}"
@@ -175,9 +296,52 @@ def analyze_feature():
         app.logger.info(f"Feature description length: {len(feature_desc)} characters")
         app.logger.info(f"Source file: {source_file}")
 
+        # Near-duplicate of an earlier analysis (typo fix, rephrasing): reuse its result
+        semantic_cache = None
+        if SEMANTIC_CACHE_ENABLED and not data.get('bypass_cache'):
+            try:
+                semantic_cache = get_semantic_cache(analysis_cache_version())
+                feature_embedding = get_embedding(f"{title}\n{description}")
+                cached = semantic_cache.lookup(feature_embedding)
+            except (SchedulerOverloaded, CircuitOpen):
+                raise
+            except Exception as e:
+                app.logger.warning(f"Semantic cache unavailable, running full analysis: {str(e)}")
+                semantic_cache, cached = None, None
+            if cached:
+                cached_response, similarity = cached
+                cached_feature = cached_response["feature"]
+                cached_response["feature"] = {
+                    **cached_feature,
+                    "id": f"feat_{uuid.uuid4().hex[:8]}",
+                    "title": title,
+                    "description": description,
+                    "created_at": datetime.now().isoformat()
+                }
+                cached_response.update({
+                    "cached": True,
+                    "cache_similarity": round(similarity, 4),
+                    "cached_from": cached_feature["id"]
+                })
+                app.logger.info(f"SEMANTIC CACHE HIT - similarity {similarity:.4f} to {cached_feature['id']} -> {cached_feature['flag']}")
+                record_analysis(cached_response["feature"], data, start_time, cached_from=cached_feature["id"])
+                return jsonify(cached_response)
+
+        if mode == 'auto':
+            if get_breaker(OLLAMA_CHAT).is_open:
+                return jsonify(run_lite_analysis(title, description, data, start_time, "chat model circuit open"))
+            if get_scheduler(OLLAMA_CHAT).is_saturated():
+                return jsonify(run_lite_analysis(title, description, data, start_time, "chat model queue saturated"))
+
         # Step 1: Extract entities
         app.logger.info("Step 1: Extracting entities...")
-        entities_json = extract_entities(title, description)
+        try:
+            with stage("entities"):
+                entities_json = extract_entities(title, description)
+        except DeadlineExceeded as e:
+            app.logger.warning(f"{e} - continuing with rule-based entities")
+            degraded_stages.append("entities")
+            entities_json = json.dumps(extract_entities_rules(title, description))
         try:
             entities = json.loads(entities_json)
             app.logger.info(f"Entities extracted: {list(entities.keys())}")
@@ -187,7 +351,13 @@ def analyze_feature():
 
         # Step 2: Retrieve best regulation text
         app.logger.info("Step 2: Searching vector database for relevant regulations...")
-        regulation_results = retrieve_best_regulation_text(description, entities, top_k=3)
+        try:
+            with stage("retrieval"):
+                regulation_results = retrieve_best_regulation_text(description, entities, top_k=3)
+        except DeadlineExceeded as e:
+            app.logger.warning(f"{e} - continuing without regulation context")
+            degraded_stages.append("retrieval")
+            regulation_results = []
         if not regulation_results:
             regulation_context = ""
             related_regulation = ""
@@ -198,13 +368,44 @@ def analyze_feature():
                 "\n\n".join(r["texts"]) for r in regulation_results
             )
             related_regulation = ", ".join(r["source_file"] for r in regulation_results)
-            regions_affected = [entities.get("location", "")] if entities.get("location", "") else []
+            regions_affected = location_regions(entities.get("location"))
             app.logger.info(f"Found {len(regulation_results)} relevant regulation sources: {related_regulation}")
             app.logger.info(f"Retrieved context length: {len(regulation_context)} characters")
 
-        # Step 3: Classification and Reasoning (LLM)
-        app.logger.info("Step 3: Generating AI classification and reasoning...")
-        classification_json = classify_stage(entities, regulation_context)
+        # Step 3: Classification and Reasoning (pre-classifier when confident, else LLM)
+        preclassifier = None if data.get('bypass_preclassifier') else get_preclassifier()
+        preclassified = None
+        if preclassifier is not None:
+            try:
+                prediction = preclassifier.predict(
+                    title, description, regulation_results[0]["score"] if regulation_results else None
+                )
+                preclassified = prediction if prediction["confident"] else None
+            except Exception as e:
+                app.logger.warning(f"Pre-classifier failed, asking the LLM: {str(e)}")
+        try:
+            if preclassified:
+                app.logger.info(f"Step 3: Pre-classifier {preclassified['version']} answered "
+                                f"{preclassified['label']} ({preclassified['confidence']:.3f}), skipping the LLM")
+                classification_json = json.dumps({
+                    "classification": preclassified["label"],
+                    "reasoning": f"Matches the pattern of earlier LLM analyses labelled {preclassified['label']} "
+                                 f"(pre-classifier confidence {preclassified['confidence']:.2f}); "
+                                 f"closest regulation text: {related_regulation or 'none found'}.",
+                    "related_regulation": related_regulation if preclassified["label"] != "No" else ""
+                })
+            else:
+                app.logger.info("Step 3: Generating AI classification and reasoning...")
+                with stage("classify"):
+                    classification_json = classify_stage(entities, regulation_context)
+        except DeadlineExceeded as e:
+            app.logger.warning(f"{e} - returning a degraded result")
+            degraded_stages.append("classify")
+            classification_json = json.dumps({
+                "classification": "Maybe",
+                "reasoning": "Analysis did not finish within the requested deadline; needs human review.",
+                "related_regulation": related_regulation
+            })
         try:
             classification = json.loads(classification_json)
         except Exception:
@@ -230,13 +431,31 @@ def analyze_feature():
         app.logger.info(f"ANALYSIS COMPLETE - Classification: {result['flag']} - Duration: {duration:.0f}ms")
         app.logger.info(f"Final result: {result['title']} -> {result['flag']} ({len(result['reasoning'])} char reasoning)")
 
-        return jsonify({
+        response = {
             "success": True,
             "feature": result,
             "raw_analysis": classification_json,
             "retrieved_documents": len(regulation_results),
-            "mode": "ai"
-        })
+            "mode": "preclassifier" if preclassified else "ai",
+            "preclassifier": preclassified,
+            "cached": False,
+            "degraded": bool(degraded_stages),
+            "degraded_stages": degraded_stages
+        }
+        # Recorded first: a result that cannot be recorded must not be replayed from the cache
+        record_analysis(result, data, start_time, degraded_stages=degraded_stages,
+                        mode="preclassifier" if preclassified else "ai")
+        if semantic_cache is not None and not degraded_stages:
+            try:
+                semantic_cache.add(feature_embedding, response)
+            except Exception as e:
+                app.logger.warning(f"Could not store analysis in semantic cache: {str(e)}")
+        return jsonify(response)
+    except (SchedulerOverloaded, CircuitOpen) as e:
+        if mode != 'auto':
+            raise
+        app.logger.warning(f"LLM pipeline unavailable, answering in lite mode: {str(e)}")
+        return jsonify(run_lite_analysis(title, description, data, start_time, str(e)))
     except Exception as e:
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds() * 1000
@@ -244,63 +463,231 @@ def analyze_feature():
         print(f"Error in analyze_feature: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": f"Analysis failed: {str(e)}"}), 500
+    finally:
+        if deadline_token is not None:
+            reset_request_deadline(deadline_token)
 
-def parse_analysis_response(response_text, title, description):
+def run_lite_analysis(title, description, data, start_time, fallback_reason=None):
     """
-    Parse the AI response to extract structured classification information
-    This is a simplified parser - in production you'd want more sophisticated NLP
+    Lite analysis: no generative LLM calls. Retrieval still runs when the embedding model
+    and Qdrant are reachable; otherwise the flag rests on the text cues alone.
     """
-    response_lower = response_text.lower()
-    
-    # Determine flag based on response content
-    if any(word in response_lower for word in ['violation', 'violates', 'non-compliant', 'illegal', 'prohibited']):
-        flag = 'Yes'
-    elif any(word in response_lower for word in ['compliant', 'legal', 'allowed', 'permitted', 'no violation']):
-        flag = 'No' 
-    else:
-        flag = 'Maybe'
-        
-    # Extract mentioned regulations (simple keyword matching)
-    regulations = []
-    regulation_keywords = {
-        'gdpr': 'GDPR Article 8',
-        'digital services act': 'EU Digital Services Act',
-        'dsa': 'EU Digital Services Act',
-        'privacy': 'EU Privacy Directive',
-        'data protection': 'Data Protection Regulation'
-    }
-    
-    for keyword, regulation in regulation_keywords.items():
-        if keyword in response_lower and regulation not in regulations:
-            regulations.append(regulation)
-    
-    # Determine age group and reasoning
-    age_group = 'All Ages'
-    if any(word in response_lower for word in ['minor', 'child', 'under 18', 'teenager']):
-        age_group = 'Under 18'
-    elif any(word in response_lower for word in ['adult', 'over 18']):
-        age_group = 'Adults Only'
-        
-    # Extract reasoning (first paragraph of response)
-    reasoning_parts = response_text.split('\n\n')
-    reasoning = reasoning_parts[0] if reasoning_parts else "Analysis indicates potential regulatory implications."
-    
-    return {
+    entities = extract_entities_rules(title, description)
+    regulation_results = []
+    try:
+        regulation_results = retrieve_best_regulation_text(description, entities, top_k=3)
+    except Exception as e:
+        app.logger.warning(f"Lite analysis without retrieval: {str(e)}")
+    best = regulation_results[0] if regulation_results else None
+    classification = classify_lite(title, description, entities,
+                                   retrieval_score=best["score"] if best else None,
+                                   retrieved_source=best["source_file"] if best else None)
+    signals = classification.pop("signals")
+
+    result = {
         "id": f"feat_{uuid.uuid4().hex[:8]}",
         "title": title,
         "description": description,
-        "flag": flag,
-        "regulations": regulations,
-        "reasoning": reasoning[:300] + "..." if len(reasoning) > 300 else reasoning,
-        "age": age_group,
-        "regions_affected": ["European Union"],
+        "flag": classification["classification"],
+        "reasoning": classification["reasoning"],
+        "age": age_group(entities["age"]),
+        "related_regulation": classification["related_regulation"],
+        "regulations": signals["regulations"] or ([classification["related_regulation"]] if classification["related_regulation"] else []),
+        "regions_affected": [entities["location"]] if entities["location"] else [],
         "created_at": datetime.now().isoformat()
     }
+    duration = (datetime.now() - start_time).total_seconds() * 1000
+    app.logger.info(f"LITE ANALYSIS COMPLETE - Classification: {result['flag']} - Duration: {duration:.0f}ms"
+                    + (f" - fallback: {fallback_reason}" if fallback_reason else ""))
+    record_analysis(result, data, start_time, mode="lite")
+    return {
+        "success": True,
+        "feature": result,
+        "raw_analysis": json.dumps(classification),
+        "retrieved_documents": len(regulation_results),
+        "mode": "lite",
+        "fallback_reason": fallback_reason,
+        "lite_signals": signals,
+        "cached": False,
+        "degraded": False,
+        "degraded_stages": []
+    }
+
+def record_analysis(feature, data, start_time, cached_from=None, degraded_stages=None, mode="ai"):
+    """Append a completed analysis to the audit log (written in the background)"""
+    get_audit_store().record(
+        "analysis",
+        feature_id=feature["id"],
+        feature_name=feature["title"],
+        flag=feature["flag"],
+        jurisdictions=feature.get("regions_affected", []),
+        actor=data.get('actor'),
+        payload={
+            "feature": feature,
+            "source_file": data.get('source_file'),
+            "cached_from": cached_from,
+            "degraded_stages": degraded_stages or [],
+            "mode": mode,
+            "duration_ms": round((datetime.now() - start_time).total_seconds() * 1000)
+        }
+    )
+
+@app.route('/api/features/<feature_id>/override', methods=['POST'])
+def override_feature(feature_id):
+    """
+    Record a reviewer's override of an analysis flag.
+    Expected payload: {
+        "flag": "Yes" | "No" | "Maybe",
+        "reasoning": "...",
+        "actor": "reviewer@example.com",
+        "title": "Feature Title" (optional),
+        "previous_flag": "Maybe" (optional),
+        "regions_affected": [...] (optional)
+    }
+    """
+    data = request.get_json() or {}
+    flag = data.get('flag')
+    if flag not in ("Yes", "No", "Maybe"):
+        return jsonify({"error": "flag must be one of Yes, No, Maybe"}), 400
+    try:
+        regions_affected = regions_list(data.get('regions_affected'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    event_id = get_audit_store().record(
+        "override",
+        feature_id=feature_id,
+        feature_name=data.get('title'),
+        flag=flag,
+        jurisdictions=regions_affected,
+        actor=data.get('actor'),
+        payload={
+            "previous_flag": data.get('previous_flag'),
+            "reasoning": data.get('reasoning', '')
+        }
+    )
+    app.logger.info(f"OVERRIDE - {feature_id} -> {flag} by {data.get('actor', 'unknown')}")
+    return jsonify({"success": True, "event_id": event_id}), 201
+
+def location_regions(location):
+    """The model's location entity as regions_affected; it may answer a string, a list or an object"""
+    if isinstance(location, str):
+        location = [location]
+    if not isinstance(location, list):
+        return []
+    return [region.strip() for region in location if isinstance(region, str) and region.strip()]
+
+def regions_list(value):
+    """regions_affected from a request body as a list of strings; a single string counts as one region"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list) or not all(isinstance(region, str) for region in value):
+        raise ValueError("regions_affected must be a list of strings")
+    return value
+
+@app.route('/api/audit', methods=['GET'])
+def get_audit_log():
+    """
+    Audit events, newest first.
+    Query params: feature_id, event_type, flag, jurisdiction, since, until (ISO timestamps),
+    limit (default 50), cursor (next_cursor of the previous page)
+    """
+    args = request.args
+    try:
+        limit = int(args.get('limit', 50))
+        cursor = args.get('cursor')
+        if cursor is not None:
+            int(cursor)
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    events, next_cursor = get_audit_store().query(
+        feature_id=args.get('feature_id'),
+        event_type=args.get('event_type'),
+        flag=args.get('flag'),
+        jurisdiction=args.get('jurisdiction'),
+        since=args.get('since'),
+        until=args.get('until'),
+        cursor=cursor,
+        limit=limit
+    )
+    return jsonify({"events": events, "next_cursor": next_cursor, "limit": min(limit, AUDIT_PAGE_MAX)})
+
+def feature_filters(args):
+    """Listing/export filters from query params"""
+    return {
+        "flag": args.get('flag'),
+        "regulation": args.get('regulation'),
+        "region": args.get('region'),
+        "since": args.get('since'),
+        "until": args.get('until')
+    }
+
+@app.route('/api/features', methods=['GET'])
+def list_features():
+    """
+    Analyzed features (latest flag, including overrides), newest first.
+    Query params: flag, regulation (substring), region, since, until (ISO timestamps),
+    limit (default 50), cursor (next_cursor of the previous page)
+    """
+    try:
+        limit = int(request.args.get('limit', 50))
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            int(cursor)
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    features, next_cursor = get_audit_store().list_features(cursor=cursor, limit=limit, **feature_filters(request.args))
+    return jsonify({"features": features, "next_cursor": next_cursor, "limit": min(limit, AUDIT_PAGE_MAX)})
+
+@app.route('/api/features/export.csv', methods=['GET'])
+def export_features_csv():
+    """
+    Stream all features matching the /api/features filters as CSV. Rows are read from the
+    store page by page and sent as they are produced; the body is gzip-encoded when the
+    client accepts it (pass gzip=false to turn that off).
+    """
+    filters = feature_filters(request.args)
+    use_gzip = ('gzip' in request.headers.get('Accept-Encoding', '')
+                and request.args.get('gzip', 'true').lower() not in ('0', 'false', 'no'))
+
+    def csv_chunks():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(FEATURE_COLUMNS)
+        for count, feature in enumerate(get_audit_store().iter_features(**filters), start=1):
+            writer.writerow([
+                "; ".join(feature[column]) if column == "regions_affected" else feature[column]
+                for column in FEATURE_COLUMNS
+            ])
+            if count % AUDIT_PAGE_MAX == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+    def gzip_chunks(chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    body = gzip_chunks(csv_chunks()) if use_gzip else csv_chunks()
+    response = Response(stream_with_context(body), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="features_{datetime.now().strftime("%Y%m%d")}.csv"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 @app.route('/api/parse', methods=['POST'])
 def parse_document():
     """
-    Parse uploaded document and extract feature information
+    Parse uploaded document and extract feature information.
+    Returns every feature block found (features) plus the first one as extracted_data.
+    Pass first_only=true to stop parsing once the first feature has been captured.
     """
     try:
         if 'document' not in request.files:
@@ -310,143 +697,67 @@ def parse_document():
         if file.filename == '':
             return jsonify({"error": "No file selected"}), 400
             
-        # Check file type and parse accordingly
+        # Check file type; parsing runs in the document parser process pool
         filename = file.filename.lower()
-        extracted_text = ""
-        
-        if filename.endswith('.pdf'):
-            extracted_text = parse_pdf(file)
-        elif filename.endswith(('.docx', '.doc')):
-            extracted_text = parse_docx(file)
-        else:
+        if not filename.endswith(('.pdf', '.docx', '.doc')):
             return jsonify({"error": "Unsupported file type. Please upload PDF or DOCX files."}), 400
-            
-        if not extracted_text.strip():
-            return jsonify({"error": "Could not extract text from document"}), 400
-            
-        # Extract structured information from text
-        extracted_data = extract_feature_info(extracted_text)
+
+        first_only = request.values.get('first_only', '').lower() in ('1', 'true', 'yes')
+        parser_version = f"{PARSER_VERSION}:first_only" if first_only else PARSER_VERSION
+
+        path, content_sha256 = save_upload(file, suffix=os.path.splitext(filename)[1])
+        try:
+            # Same bytes + same parser version: answer from the cache without opening the document
+            parse_cache = get_parse_cache()
+            cache_key = parse_cache.make_key(content_sha256, parser_version)
+            cached = parse_cache.get(cache_key)
+            if cached:
+                app.logger.info(f"Parse cache hit for {filename} ({content_sha256[:12]})")
+                extracted_text = cached["text"]
+                extracted_data = cached["extracted_data"]
+                features = cached["features"]
+            else:
+                extracted_text = parse_saved_document(path, filename, early_stop=first_only)
+                if not extracted_text.strip():
+                    return jsonify({"error": "Could not extract text from document"}), 400
+
+                # Extract structured information from text, one pass for all features
+                features = extract_features(extracted_text)
+                if first_only:
+                    features = features[:1]
+                extracted_data = extract_feature_info(extracted_text, features)
+                parse_cache.put(cache_key, {"text": extracted_text, "extracted_data": extracted_data, "features": features})
+        finally:
+            os.remove(path)
         
         return jsonify({
             "success": True,
             "extracted_data": extracted_data,
-            "raw_text": extracted_text[:1000] + "..." if len(extracted_text) > 1000 else extracted_text
+            "features": features,
+            "raw_text": extracted_text[:1000] + "..." if len(extracted_text) > 1000 else extracted_text,
+            "cached": bool(cached)
         })
         
+    except DocumentTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except RequestEntityTooLarge:
+        return upload_too_large_response()
     except Exception as e:
         print(f"Error parsing document: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": f"Document parsing failed: {str(e)}"}), 500
 
-def parse_pdf(file):
-    """Extract text from PDF file"""
-    try:
-        pdf_data = file.read()
-        pdf_document = fitz.open(stream=pdf_data, filetype="pdf")
-        text = ""
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            text += page.get_text()
-        pdf_document.close()
-        return text
-    except Exception as e:
-        raise Exception(f"PDF parsing error: {str(e)}")
-
-def parse_docx(file):
-    """Extract text from DOCX file"""
-    try:
-        doc = docx.Document(file)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
-    except Exception as e:
-        raise Exception(f"DOCX parsing error: {str(e)}")
-
-def extract_feature_info(text):
-    """
-    Extract structured feature information from document text
-    Uses the same parsing logic as the analyze endpoint for consistency.
-    """
-    # First try our structured parsing function
-    title, description = parse_structured_feature_text(text)
-    
-    # If structured parsing worked, use those results
-    if title and description:
-        return {
-            "title": title,
-            "description": description,
-            "prd_text": text,
-            "parsing_method": "structured"
-        }
-    
-    # Fallback to regex patterns if structured parsing didn't work
-    # Clean up text - preserve structure but normalize whitespace
-    text_for_regex = re.sub(r'\s+', ' ', text).strip()
-    
-    # Initialize defaults
-    title = "Extracted Feature"
-    description = "Feature extracted from uploaded document"
-    
-    # Enhanced patterns to handle various formats
-    title_patterns = [
-        r'(?:feature\s*title|title)\s*[:"]\s*([^,"\n]+?)(?:\s*[,"]|$)',
-        r'(?:feature\s*title|title):\s*([^\n,]+)',
-        r'(?:feature\s*name|name):\s*([^\n,]+)',
-        r'^([^:\n]{3,80})(?:\s*[,\n]|$)',  # First line if reasonable length
-    ]
-    
-    description_patterns = [
-        r'(?:description|desc)\s*[:"]\s*([^,"\n]+?)(?:\s*[,"]|(?:\s*"Requirements))',
-        r'(?:description|summary|overview):\s*([^\n,]{3,300})',
-        r'(?:brief|short\s+description):\s*([^\n,]{3,300})',
-    ]
-    
-    # Try regex patterns as fallback
-    for pattern in title_patterns:
-        match = re.search(pattern, text_for_regex, re.IGNORECASE | re.MULTILINE)
-        if match:
-            extracted_title = match.group(1).strip().strip('"').strip()
-            if len(extracted_title) >= 3:  # Minimum meaningful length
-                title = extracted_title[:100]  # Limit title length
-                break
-    
-    # Extract description
-    for pattern in description_patterns:
-        match = re.search(pattern, text_for_regex, re.IGNORECASE)
-        if match:
-            extracted_desc = match.group(1).strip().strip('"').strip()
-            if len(extracted_desc) >= 3:  # Minimum meaningful length
-                description = extracted_desc[:300]
-                break
-    
-    # If no specific description found, try to get meaningful content
-    if description == "Feature extracted from uploaded document":
-        # Look for sentences that aren't the title
-        sentences = re.split(r'[.!?]+', text_for_regex)
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if len(sentence) > 20 and sentence.lower() != title.lower():
-                description = sentence[:300]
-                break
-    
-    return {
-        "title": title,
-        "description": description,
-        "prd_text": text,
-        "parsing_method": "regex_fallback"
-    }
-
 @app.route('/api/send-email', methods=['POST'])
 def send_email():
     """
-    Send analysis report via email
+    Queue analysis report for email delivery
     Expected payload: {
         "to": "user@example.com",
         "subject": "Analysis Report",
         "feature": {...},
         "raw_analysis": "..."
     }
+    Returns 202 with the message id; delivery status is at /api/send-email/<message_id>
     """
     try:
         data = request.get_json()
@@ -463,31 +774,53 @@ def send_email():
             return jsonify({"error": "Recipient email is required"}), 400
             
         # Basic email validation
-        import re
         email_regex = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
         if not re.match(email_regex, to_email):
             return jsonify({"error": "Invalid email address"}), 400
+        # Line breaks in a header would let the client inject headers (e.g. Bcc)
+        if not isinstance(subject, str) or '\r' in subject or '\n' in subject:
+            return jsonify({"error": "Subject must be a single line of text"}), 400
+
+        try:
+            feature = {**feature, 'regions_affected': regions_list(feature.get('regions_affected'))}
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
             
         # Create email content
         email_body = create_email_body(feature, raw_analysis)
         
-        # For demo purposes, we'll simulate sending email
-        # In production, you would configure SMTP settings
-        success = send_email_smtp(to_email, subject, email_body)
+        # Delivery happens in the outbox's background sender
+        message_id = get_email_outbox().enqueue(to_email, subject, email_body)
+        get_audit_store().record(
+            "email",
+            feature_id=feature.get('id'),
+            feature_name=feature.get('title'),
+            flag=feature.get('flag'),
+            jurisdictions=feature.get('regions_affected', []),
+            actor=data.get('actor'),
+            payload={"message_id": message_id, "to": to_email, "subject": subject}
+        )
         
-        if success:
-            return jsonify({
-                "success": True,
-                "message": f"Analysis report sent to {to_email}"
-            })
-        else:
-            return jsonify({"error": "Failed to send email"}), 500
+        return jsonify({
+            "success": True,
+            "message_id": message_id,
+            "status": "queued",
+            "message": f"Analysis report queued for {to_email}"
+        }), 202
             
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
+        print(f"Error queueing email: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": f"Email sending failed: {str(e)}"}), 500
 
+@app.route('/api/send-email/<message_id>', methods=['GET'])
+def get_email_status(message_id):
+    """Delivery status of a queued email"""
+    status = get_email_outbox().status(message_id)
+    if status is None:
+        return jsonify({"error": "Unknown message id"}), 404
+    return jsonify(status)
+
 def create_email_body(feature, raw_analysis):
     """Create formatted email body with analysis report"""
     
@@ -550,46 +883,6 @@ def create_email_body(feature, raw_analysis):
     
     return html_body
 
-def send_email_smtp(to_email, subject, html_body):
-    """
-    Send email using SMTP (demo version)
-    In production, configure with real SMTP settings
-    """
-    try:
-        # For demo purposes, we'll just simulate successful email sending
-        # In production, you would use real SMTP settings like this:
-        
-        # SMTP Configuration (example - replace with your settings)
-        # smtp_server = "smtp.gmail.com"
-        # smtp_port = 587
-        # sender_email = "your-app@company.com"
-        # sender_password = "your-app-password"
-        
-        # msg = MIMEMultipart('alternative')
-        # msg['Subject'] = subject
-        # msg['From'] = sender_email
-        # msg['To'] = to_email
-        # 
-        # html_part = MIMEText(html_body, 'html')
-        # msg.attach(html_part)
-        # 
-        # server = smtplib.SMTP(smtp_server, smtp_port)
-        # server.starttls()
-        # server.login(sender_email, sender_password)
-        # server.send_message(msg)
-        # server.quit()
-        
-        # For demo, we'll just log and return success
-        print(f"DEMO: Email would be sent to {to_email}")
-        print(f"Subject: {subject}")
-        print("Email content prepared successfully")
-        
-        return True
-        
-    except Exception as e:
-        print(f"SMTP Error: {str(e)}")
-        return False
-
 @app.route('/api/sources', methods=['GET'])
 def get_available_sources():
     """Get list of available regulatory source documents"""
@@ -601,4 +894,6 @@ def get_available_sources():
 if __name__ == '__main__':
     print("Starting GeoReg Compliance API...")
     print("Available sources:", list(SOURCE_COLLECTION_MAP.keys()))
+    warm_parse_pool()
+    get_health_monitor()
     app.run(debug=False, host='0.0.0.0', port=5001)
@@ -0,0 +1,370 @@
+import os
+import json
+import time
+import queue
+import logging
+import atexit
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+# ---------------------- Audit Store Settings ----------------------
+# Append-only history of analyses, overrides and emails. record() only puts the event
+# on an in-memory queue; a writer thread inserts queued events in batches, one
+# transaction per batch, at most AUDIT_FLUSH_INTERVAL_MS after they were recorded. If a
+# batch fails, its events are written one by one so only the bad event is dropped.
+# The same transaction keeps a features table with the latest state of every analyzed
+# feature (its analysis plus any override) for listing and export.
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+AUDIT_DB_PATH = os.getenv("AUDIT_DB_PATH", os.path.join(data_folder, "audit.sqlite"))
+AUDIT_FLUSH_INTERVAL_MS = float(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "500"))
+AUDIT_FLUSH_BATCH = int(os.getenv("AUDIT_FLUSH_BATCH", "500"))
+AUDIT_QUEUE_MAX = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))  # record() blocks beyond this rather than drop events
+AUDIT_PAGE_MAX = 500
+FEATURE_COLUMNS = ("id", "title", "description", "flag", "reasoning", "age", "related_regulation",
+                   "regions_affected", "created_at", "updated_at", "overridden_by")
+
+AUDIT_EVENT_TYPES = ("analysis", "override", "email")
+
+logger = logging.getLogger(__name__)
+
+
+def column_text(value):
+    """A value for a TEXT column: strings and None as they are, anything else (e.g. a list from an LLM) as JSON."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class AuditStore:
+    """SQLite (WAL) audit log with write-behind batching and keyset-paginated reads."""
+
+    def __init__(self, path: str = AUDIT_DB_PATH, flush_interval_ms: float = AUDIT_FLUSH_INTERVAL_MS,
+                 flush_batch: int = AUDIT_FLUSH_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_batch = flush_batch
+        self.batches = 0
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=AUDIT_QUEUE_MAX)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS audit_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_id TEXT NOT NULL UNIQUE,
+                event_type TEXT NOT NULL,
+                feature_id TEXT,
+                feature_name TEXT,
+                flag TEXT,
+                actor TEXT,
+                created_at TEXT NOT NULL,
+                payload TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS audit_event_jurisdictions (
+                jurisdiction TEXT NOT NULL,
+                event_rowid INTEGER NOT NULL,
+                PRIMARY KEY (jurisdiction, event_rowid)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_audit_jurisdiction_event ON audit_event_jurisdictions (event_rowid);
+            CREATE INDEX IF NOT EXISTS idx_audit_feature ON audit_events (feature_id, id);
+            CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_events (created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_audit_flag ON audit_events (flag, id);
+            CREATE INDEX IF NOT EXISTS idx_audit_type ON audit_events (event_type, id);
+            CREATE TABLE IF NOT EXISTS features (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                feature_id TEXT NOT NULL UNIQUE,
+                title TEXT,
+                description TEXT,
+                flag TEXT,
+                reasoning TEXT,
+                age TEXT,
+                related_regulation TEXT,
+                regions TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                overridden_by TEXT
+            );
+            CREATE TABLE IF NOT EXISTS feature_regions (
+                region TEXT NOT NULL,
+                feature_seq INTEGER NOT NULL,
+                PRIMARY KEY (region, feature_seq)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_feature_regions_feature ON feature_regions (feature_seq);
+            CREATE INDEX IF NOT EXISTS idx_features_flag ON features (flag, seq);
+            CREATE INDEX IF NOT EXISTS idx_features_created ON features (created_at, seq);
+            """
+        )
+        self._conn.commit()
+        self._rebuild_features_if_empty()
+
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, event_type: str, feature_id: str = None, feature_name: str = None, flag: str = None,
+               jurisdictions=(), actor: str = None, payload: dict = None) -> str:
+        """Queue an event for writing; returns its event id. Does not touch the database."""
+        if event_type not in AUDIT_EVENT_TYPES:
+            raise ValueError(f"Unknown audit event type: {event_type}")
+        if isinstance(jurisdictions, str):
+            jurisdictions = [jurisdictions]  # a bare "EU" is one jurisdiction, not "E" and "U"
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": event_type,
+            "feature_id": feature_id,
+            "feature_name": feature_name,
+            "flag": flag,
+            "actor": actor,
+            "created_at": datetime.now().isoformat(),
+            # Anything but a non-empty string (e.g. a list an LLM put in location) is skipped
+            "jurisdictions": sorted({j.strip().upper() for j in jurisdictions if isinstance(j, str) and j.strip()}),
+            "payload": payload or {}
+        }
+        self._queue.put(event)
+        return event["event_id"]
+
+    def flush(self):
+        """Block until every event recorded so far has been written."""
+        self._queue.join()
+
+    # ---------------------- Writer ----------------------
+
+    def _next_batch(self) -> list:
+        """Wait for an event, then collect more for up to the flush interval or a full batch."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            except Exception:
+                # Never let the writer die: record() would block once the queue is full
+                logger.exception("Audit store writer failed, %d events not written", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: list):
+        with self._lock:
+            try:
+                with self._conn:
+                    for event in batch:
+                        self._insert(event)
+                self.written += len(batch)
+            except Exception:
+                logger.warning("Audit batch of %d events failed, writing them one by one", len(batch), exc_info=True)
+                for event in batch:
+                    try:
+                        with self._conn:
+                            self._insert(event)
+                        self.written += 1
+                    except Exception:
+                        self.dropped += 1
+                        logger.exception("Audit event %s (%s) dropped", event["event_id"], event["event_type"])
+            self.batches += 1
+
+    def _insert(self, event: dict):
+        """Write one event, its jurisdictions and its effect on the features table (caller holds the transaction)."""
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO audit_events "
+            "(event_id, event_type, feature_id, feature_name, flag, actor, created_at, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (event["event_id"], event["event_type"], column_text(event["feature_id"]),
+             column_text(event["feature_name"]), column_text(event["flag"]), column_text(event["actor"]),
+             event["created_at"],
+             json.dumps(event["payload"], ensure_ascii=False, default=str))
+        )
+        if cursor.rowcount == 0:
+            return
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO audit_event_jurisdictions (jurisdiction, event_rowid) VALUES (?, ?)",
+            [(jurisdiction, cursor.lastrowid) for jurisdiction in event["jurisdictions"]]
+        )
+        self._apply_to_features(event)
+
+    def _apply_to_features(self, event: dict):
+        """Fold an analysis or override event into the features table (caller holds the transaction)."""
+        if event["event_type"] == "analysis":
+            feature = event["payload"].get("feature") or {}
+            regions = sorted({r.strip().upper() for r in feature.get("regions_affected") or []
+                              if isinstance(r, str) and r.strip()})
+            self._conn.execute(
+                "INSERT INTO features (feature_id, title, description, flag, reasoning, age, related_regulation, "
+                "regions, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (feature_id) DO UPDATE SET title = excluded.title, description = excluded.description, "
+                "flag = excluded.flag, reasoning = excluded.reasoning, age = excluded.age, "
+                "related_regulation = excluded.related_regulation, regions = excluded.regions, "
+                "updated_at = excluded.updated_at, overridden_by = NULL",
+                (column_text(event["feature_id"]),
+                 *[column_text(feature.get(field)) for field in
+                   ("title", "description", "flag", "reasoning", "age", "related_regulation")],
+                 json.dumps(regions), column_text(feature.get("created_at")) or event["created_at"],
+                 event["created_at"])
+            )
+            seq = self._conn.execute("SELECT seq FROM features WHERE feature_id = ?",
+                                     (column_text(event["feature_id"]),)).fetchone()[0]
+            self._conn.execute("DELETE FROM feature_regions WHERE feature_seq = ?", (seq,))
+            self._conn.executemany("INSERT INTO feature_regions (region, feature_seq) VALUES (?, ?)",
+                                   [(region, seq) for region in regions])
+        elif event["event_type"] == "override":
+            self._conn.execute(
+                "UPDATE features SET flag = ?, overridden_by = ?, updated_at = ? WHERE feature_id = ?",
+                (column_text(event["flag"]), column_text(event["actor"]) or "unknown", event["created_at"],
+                 column_text(event["feature_id"]))
+            )
+
+    def _rebuild_features_if_empty(self):
+        """Populate the features table from the audit log, e.g. for a log written before the table existed."""
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM features LIMIT 1").fetchone():
+                return
+            rows = self._conn.execute(
+                "SELECT event_type, feature_id, flag, actor, created_at, payload FROM audit_events "
+                "WHERE event_type IN ('analysis', 'override') AND feature_id IS NOT NULL ORDER BY id"
+            )
+            for event_type, feature_id, flag, actor, created_at, payload in rows.fetchall():
+                self._apply_to_features({"event_type": event_type, "feature_id": feature_id, "flag": flag,
+                                         "actor": actor, "created_at": created_at, "payload": json.loads(payload)})
+
+    # ---------------------- Reads ----------------------
+
+    def query(self, feature_id: str = None, event_type: str = None, flag: str = None, jurisdiction: str = None,
+              since: str = None, until: str = None, cursor: str = None, limit: int = 50):
+        """
+        Events newest first, as (events, next_cursor). Pagination is by keyset on the row id:
+        pass next_cursor back to get the following page; it is None on the last page.
+        since/until are ISO timestamps (inclusive / exclusive).
+        """
+        limit = max(1, min(int(limit), AUDIT_PAGE_MAX))
+        clauses, params = [], []
+        for column, value in (("feature_id", feature_id), ("event_type", event_type), ("flag", flag)):
+            if value:
+                clauses.append(f"e.{column} = ?")
+                params.append(value)
+        if jurisdiction:
+            clauses.append("e.id IN (SELECT event_rowid FROM audit_event_jurisdictions WHERE jurisdiction = ?)")
+            params.append(jurisdiction.strip().upper())
+        if since:
+            clauses.append("e.created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("e.created_at < ?")
+            params.append(until)
+        if cursor:
+            clauses.append("e.id < ?")
+            params.append(int(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT e.id, e.event_id, e.event_type, e.feature_id, e.feature_name, e.flag, e.actor, e.created_at, "
+                "e.payload, (SELECT group_concat(jurisdiction) FROM audit_event_jurisdictions WHERE event_rowid = e.id) "
+                f"FROM audit_events e {where} ORDER BY e.id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+
+        events = [
+            {
+                "event_id": event_id,
+                "event_type": event_type,
+                "feature_id": feature_id,
+                "feature_name": feature_name,
+                "flag": flag,
+                "actor": actor,
+                "created_at": created_at,
+                "jurisdictions": jurisdictions.split(",") if jurisdictions else [],
+                "payload": json.loads(payload)
+            }
+            for _, event_id, event_type, feature_id, feature_name, flag, actor, created_at, payload, jurisdictions
+            in rows[:limit]
+        ]
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return events, next_cursor
+
+    def list_features(self, flag: str = None, regulation: str = None, region: str = None, since: str = None,
+                      until: str = None, cursor: str = None, limit: int = 50):
+        """
+        Latest state of analyzed features, newest first, as (features, next_cursor); keyset
+        pagination on the insertion order like query(). regulation matches a substring of
+        related_regulation (case-insensitive); since/until bound created_at.
+        """
+        limit = max(1, min(int(limit), AUDIT_PAGE_MAX))
+        clauses, params = [], []
+        if flag:
+            clauses.append("flag = ?")
+            params.append(flag)
+        if regulation:
+            clauses.append("related_regulation LIKE ?")
+            params.append(f"%{regulation}%")
+        if region:
+            clauses.append("seq IN (SELECT feature_seq FROM feature_regions WHERE region = ?)")
+            params.append(region.strip().upper())
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor:
+            clauses.append("seq < ?")
+            params.append(int(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, feature_id, title, description, flag, reasoning, age, related_regulation, regions, "
+                f"created_at, updated_at, overridden_by FROM features {where} ORDER BY seq DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+
+        features = []
+        for row in rows[:limit]:
+            feature = dict(zip(FEATURE_COLUMNS, row[1:]))
+            feature["regions_affected"] = json.loads(feature["regions_affected"])
+            features.append(feature)
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return features, next_cursor
+
+    def iter_features(self, page_size: int = AUDIT_PAGE_MAX, **filters):
+        """All features matching list_features filters, read one page at a time (the lock is not held between pages)."""
+        cursor = None
+        while True:
+            features, cursor = self.list_features(cursor=cursor, limit=page_size, **filters)
+            yield from features
+            if cursor is None:
+                return
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped,
+                "batches": self.batches}
+
+
+_audit_store = None
+_audit_store_lock = threading.Lock()
+
+def get_audit_store() -> AuditStore:
+    """Shared audit store; pending events are flushed when the process exits."""
+    global _audit_store
+    with _audit_store_lock:
+        if _audit_store is None:
+            _audit_store = AuditStore()
+            atexit.register(_audit_store.flush)
+        return _audit_store
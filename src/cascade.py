@@ -0,0 +1,109 @@
+import os
+import json
+import threading
+from collections import Counter
+
+# ---------------------- Cascade Settings ----------------------
+# With OLLAMA_SMALL_CHAT_MODEL set, a stage first asks the small model CASCADE_SAMPLES
+# times and only escalates to the large model when an answer is invalid JSON, "Maybe",
+# or the samples disagree. Leave it unset to send everything to the large model.
+OLLAMA_SMALL_CHAT_MODEL = os.getenv("OLLAMA_SMALL_CHAT_MODEL", "")
+CASCADE_SAMPLES = int(os.getenv("CASCADE_SAMPLES", "2"))
+CASCADE_MIN_AGREEMENT = float(os.getenv("CASCADE_MIN_AGREEMENT", "1.0"))  # share of samples agreeing with the first
+CASCADE_SAMPLE_TEMPERATURE = float(os.getenv("CASCADE_SAMPLE_TEMPERATURE", "0.7"))
+
+
+def parse_json_object(text: str):
+    """Model output as a dict (first element if it answered with a list), or None if it is not valid JSON."""
+    try:
+        value = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return value if isinstance(value, dict) else None
+
+def sample_options(index: int) -> dict:
+    """The first sample is greedy; later ones are sampled with fixed seeds so they stay cacheable."""
+    if index == 0:
+        return {"temperature": 0}
+    return {"temperature": CASCADE_SAMPLE_TEMPERATURE, "seed": index}
+
+# ---------------------- Escalation Stats ----------------------
+
+class CascadeStats:
+    """Per-stage counts of small-model answers kept vs escalated, with the reason for each escalation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage: str, escalated_reason: str = None):
+        with self._lock:
+            stats = self._stages.setdefault(stage, {"calls": 0, "escalated": 0, "reasons": Counter()})
+            stats["calls"] += 1
+            if escalated_reason:
+                stats["escalated"] += 1
+                stats["reasons"][escalated_reason] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                stage: {
+                    "calls": stats["calls"],
+                    "escalated": stats["escalated"],
+                    "escalation_rate": round(stats["escalated"] / stats["calls"], 3) if stats["calls"] else 0.0,
+                    "reasons": dict(stats["reasons"])
+                }
+                for stage, stats in self._stages.items()
+            }
+
+
+_cascade_stats = CascadeStats()
+
+def get_cascade_stats() -> CascadeStats:
+    return _cascade_stats
+
+# ---------------------- Cascade ----------------------
+
+def run_cascade(stage: str, chat, messages: list, label, small_model: str = None,
+                samples: int = None, min_agreement: float = None) -> str:
+    """
+    Answer messages with the small model when it is confident, else with the large one.
+
+    chat(messages, model=None, options=None) returns the raw model text; model=None means the large model.
+    label(parsed) maps a parsed JSON answer to the value samples must agree on, or None when
+    the answer is not usable (e.g. "Maybe"). Returns the raw text of the accepted answer.
+    """
+    small_model = OLLAMA_SMALL_CHAT_MODEL if small_model is None else small_model
+    if not small_model:
+        return chat(messages)
+    samples = samples or CASCADE_SAMPLES
+    min_agreement = CASCADE_MIN_AGREEMENT if min_agreement is None else min_agreement
+
+    first_text = None
+    labels = []
+    reason = None
+    for index in range(samples):
+        text = chat(messages, model=small_model, options=sample_options(index))
+        parsed = parse_json_object(text)
+        if parsed is None:
+            reason = "invalid_json"
+            break
+        value = label(parsed)
+        if value is None:
+            reason = "low_confidence"
+            break
+        if first_text is None:
+            first_text = text
+        labels.append(value)
+
+    if reason is None:
+        agreement = labels.count(labels[0]) / len(labels)
+        if agreement < min_agreement:
+            reason = "disagreement"
+
+    get_cascade_stats().record(stage, reason)
+    if reason is None:
+        return first_text
+    return chat(messages)
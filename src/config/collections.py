@@ -1,3 +1,5 @@
+import os
+
 # Map source file to collection names
 SOURCE_COLLECTION_MAP = {
     "eu_dsa.pdf": "eu_regulation",
@@ -6,3 +8,50 @@ SOURCE_COLLECTION_MAP = {
     "ncmec.pdf": "ncmec_regulation",
     "ca_poksmaa.pdf": "ca_regulation"
 }
+
+# Collection layouts, selectable at ingestion (utils/embed_documents.py --profile)
+# and at query time (query_qdrant(profile=...)). Keys left out fall back to Qdrant defaults.
+#   hnsw:            index build settings (m, ef_construct)
+#   hnsw_ef:         search-time beam width
+#   quantization:    "scalar" (int8, ~4x smaller) or "binary" (~32x smaller), kept in RAM
+#   oversampling:    candidates fetched per result from the quantized index before rescoring
+#   rescore:         rescore quantized candidates with the original vectors
+#   on_disk_vectors / on_disk_payload: keep originals and payloads memory-mapped on disk
+#   exact:           brute-force search, bypassing the HNSW index
+#   matryoshka_dim:  also store a truncated, re-normalized copy of each vector as a separate
+#                    named vector; search it first, then rescore the candidates at full dimension
+#   candidate_multiplier: candidates fetched from the truncated vectors per requested result
+COLLECTION_PROFILES = {
+    "default": {},
+    "balanced": {
+        "hnsw": {"m": 16, "ef_construct": 128},
+        "hnsw_ef": 128,
+        "quantization": "scalar",
+        "oversampling": 2.0,
+        "rescore": True
+    },
+    "compact": {
+        "hnsw": {"m": 16, "ef_construct": 100},
+        "hnsw_ef": 128,
+        "quantization": "binary",
+        "oversampling": 3.0,
+        "rescore": True,
+        "on_disk_vectors": True,
+        "on_disk_payload": True
+    },
+    "exact": {
+        "exact": True
+    },
+    "matryoshka": {
+        "hnsw_ef": 128,
+        "matryoshka_dim": 256,
+        "candidate_multiplier": 4,
+        "on_disk_vectors": True
+    }
+}
+
+# Named vectors used by profiles with matryoshka_dim
+FULL_VECTOR_NAME = "full"
+TRUNCATED_VECTOR_NAME = "truncated"
+
+DEFAULT_COLLECTION_PROFILE = os.getenv("COLLECTION_PROFILE", "default")
@@ -0,0 +1,129 @@
+import os
+import re
+import json
+from datetime import datetime
+import numpy as np
+import pyarrow as pa
+
+from docstore import docstore_rows
+
+# ---------------------- Corpus Settings ----------------------
+# A corpus version is a directory holding:
+#   chunks.arrow                 chunk_id, source_file, position, text, metadata (JSON) as an Arrow IPC file
+#   embeddings.<model>.npy       row-aligned embedding matrix, one per embedding model
+#   manifest.json                format version, row count and the embedding files with their model/dim/dtype
+CORPUS_FORMAT_VERSION = 1
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+CORPUS_DIR = os.getenv("CORPUS_DIR", os.path.join(data_folder, "corpus", f"v{CORPUS_FORMAT_VERSION}"))
+
+CHUNKS_FILE_NAME = "chunks.arrow"
+MANIFEST_FILE_NAME = "manifest.json"
+
+CHUNK_SCHEMA = pa.schema([
+    ("chunk_id", pa.string()),
+    ("source_file", pa.string()),
+    ("position", pa.int32()),
+    ("text", pa.string()),
+    ("metadata", pa.string()),
+])
+
+# ---------------------- Helpers ----------------------
+
+def embeddings_file_name(model: str) -> str:
+    """File name for a model's embedding matrix, e.g. embeddings.mxbai-embed-large.npy"""
+    return f"embeddings.{re.sub(r'[^A-Za-z0-9._-]+', '_', model)}.npy"
+
+def load_manifest(corpus_dir: str = CORPUS_DIR) -> dict:
+    path = os.path.join(corpus_dir, MANIFEST_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != CORPUS_FORMAT_VERSION:
+        raise ValueError(f"Corpus at {corpus_dir} has format version {manifest.get('format_version')}, "
+                         f"expected {CORPUS_FORMAT_VERSION}")
+    return manifest
+
+def _save_manifest(manifest: dict, corpus_dir: str):
+    path = os.path.join(corpus_dir, MANIFEST_FILE_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+# ---------------------- Writing ----------------------
+
+def write_corpus(chunks, corpus_dir: str = CORPUS_DIR, source: str = "chunks_output.json") -> dict:
+    """
+    Write (text, metadata) pairs as the columnar chunk file of a corpus version.
+    Rewriting the chunks invalidates embedding sidecars, so they are dropped from the manifest.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    rows = docstore_rows(chunks)
+    table = pa.table({
+        "chunk_id": [r[0] for r in rows],
+        "source_file": [r[1] for r in rows],
+        "position": [r[2] for r in rows],
+        "text": [r[3] for r in rows],
+        "metadata": [json.dumps(r[4], ensure_ascii=False) for r in rows],
+    }, schema=CHUNK_SCHEMA)
+
+    # Uncompressed Arrow IPC so readers can memory-map it without decoding
+    with pa.OSFile(os.path.join(corpus_dir, CHUNKS_FILE_NAME), "wb") as sink:
+        with pa.ipc.new_file(sink, CHUNK_SCHEMA) as writer:
+            writer.write_table(table)
+
+    manifest = {
+        "format_version": CORPUS_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "source": source,
+        "num_rows": len(rows),
+        "embeddings": {}
+    }
+    _save_manifest(manifest, corpus_dir)
+    return manifest
+
+def write_embeddings(matrix, model: str, corpus_dir: str = CORPUS_DIR, dtype: str = "float16") -> dict:
+    """Store a row-aligned embedding matrix for model next to the chunk file."""
+    manifest = load_manifest(corpus_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No corpus at {corpus_dir}; write the chunks first")
+    matrix = np.asarray(matrix, dtype=dtype)
+    if matrix.ndim != 2 or matrix.shape[0] != manifest["num_rows"]:
+        raise ValueError(f"Embedding matrix shape {matrix.shape} does not match {manifest['num_rows']} corpus rows")
+
+    file_name = embeddings_file_name(model)
+    np.save(os.path.join(corpus_dir, file_name), matrix)
+    manifest["embeddings"][model] = {
+        "file": file_name,
+        "dim": int(matrix.shape[1]),
+        "dtype": dtype,
+        "created_at": datetime.now().isoformat()
+    }
+    _save_manifest(manifest, corpus_dir)
+    return manifest
+
+# ---------------------- Loading ----------------------
+
+def load_chunks_table(corpus_dir: str = CORPUS_DIR) -> pa.Table:
+    """Memory-map the chunk file; columns are read straight from the page cache."""
+    source = pa.memory_map(os.path.join(corpus_dir, CHUNKS_FILE_NAME), "r")
+    return pa.ipc.open_file(source).read_all()
+
+def load_chunks(corpus_dir: str = CORPUS_DIR) -> list:
+    """(text, metadata) pairs in the same shape as chunks_output.json."""
+    table = load_chunks_table(corpus_dir)
+    return [(text, json.loads(meta)) for text, meta in
+            zip(table.column("text").to_pylist(), table.column("metadata").to_pylist())]
+
+def load_embeddings(model: str, corpus_dir: str = CORPUS_DIR) -> np.ndarray:
+    """Memory-mapped, read-only embedding matrix for model, or None if it was never built."""
+    manifest = load_manifest(corpus_dir)
+    if manifest is None or model not in manifest["embeddings"]:
+        return None
+    entry = manifest["embeddings"][model]
+    matrix = np.load(os.path.join(corpus_dir, entry["file"]), mmap_mode="r")
+    if matrix.shape != (manifest["num_rows"], entry["dim"]):
+        raise ValueError(f"Embedding file {entry['file']} has shape {matrix.shape}, manifest says "
+                         f"({manifest['num_rows']}, {entry['dim']})")
+    return matrix
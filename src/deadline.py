@@ -0,0 +1,107 @@
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+
+# ---------------------- Deadline Settings ----------------------
+# A client may give /analyze_feature a time budget (X-Request-Deadline-Ms header or a
+# deadline_ms field). The budget is carried in a context variable: each pipeline stage
+# gets a share of what is left when it starts (unused time rolls over to later stages),
+# and downstream calls use the remaining time as their timeout. Without a budget
+# nothing changes.
+REQUEST_DEADLINE_HEADER = "X-Request-Deadline-Ms"
+DEFAULT_DEADLINE_MS = os.getenv("ANALYSIS_DEFAULT_DEADLINE_MS", "")   # empty: no deadline unless the client sets one
+DEADLINE_MAX_MS = float(os.getenv("ANALYSIS_DEADLINE_MAX_MS", "300000"))
+# Share of the remaining budget each stage may use, in pipeline order
+STAGE_SHARES = {"entities": 0.25, "retrieval": 0.15, "classify": 0.6}
+# With less than this left, retrieval only searches the best routed collection
+MIN_EXTRA_COLLECTION_MS = float(os.getenv("DEADLINE_MIN_EXTRA_COLLECTION_MS", "1500"))
+
+_request_deadline = contextvars.ContextVar("request_deadline", default=None)  # time.monotonic() value
+_stage_deadline = contextvars.ContextVar("stage_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's (or current stage's) time budget ran out."""
+
+    def __init__(self, where: str):
+        super().__init__(f"Deadline exceeded during {where}")
+        self.where = where
+
+
+def parse_deadline_ms(header_value=None, body_value=None):
+    """Budget in ms from the header or request field (header wins), capped at DEADLINE_MAX_MS; None if unset."""
+    for value in (header_value, body_value, DEFAULT_DEADLINE_MS or None):
+        if value in (None, ""):
+            continue
+        budget = float(value)
+        if budget <= 0:
+            raise ValueError("deadline must be a positive number of milliseconds")
+        return min(budget, DEADLINE_MAX_MS)
+    return None
+
+def set_request_deadline(budget_ms):
+    """Start the current request's budget (None: no deadline); pass the token to reset_request_deadline."""
+    return _request_deadline.set(time.monotonic() + budget_ms / 1000 if budget_ms else None)
+
+def reset_request_deadline(token):
+    _request_deadline.reset(token)
+
+@contextmanager
+def request_deadline(budget_ms):
+    """Run the block under a budget of budget_ms (None: no deadline)."""
+    token = set_request_deadline(budget_ms)
+    try:
+        yield
+    finally:
+        reset_request_deadline(token)
+
+def request_time_remaining():
+    """Seconds left for the whole request, or None without a deadline."""
+    deadline = _request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def time_remaining():
+    """Seconds left for the current stage (never more than the request has), or None."""
+    deadlines = [d for d in (_request_deadline.get(), _stage_deadline.get()) if d is not None]
+    return min(deadlines) - time.monotonic() if deadlines else None
+
+@contextmanager
+def stage(name: str):
+    """
+    Run a pipeline stage under its share of the remaining budget. Raises DeadlineExceeded
+    on entry if the request budget is already spent.
+    """
+    remaining = request_time_remaining()
+    if remaining is None:
+        yield
+        return
+    if remaining <= 0:
+        raise DeadlineExceeded(name)
+    stages = list(STAGE_SHARES)
+    share = STAGE_SHARES[name] / sum(STAGE_SHARES[s] for s in stages[stages.index(name):])
+    token = _stage_deadline.set(time.monotonic() + remaining * share)
+    try:
+        yield
+    finally:
+        _stage_deadline.reset(token)
+
+def call_timeout(default: float, where: str) -> float:
+    """Timeout for a downstream call: default, or less if the deadline is nearer."""
+    remaining = time_remaining()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise DeadlineExceeded(where)
+    return min(default, remaining)
+
+def raise_if_expired(where: str):
+    """After a failed call: raise DeadlineExceeded instead if the deadline has passed (it caused the timeout)."""
+    remaining = time_remaining()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(where)
+
+def budget_is_short(min_ms: float = MIN_EXTRA_COLLECTION_MS) -> bool:
+    """True when a deadline is set and less than min_ms of the current stage is left."""
+    remaining = time_remaining()
+    return remaining is not None and remaining * 1000 < min_ms
@@ -0,0 +1,182 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import uuid
+
+# ---------------------- Docstore Settings ----------------------
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+DOCSTORE_PATH = os.getenv("DOCSTORE_PATH", os.path.join(data_folder, "docstore.sqlite"))
+# Query-time expansion of retrieved chunks (see ChunkDocstore.expand)
+EXPAND_NEIGHBOURS = int(os.getenv("EXPAND_NEIGHBOURS", "1"))
+EXPAND_TO_PARENT = os.getenv("EXPAND_TO_PARENT", "true").lower() in ("1", "true", "yes")
+CONTEXT_CHAR_BUDGET = int(os.getenv("CONTEXT_CHAR_BUDGET", "3000"))
+
+# Fixed namespace so the same chunk always gets the same id across ingestion runs
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c3a52-52b4-4d8e-9a57-1e0b8f3c2d41")
+
+# ---------------------- Chunk Ids ----------------------
+
+def chunk_id(source_file: str, text: str, position: int = None, parent_id: str = None) -> str:
+    """
+    Deterministic chunk id, used both as the Qdrant point id and the docstore key.
+    Derived from the source file, the parent and position of the chunk in the document,
+    and its text: re-ingesting an unchanged document overwrites the same points instead
+    of adding new ones, while repeated boilerplate within a document keeps one id per copy.
+    """
+    digest = hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+    if position is None and parent_id is None:
+        return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source_file.lower()}:{digest}"))
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source_file.lower()}:{parent_id or ''}:{position}:{digest}"))
+
+# ---------------------- Docstore ----------------------
+
+class ChunkDocstore:
+    """
+    Local SQLite store of chunk texts and metadata keyed by chunk id.
+    Vector search only returns ids and scores; texts are looked up here
+    for the chunks that survive final ranking.
+    """
+
+    def __init__(self, path: str = DOCSTORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                source_file TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                parent_id TEXT
+            )
+            """
+        )
+        # Stores created before parent-child chunking lack the parent column
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")]
+        if "parent_id" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN parent_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_order ON chunks (source_file, position)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_parent ON chunks (parent_id, position)")
+        self._conn.commit()
+
+    def put_many(self, rows):
+        """Insert or replace (chunk_id, source_file, position, text, metadata) rows; parent_id comes from metadata."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, source_file, position, text, metadata, parent_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(cid, sf, pos, text, json.dumps(meta, ensure_ascii=False), meta.get("parent_id"))
+                 for cid, sf, pos, text, meta in rows]
+            )
+            self._conn.commit()
+
+    def get_many(self, chunk_ids) -> dict:
+        """Return {chunk_id: {"text": ..., "metadata": ...}} for the ids present in the store."""
+        chunk_ids = [str(cid) for cid in chunk_ids]
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({placeholders})",
+                chunk_ids
+            ).fetchall()
+        return {cid: {"text": text, "metadata": json.loads(meta)} for cid, text, meta in rows}
+
+    def expand(self, chunk_ids, neighbours: int = EXPAND_NEIGHBOURS, max_chars: int = CONTEXT_CHAR_BUDGET,
+               use_parent: bool = EXPAND_TO_PARENT) -> list:
+        """
+        Context for ranked chunk ids: each winner is widened to its parent section when it
+        has one that fits, else to +/- neighbours chunks in document order. Winners are
+        expanded best first until max_chars is spent; chunks already included by an earlier
+        expansion are not repeated, and a winner that no longer fits is returned as is.
+        Returns one text per winner that produced new text, in rank order.
+        """
+        texts = []
+        used = 0
+        seen = set()
+        with self._lock:
+            for cid in (str(cid) for cid in chunk_ids):
+                if cid in seen:
+                    continue
+                row = self._conn.execute(
+                    "SELECT source_file, position, text, parent_id FROM chunks WHERE chunk_id = ?", (cid,)
+                ).fetchone()
+                if row is None:
+                    continue
+                source_file, position, text, parent_id = row
+
+                group = []
+                if use_parent and parent_id:
+                    group = self._conn.execute(
+                        "SELECT chunk_id, text FROM chunks WHERE parent_id = ? ORDER BY position", (parent_id,)
+                    ).fetchall()
+                if len(group) <= 1 and neighbours:
+                    group = self._conn.execute(
+                        "SELECT chunk_id, text FROM chunks WHERE source_file = ? AND position BETWEEN ? AND ? "
+                        "ORDER BY position",
+                        (source_file, position - neighbours, position + neighbours)
+                    ).fetchall()
+                group = [(gid, gtext) for gid, gtext in group if gid not in seen] or [(cid, text)]
+
+                expanded = " ".join(gtext for _, gtext in group)
+                if used + len(expanded) > max_chars:
+                    # Not enough budget for the wider context: fall back to the chunk itself
+                    group = [(cid, text)]
+                    expanded = text
+                    if used and used + len(expanded) > max_chars:
+                        break
+                seen.update(gid for gid, _ in group)
+                texts.append(expanded)
+                used += len(expanded)
+        return texts
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_docstore = None
+_docstore_lock = threading.Lock()
+
+def get_docstore() -> ChunkDocstore:
+    """Shared docstore for the process, opened on first use."""
+    global _docstore
+    with _docstore_lock:
+        if _docstore is None:
+            _docstore = ChunkDocstore()
+        return _docstore
+
+def docstore_rows(chunks):
+    """
+    Turn (text, metadata) pairs from chunks_output.json into docstore rows. Chunk files
+    from the parent-child chunker carry position (document order) in their metadata;
+    older ones fall back to the order of chunks within each source file.
+    """
+    positions = {}
+    rows = []
+    for text, meta in chunks:
+        source_file = meta.get("source_file", "")
+        position = positions.get(source_file, 0)
+        positions[source_file] = position + 1
+        position = meta.get("position", position)
+        rows.append((chunk_id(source_file, text, position, meta.get("parent_id")), source_file, position, text, meta))
+    return rows
+
+# ---------------------- Build from chunk file ----------------------
+if __name__ == "__main__":
+    chunks_file = os.path.join(data_folder, "chunks_output.json")
+    with open(chunks_file, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+
+    store = get_docstore()
+    store.put_many(docstore_rows(chunks))
+    print(f"Docstore at {store.path} holds {store.count()} chunks")
@@ -0,0 +1,133 @@
+import os
+import atexit
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF for PDF parsing
+import docx  # python-docx for DOCX parsing
+
+# ---------------------- Parser Settings ----------------------
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))            # processes shared by all requests
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "500"))
+PAGES_PER_TASK = int(os.getenv("PARSE_PAGES_PER_TASK", "20"))   # page range handed to one worker
+PARSE_TIMEOUT_SECONDS = float(os.getenv("PARSE_TIMEOUT_SECONDS", "60"))
+PREVIEW_CHARS = 1000  # /api/parse returns this much raw text as a preview
+FEATURE_MARKERS = ("Feature Title:", "Description:")
+UPLOAD_COPY_BUFFER = 1024 * 1024
+# Part of the parse cache key: bump whenever text extraction or feature_extraction changes
+PARSER_VERSION = "2"
+
+
+class DocumentTooLargeError(ValueError):
+    """Upload exceeds the configured size or page limit."""
+
+
+# ---------------------- Process Pool ----------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Bounded process pool for document extraction, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+def warm_parse_pool():
+    """
+    Start the worker processes now. Call before the server starts its request threads,
+    so workers are forked from a single-threaded process.
+    """
+    get_parse_pool().submit(os.getpid).result()
+
+# ---------------------- Worker Functions ----------------------
+# These run in the pool processes and only get a file path, never the file bytes.
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> str:
+    with fitz.open(path) as pdf_document:
+        return "".join(pdf_document.load_page(page_num).get_text() for page_num in range(start, stop))
+
+def _extract_docx(path: str) -> str:
+    doc = docx.Document(path)
+    return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
+
+# ---------------------- Upload Handling ----------------------
+
+def save_upload(file, suffix: str = ""):
+    """
+    Stream an uploaded file to a temporary file in fixed-size blocks, enforcing
+    MAX_UPLOAD_BYTES and hashing the bytes on the way.
+    Returns (temp path, SHA-256 hex digest); the caller removes the file.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload_")
+    written = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = file.stream.read(UPLOAD_COPY_BUFFER)
+                if not block:
+                    break
+                written += len(block)
+                if written > MAX_UPLOAD_BYTES:
+                    raise DocumentTooLargeError(f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+                digest.update(block)
+                out.write(block)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+# ---------------------- Parsing ----------------------
+
+def parse_pdf(path: str, early_stop: bool = True) -> str:
+    """
+    Extract text from a PDF on disk. Page ranges are parsed in parallel in the pool and
+    joined in page order. With early_stop, remaining ranges are cancelled once both
+    feature markers and the preview text have been captured.
+    """
+    try:
+        with fitz.open(path) as pdf_document:
+            page_count = pdf_document.page_count
+    except Exception as e:
+        raise Exception(f"PDF parsing error: {str(e)}")
+    if page_count > MAX_PDF_PAGES:
+        raise DocumentTooLargeError(f"PDF has {page_count} pages, limit is {MAX_PDF_PAGES}")
+
+    pool = get_parse_pool()
+    futures = [pool.submit(_extract_pdf_pages, path, start, min(start + PAGES_PER_TASK, page_count))
+               for start in range(0, page_count, PAGES_PER_TASK)]
+    parts = []
+    captured = 0
+    markers_seen = set()
+    try:
+        for future in futures:
+            part = future.result(timeout=PARSE_TIMEOUT_SECONDS)
+            parts.append(part)
+            captured += len(part)
+            markers_seen.update(marker for marker in FEATURE_MARKERS if marker in part)
+            if early_stop and len(markers_seen) == len(FEATURE_MARKERS) and captured >= PREVIEW_CHARS:
+                break
+    except Exception as e:
+        raise Exception(f"PDF parsing error: {str(e)}")
+    finally:
+        for future in futures:
+            future.cancel()
+    return "".join(parts)
+
+def parse_docx(path: str) -> str:
+    """Extract text from a DOCX file on disk in the pool."""
+    try:
+        return get_parse_pool().submit(_extract_docx, path).result(timeout=PARSE_TIMEOUT_SECONDS)
+    except Exception as e:
+        raise Exception(f"DOCX parsing error: {str(e)}")
+
+def parse_saved_document(path: str, filename: str, early_stop: bool = True) -> str:
+    """Extract text from a saved PDF/DOCX upload, dispatching on the file name."""
+    if filename.endswith('.pdf'):
+        return parse_pdf(path, early_stop=early_stop)
+    return parse_docx(path)
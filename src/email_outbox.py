@@ -0,0 +1,347 @@
+import os
+import time
+import uuid
+import random
+import sqlite3
+import smtplib
+import threading
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+# ---------------------- Email Outbox Settings ----------------------
+# /api/send-email only writes the message to a durable SQLite outbox. A background
+# sender delivers due messages in batches over one pooled SMTP connection, retrying
+# transient failures with exponential backoff. Without SMTP_HOST messages are only
+# logged (demo mode), as before.
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+EMAIL_OUTBOX_PATH = os.getenv("EMAIL_OUTBOX_PATH", os.path.join(data_folder, "email_outbox.sqlite"))
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_SENDER = os.getenv("SMTP_SENDER", SMTP_USERNAME or "georeg-compliance@localhost")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "false").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+SMTP_IDLE_CLOSE_SECONDS = float(os.getenv("SMTP_IDLE_CLOSE_SECONDS", "60"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "1800"))
+EMAIL_LEASE_SECONDS = 300  # a claimed message not finished within this is handed out again
+EMAIL_POLL_SECONDS = 5     # longest idle wait; also picks up messages queued by other processes
+
+EMAIL_STATUSES = ("queued", "sending", "sent", "failed")
+
+
+class PermanentDeliveryError(Exception):
+    """The server rejected the message itself (5xx); retrying will not help."""
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff before the next attempt: doubles per attempt, capped, with +/-20% jitter."""
+    delay = min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+# ---------------------- SMTP Connection ----------------------
+
+class SMTPConnection:
+    """
+    One reused SMTP session. The TLS handshake and login happen once per connection;
+    it is checked with NOOP before each batch, reopened after SMTP_MAX_MESSAGES_PER_CONNECTION
+    messages and closed after SMTP_IDLE_CLOSE_SECONDS without traffic.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, username: str = SMTP_USERNAME,
+                 password: str = SMTP_PASSWORD, starttls: bool = SMTP_STARTTLS, use_ssl: bool = SMTP_USE_SSL):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self._smtp = None
+        self._sent_on_connection = 0
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _open(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+            if self.starttls:
+                smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+        self._sent_on_connection = 0
+        self.connects += 1
+
+    def ensure_open(self):
+        """Open the connection, or reuse it if the server still answers NOOP."""
+        if self._smtp is not None and self._sent_on_connection < SMTP_MAX_MESSAGES_PER_CONNECTION:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return
+            except (smtplib.SMTPException, OSError):
+                pass
+        self.close()
+        self._open()
+
+    def send(self, message):
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentDeliveryError(f"Recipient refused: {e.recipients}") from e
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500:
+                raise PermanentDeliveryError(f"{e.smtp_code} {e.smtp_error!r}") from e
+            raise
+        self._sent_on_connection += 1
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_CLOSE_SECONDS:
+            self.close()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._smtp is not None
+
+# ---------------------- Outbox ----------------------
+
+class EmailOutbox:
+    """Durable email queue with a background sender thread."""
+
+    def __init__(self, path: str = EMAIL_OUTBOX_PATH, connection: SMTPConnection = None,
+                 sender: str = SMTP_SENDER, batch_size: int = EMAIL_BATCH_SIZE,
+                 max_attempts: int = EMAIL_MAX_ATTEMPTS, autostart: bool = True):
+        self.path = path
+        self.connection = connection if connection is not None else (SMTPConnection() if SMTP_HOST else None)
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.autostart = autostart  # False: nothing is sent until start() or drain()
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id TEXT PRIMARY KEY,
+                to_email TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                html_body TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claimed_at REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox (status, next_attempt_at)")
+        self._conn.commit()
+
+    @property
+    def transport(self) -> str:
+        return "smtp" if self.connection is not None else "demo"
+
+    def enqueue(self, to_email: str, subject: str, html_body: str) -> str:
+        """Store a message for delivery and wake the sender. Returns the message id."""
+        if any("\r" in value or "\n" in value for value in (to_email, subject)):
+            raise ValueError("Recipient and subject must not contain line breaks")
+        message_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO email_outbox (id, to_email, subject, html_body, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (message_id, to_email, subject, html_body, now, now)
+            )
+            self._conn.commit()
+        if self.autostart:
+            self.start()
+        self._wake.set()
+        return message_id
+
+    def status(self, message_id: str):
+        """Delivery status of one message, or None if the id is unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, to_email, subject, status, attempts, next_attempt_at, last_error, created_at, sent_at "
+                "FROM email_outbox WHERE id = ?", (message_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "to", "subject", "status", "attempts", "next_attempt_at", "last_error", "created_at", "sent_at")
+        return dict(zip(keys, row))
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status").fetchall())
+        return {
+            "transport": self.transport,
+            **{status: counts.get(status, 0) for status in EMAIL_STATUSES},
+            "batches": self.batches,
+            "smtp_connects": self.connection.connects if self.connection is not None else 0
+        }
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+                self._thread.start()
+
+    def _claim_batch(self) -> list:
+        """Mark up to batch_size due messages as sending and return them, oldest first."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, to_email, subject, html_body, attempts FROM email_outbox "
+                    "WHERE (status = 'queued' AND next_attempt_at <= ?) OR (status = 'sending' AND claimed_at < ?) "
+                    "ORDER BY next_attempt_at LIMIT ?",
+                    (now, now - EMAIL_LEASE_SECONDS, self.batch_size)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE email_outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                    [(now, row[0]) for row in rows]
+                )
+                self._conn.commit()
+            except Exception:
+                # Release the write lock, or every later claim fails on the open transaction
+                self._conn.rollback()
+                raise
+        return rows
+
+    def _finish(self, message_id: str, attempts: int, error: str = None, permanent: bool = False):
+        now = time.time()
+        with self._lock, self._conn:  # commits, or rolls back if the update fails
+            if error is None:
+                self._conn.execute(
+                    "UPDATE email_outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                    (attempts, now, message_id)
+                )
+            elif permanent or attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE email_outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, message_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE email_outbox SET status = 'queued', attempts = ?, last_error = ?, next_attempt_at = ? "
+                    "WHERE id = ?",
+                    (attempts, error, now + retry_delay(attempts), message_id)
+                )
+
+    def _build_message(self, to_email: str, subject: str, html_body: str) -> MIMEMultipart:
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = self.sender
+        message["To"] = to_email
+        message.attach(MIMEText(html_body, "html"))
+        return message
+
+    def _deliver_batch(self, rows: list):
+        if self.connection is not None:
+            try:
+                self.connection.ensure_open()
+            except (smtplib.SMTPException, OSError) as e:
+                # Server unreachable or login refused: the whole batch is retried later
+                self.connection.close()
+                for message_id, _, _, _, attempts in rows:
+                    self._finish(message_id, attempts + 1, f"connect: {e}")
+                return
+
+        for message_id, to_email, subject, html_body, attempts in rows:
+            attempts += 1
+            if self.connection is None:
+                print(f"DEMO: Email would be sent to {to_email}")
+                print(f"Subject: {subject}")
+                self._finish(message_id, attempts)
+                continue
+            try:
+                if not self.connection.is_open:
+                    self.connection.ensure_open()
+                self.connection.send(self._build_message(to_email, subject, html_body))
+                self._finish(message_id, attempts)
+            except PermanentDeliveryError as e:
+                self._finish(message_id, attempts, str(e), permanent=True)
+            except smtplib.SMTPResponseException as e:
+                # Temporary (4xx) refusal: the session itself is still usable
+                self._finish(message_id, attempts, f"{e.smtp_code} {e.smtp_error!r}")
+            except (smtplib.SMTPException, OSError) as e:
+                # Dropped connection: reconnect for the next message
+                self._finish(message_id, attempts, str(e))
+                self.connection.close()
+            except Exception as e:
+                # The message itself cannot be built or sent (e.g. a malformed header): retrying
+                # would fail the same way. Reconnect in case the session was left mid-message.
+                self._finish(message_id, attempts, f"{type(e).__name__}: {e}", permanent=True)
+                self.connection.close()
+
+    def drain(self) -> int:
+        """Deliver every message that is due now, batch by batch; returns how many were attempted."""
+        attempted = 0
+        while True:
+            rows = self._claim_batch()
+            if not rows:
+                return attempted
+            self.batches += 1
+            self._deliver_batch(rows)
+            attempted += len(rows)
+
+    def _run(self):
+        while True:
+            try:
+                self.drain()
+            except Exception as e:
+                # Keep the sender alive; claimed messages are handed out again after the lease
+                print(f"Email outbox error: {e}")
+            if self.connection is not None:
+                self.connection.close_if_idle()
+            self._wake.wait(self._seconds_until_due())
+            self._wake.clear()
+
+    def _seconds_until_due(self) -> float:
+        """Time until the next queued retry is due, at most EMAIL_POLL_SECONDS."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM email_outbox WHERE status = 'queued'"
+            ).fetchone()
+        if row[0] is None:
+            return EMAIL_POLL_SECONDS
+        return min(max(row[0] - time.time(), 0.0), EMAIL_POLL_SECONDS)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_email_outbox() -> EmailOutbox:
+    """Shared outbox for the process; its sender thread starts with the first call."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EmailOutbox()
+            _outbox.start()
+        return _outbox
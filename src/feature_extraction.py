@@ -0,0 +1,139 @@
+import re
+
+# ---------------------- Patterns ----------------------
+# Compiled once at import; every function below walks the text a single time.
+TITLE_MARKER = "Feature Title:"
+DESCRIPTION_MARKER = "Description:"
+MARKER_RE = re.compile(re.escape(TITLE_MARKER) + "|" + re.escape(DESCRIPTION_MARKER))
+
+# Labelled fields for documents without the structured markers, e.g. 'Title: ...' or '"description": "..."'
+FALLBACK_LABEL_RE = re.compile(
+    r'\b(?P<label>feature\s*title|feature\s*name|short\s+description|description|summary|overview|brief|title|name|desc)'
+    r'\s*"?\s*[:"]\s*"?\s*(?P<value>[^,"\n]{3,300})',
+    re.IGNORECASE
+)
+# Lower rank wins, mirroring the order the old per-pattern fallback tried them in
+TITLE_LABEL_RANK = {"feature title": 0, "title": 0, "feature name": 1, "name": 1}
+DESCRIPTION_LABEL_RANK = {"description": 0, "desc": 0, "summary": 1, "overview": 1, "brief": 2, "short description": 2}
+WHITESPACE_RE = re.compile(r"\s+")
+SENTENCE_RE = re.compile(r"[^.!?]+")
+
+DEFAULT_TITLE = "Extracted Feature"
+DEFAULT_DESCRIPTION = "Feature extracted from uploaded document"
+
+def _collapse(text: str) -> str:
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+# ---------------------- Structured Blocks ----------------------
+
+def iter_feature_blocks(text: str):
+    """
+    Walk the document once and yield every 'Feature Title: ... Description: ...' block.
+    A block's description runs until the next 'Feature Title:' marker or the end of the text.
+    Yields dicts with title, description and character offsets (start, end) into text.
+    """
+    title_marker = None   # match of the 'Feature Title:' opening the current block
+    desc_marker = None    # match of the first 'Description:' inside it
+
+    def close_block(end):
+        start = (title_marker or desc_marker).start()
+        title = None
+        if title_marker:
+            title_end = desc_marker.start() if desc_marker else end
+            title = _collapse(text[title_marker.end():title_end]) or None
+        description = text[desc_marker.end():end].strip() if desc_marker else None
+        return {"title": title, "description": description, "start": start, "end": end}
+
+    for marker in MARKER_RE.finditer(text):
+        if marker.group() == TITLE_MARKER:
+            if title_marker or desc_marker:
+                yield close_block(marker.start())
+            title_marker, desc_marker = marker, None
+        elif desc_marker is None:
+            desc_marker = marker
+
+    if title_marker or desc_marker:
+        yield close_block(len(text))
+
+# ---------------------- Fallback ----------------------
+
+def _fallback_feature(text: str) -> dict:
+    """Best-effort title/description for documents without structured markers, in one scan."""
+    title = description = None
+    title_rank = description_rank = None
+
+    for match in FALLBACK_LABEL_RE.finditer(text):
+        label = _collapse(match.group("label").lower())
+        value = match.group("value")
+        if label in TITLE_LABEL_RANK and (title_rank is None or TITLE_LABEL_RANK[label] < title_rank):
+            candidate = value.strip().strip('"').strip()
+            if len(candidate) >= 3:
+                title, title_rank = candidate[:100], TITLE_LABEL_RANK[label]
+        elif label in DESCRIPTION_LABEL_RANK and (description_rank is None or DESCRIPTION_LABEL_RANK[label] < description_rank):
+            candidate = _collapse(value).strip('"').strip()
+            if len(candidate) >= 3:
+                description, description_rank = candidate[:300], DESCRIPTION_LABEL_RANK[label]
+        if title_rank == 0 and description_rank == 0:
+            break
+
+    if title is None:
+        # First line if reasonable length
+        first_line = text.lstrip().split("\n", 1)[0].strip()
+        if 3 <= len(first_line) <= 80 and ":" not in first_line:
+            title = first_line
+
+    title = title or DEFAULT_TITLE
+    if description is None:
+        # Look for sentences that aren't the title
+        for sentence in SENTENCE_RE.finditer(text):
+            candidate = _collapse(sentence.group())
+            if len(candidate) > 20 and candidate.lower() != title.lower():
+                description = candidate[:300]
+                break
+
+    return {"title": title, "description": description or DEFAULT_DESCRIPTION}
+
+# ---------------------- Public API ----------------------
+
+def extract_features(text: str) -> list:
+    """
+    Extract every feature in a document. Structured blocks are returned with their
+    offsets and own block text as prd_text; without any blocks, a single
+    regex-fallback feature covering the whole document is returned.
+    """
+    features = []
+    for block in iter_feature_blocks(text):
+        if not (block["title"] and block["description"]):
+            continue
+        features.append({
+            "title": block["title"],
+            "description": block["description"],
+            "prd_text": text[block["start"]:block["end"]].strip(),
+            "start": block["start"],
+            "end": block["end"],
+            "parsing_method": "structured"
+        })
+    if features:
+        return features
+
+    fallback = _fallback_feature(text)
+    return [{
+        **fallback,
+        "prd_text": text,
+        "start": 0,
+        "end": len(text),
+        "parsing_method": "regex_fallback"
+    }]
+
+def extract_feature_info(text: str, features: list = None) -> dict:
+    """
+    Extract structured feature information from document text: the first feature,
+    with the whole document as prd_text (the shape /api/parse has always returned).
+    """
+    first = (features or extract_features(text))[0]
+    return {
+        "title": first["title"],
+        "description": first["description"],
+        "prd_text": text,
+        "parsing_method": first["parsing_method"]
+    }
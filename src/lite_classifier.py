@@ -0,0 +1,152 @@
+import os
+import re
+
+# ---------------------- Lite Classifier Settings ----------------------
+# Triage without generative LLM calls: entities come from patterns, the flag from
+# legal vs business cues in the feature text plus how close the retrieved regulation
+# text is. Used for mode="lite" requests and as the fallback when the chat model's
+# circuit is open or its queue is saturated.
+LITE_RETRIEVAL_THRESHOLD = float(os.getenv("LITE_RETRIEVAL_THRESHOLD", "0.65"))  # similarity counted as a legal signal
+LITE_YES_SCORE = 2  # legal signals needed for "Yes"
+
+# Jurisdiction codes as used by SOURCE_COLLECTION_MAP. More specific jurisdictions come
+# first; short codes only match in upper case so "us"/"ca" in prose do not count.
+LOCATION_PATTERNS = [
+    ("UT", re.compile(r"\butah\b", re.IGNORECASE)),
+    ("UT", re.compile(r"\bUT\b")),
+    ("FL", re.compile(r"\bflorida\b", re.IGNORECASE)),
+    ("FL", re.compile(r"\bFL\b")),
+    ("CA", re.compile(r"\bcalifornia\b", re.IGNORECASE)),
+    ("CA", re.compile(r"\bCA\b")),
+    ("EU", re.compile(r"\b(european union|europe|eea|digital services act|gdpr)\b", re.IGNORECASE)),
+    ("EU", re.compile(r"\b(EU|DSA)\b")),
+    ("US", re.compile(r"\b(united states|ncmec|federal law|coppa)\b", re.IGNORECASE)),
+    ("US", re.compile(r"\b(US|USA)\b")),
+]
+
+AGE_PATTERNS = [
+    ("under 13", re.compile(r"\b(under|below|younger than)\s*13\b|\bcoppa\b", re.IGNORECASE)),
+    ("under 16", re.compile(r"\b(under|below|younger than)\s*16\b", re.IGNORECASE)),
+    ("under 18", re.compile(r"\b(under|below|younger than)[\s-]*18\b|\bunder-18s?\b", re.IGNORECASE)),
+    ("minors", re.compile(r"\b(minors?|teens?|teenagers?|children|child|kids|youth|students?)\b", re.IGNORECASE)),
+    ("adults", re.compile(r"\b(adults? only|over 18|18\+)\b", re.IGNORECASE)),
+]
+
+# Regulation names by keyword
+REGULATION_KEYWORDS = {
+    "digital services act": "EU Digital Services Act",
+    "dsa": "EU Digital Services Act",
+    "gdpr": "GDPR Article 8",
+    "utah social media": "Utah Social Media Regulation Act",
+    "florida online protections": "Florida Online Protections for Minors",
+    "hb 3": "Florida Online Protections for Minors",
+    "sb976": "California SB976",
+    "sb 976": "California SB976",
+    "protecting our kids": "California Protecting Our Kids from Social Media Addiction Act",
+    "ncmec": "US NCMEC reporting (18 U.S.C. 2258A)",
+    "2258a": "US NCMEC reporting (18 U.S.C. 2258A)",
+    "coppa": "COPPA",
+    "privacy": "EU Privacy Directive",
+    "data protection": "Data Protection Regulation",
+}
+REGULATION_RE = re.compile(r"\b(" + "|".join(re.escape(k) for k in REGULATION_KEYWORDS) + r")\b", re.IGNORECASE)
+
+LEGAL_CUE_RE = re.compile(
+    r"\b(compl(y|ies|iance)|required by (law|regulation)|legal(ly)? (requirement|obligation|required)|"
+    r"law|regulat(ion|ory|or)|statute|mandated?|obligation|jurisdiction|age verification|age assurance|"
+    r"parental consent|csam|child sexual abuse|report(ing)? to (authorities|ncmec)|violation|violates|"
+    r"non-compliant|illegal|prohibited)\b",
+    re.IGNORECASE
+)
+BUSINESS_CUE_RE = re.compile(
+    r"\b(a/b test|experiment(ation)?|engagement|retention|growth|market(ing)? (test|launch)|pilot|"
+    r"monetization|revenue|conversion|business (decision|goal)|rollout|roll out|trial|user feedback|"
+    r"performance|latency|ui|ux|theme|creator|ads?)\b",
+    re.IGNORECASE
+)
+KEYWORD_RE = re.compile(
+    r"\b(personali[sz]ed feed|recommendations?|notifications?|curfew|geofenc\w*|age verification|age assurance|"
+    r"parental (controls?|consent)|content moderation|reporting|data retention|location data|direct messages?|"
+    r"default privacy|account deletion|csam|autoplay|infinite scroll|login|time limits?)\b",
+    re.IGNORECASE
+)
+
+# ---------------------- Entities ----------------------
+
+def matched_regulations(text: str) -> list:
+    """Regulation names mentioned in text, in order of first mention."""
+    names = [REGULATION_KEYWORDS[match.group(1).lower()] for match in REGULATION_RE.finditer(text)]
+    return list(dict.fromkeys(names))
+
+def extract_entities_rules(title: str, description: str) -> dict:
+    """Pattern-based counterpart of extract_entities, with the same schema."""
+    text = f"{title}\n{description}"
+    location = next((code for code, pattern in LOCATION_PATTERNS if pattern.search(text)), "")
+    return {
+        "location": location,
+        "age": [label for label, pattern in AGE_PATTERNS if pattern.search(text)],
+        "keywords": list(dict.fromkeys(match.group(0).lower() for match in KEYWORD_RE.finditer(text))),
+        "related_regulations": matched_regulations(text)
+    }
+
+def age_group(age_labels: list) -> str:
+    if any(label != "adults" for label in age_labels):
+        return "Under 18"
+    return "Adults Only" if age_labels else "All Ages"
+
+# ---------------------- Classification ----------------------
+
+def classify_lite(title: str, description: str, entities: dict, retrieval_score: float = None,
+                  retrieved_source: str = None) -> dict:
+    """
+    Flag a feature from cues alone. Returns classification, reasoning and related_regulation
+    (the keys classify_stage produces) plus the signals behind the decision.
+    """
+    text = f"{title}\n{description}"
+    legal_cues = list(dict.fromkeys(match.group(0).lower() for match in LEGAL_CUE_RE.finditer(text)))
+    business_cues = list(dict.fromkeys(match.group(0).lower() for match in BUSINESS_CUE_RE.finditer(text)))
+    regulations = entities.get("related_regulations", [])
+    targets_minors = any(label != "adults" for label in entities.get("age", []))
+    close_regulation = retrieval_score is not None and retrieval_score >= LITE_RETRIEVAL_THRESHOLD
+
+    legal_score = (2 * bool(regulations) + bool(legal_cues)
+                   + bool(entities.get("location") and targets_minors) + close_regulation)
+    if legal_score >= LITE_YES_SCORE and legal_score > len(business_cues):
+        classification = "Yes"
+    elif business_cues and not regulations and not legal_cues:
+        classification = "No"
+    else:
+        classification = "Maybe"
+
+    reasons = []
+    if regulations:
+        reasons.append(f"mentions {', '.join(regulations)}")
+    if legal_cues:
+        reasons.append(f"uses legal language ({', '.join(legal_cues[:3])})")
+    if entities.get("location") and targets_minors:
+        reasons.append(f"targets minors in {entities['location']}")
+    if retrieval_score is not None:
+        closeness = "closely matches" if close_regulation else "only loosely matches"
+        reasons.append(f"{closeness} {retrieved_source or 'regulation'} text (similarity {retrieval_score:.2f})")
+    if business_cues:
+        reasons.append(f"has business/product cues ({', '.join(business_cues[:3])})")
+    verdict = {"Yes": "Likely legally required", "No": "Likely a business decision",
+               "Maybe": "Unclear from the description"}[classification]
+    reasoning = f"Lite triage: {verdict}; the feature {'; '.join(reasons) or 'has no legal or business cues'}. " \
+                "Confirm with a full analysis."
+
+    related = regulations[0] if regulations else (
+        retrieved_source if close_regulation and classification != "No" else ""
+    )
+    return {
+        "classification": classification,
+        "reasoning": reasoning,
+        "related_regulation": related or "",
+        "signals": {
+            "legal_score": legal_score,
+            "legal_cues": legal_cues,
+            "business_cues": business_cues,
+            "regulations": regulations,
+            "retrieval_score": retrieval_score
+        }
+    }
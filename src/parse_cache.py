@@ -0,0 +1,103 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+
+# ---------------------- Parse Cache Settings ----------------------
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(data_folder, "parse_cache"))
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_MB", "200")) * 1024 * 1024
+EVICT_TO_FRACTION = 0.9  # evict down to this share of the limit so every put does not evict
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed uploads: extracted text plus structured fields, stored as
+    gzipped JSON files named by key. Reads refresh the file's mtime, and the least
+    recently used files are evicted once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = PARSE_CACHE_DIR, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.name.endswith(".json.gz"))
+
+    @staticmethod
+    def make_key(content_sha256: str, parser_version: str) -> str:
+        """Cache key for a document: hash of its bytes plus the parser version that produced the entry."""
+        return hashlib.sha256(f"{content_sha256}:{parser_version}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Truncated or corrupt entry: drop it and treat as a miss
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key: str, value: dict):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            if os.path.exists(path):
+                self._total_bytes -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str):
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._total_bytes -= size
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        """Delete least recently used entries until under EVICT_TO_FRACTION of the limit. Caller holds the lock."""
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".json.gz")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        target = self.max_bytes * EVICT_TO_FRACTION
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+            except FileNotFoundError:
+                continue
+
+
+_parse_cache = None
+_parse_cache_lock = threading.Lock()
+
+def get_parse_cache() -> ParseCache:
+    """Shared parse cache for the process, created on first use."""
+    global _parse_cache
+    with _parse_cache_lock:
+        if _parse_cache is None:
+            _parse_cache = ParseCache()
+        return _parse_cache
@@ -0,0 +1,141 @@
+import os
+import glob
+import logging
+import threading
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+# ---------------------- Pre-classifier Settings ----------------------
+# A TF-IDF + logistic regression model trained by rl/train_preclassifier.py on the
+# labels earlier LLM runs produced. It sees the feature text and the best retrieval
+# score. When it is confident, analyze_feature uses its label and skips classify_stage.
+# "Confident" means reaching the per-label threshold that training calibrated on
+# held-out predictions. Labels without a threshold always go to the LLM.
+# Model files are versioned; the newest one in PRECLASSIFIER_DIR is served unless
+# PRECLASSIFIER_PATH names one.
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+PRECLASSIFIER_DIR = os.getenv("PRECLASSIFIER_DIR", os.path.join(data_folder, "preclassifier"))
+PRECLASSIFIER_PATH = os.getenv("PRECLASSIFIER_PATH", "")
+PRECLASSIFIER_ENABLED = os.getenv("PRECLASSIFIER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Extra floor on top of the calibrated thresholds (e.g. 0.99 to serve only the surest answers)
+PRECLASSIFIER_MIN_CONFIDENCE = float(os.getenv("PRECLASSIFIER_MIN_CONFIDENCE", "0"))
+MODEL_FILE_PREFIX = "preclassifier-"
+LABELS = ("Yes", "No", "Maybe")
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_label(value):
+    """"yes"/" Yes " -> "Yes"; None for anything that is not one of LABELS."""
+    label = str(value).strip().capitalize() if value is not None else ""
+    return label if label in LABELS else None
+
+def feature_frame(titles, descriptions, retrieval_scores) -> pd.DataFrame:
+    """Model input: one row per feature, the same for training and serving."""
+    return pd.DataFrame({
+        "text": [f"{title}\n{description}" for title, description in zip(titles, descriptions)],
+        "retrieval_score": pd.to_numeric(pd.Series(list(retrieval_scores), dtype=object), errors="coerce")
+    })
+
+def build_model(max_features: int = 20000, C: float = 4.0) -> Pipeline:
+    """Word 1-2gram TF-IDF of the text plus the retrieval score (missing scores get their own indicator)."""
+    features = ColumnTransformer([
+        ("text", TfidfVectorizer(ngram_range=(1, 2), min_df=2, max_features=max_features,
+                                 sublinear_tf=True, strip_accents="unicode"), "text"),
+        ("retrieval", SimpleImputer(strategy="constant", fill_value=0.0, add_indicator=True,
+                                    keep_empty_features=True), ["retrieval_score"]),
+    ])
+    return Pipeline([
+        ("features", features),
+        ("classifier", LogisticRegression(C=C, max_iter=2000, class_weight="balanced")),
+    ])
+
+def model_path(version: str, directory: str = PRECLASSIFIER_DIR) -> str:
+    return os.path.join(directory, f"{MODEL_FILE_PREFIX}{version}.joblib")
+
+def save_model(model: Pipeline, meta: dict, directory: str = PRECLASSIFIER_DIR) -> str:
+    """Write a model version next to the older ones; returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = model_path(meta["version"], directory)
+    tmp_path = path + ".tmp"
+    joblib.dump({"model": model, "meta": meta}, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+def latest_model_path(directory: str = PRECLASSIFIER_DIR):
+    # Versions start with a UTC timestamp, so the newest file sorts last
+    paths = sorted(glob.glob(os.path.join(directory, f"{MODEL_FILE_PREFIX}*.joblib")))
+    return paths[-1] if paths else None
+
+# ---------------------- Serving ----------------------
+
+class Preclassifier:
+    """A loaded model version with its calibrated per-label thresholds."""
+
+    def __init__(self, path: str, min_confidence: float = PRECLASSIFIER_MIN_CONFIDENCE):
+        # Model files are pickles: only load ones this deployment trained itself
+        bundle = joblib.load(path)
+        self.path = path
+        self.model = bundle["model"]
+        self.meta = bundle["meta"]
+        self.version = self.meta["version"]
+        self.thresholds = {label: max(threshold, min_confidence)
+                           for label, threshold in self.meta["thresholds"].items() if threshold is not None}
+        self.served = 0
+        self.passed = 0
+        self._lock = threading.Lock()
+
+    def predict(self, title: str, description: str, retrieval_score: float = None) -> dict:
+        """Most likely label, its probability, and whether it clears that label's threshold."""
+        probabilities = self.model.predict_proba(feature_frame([title], [description], [retrieval_score]))[0]
+        best = int(np.argmax(probabilities))
+        label = str(self.model.classes_[best])
+        confidence = float(probabilities[best])
+        confident = label in self.thresholds and confidence >= self.thresholds[label]
+        with self._lock:
+            if confident:
+                self.served += 1
+            else:
+                self.passed += 1
+        return {"label": label, "confidence": round(confidence, 4), "confident": confident, "version": self.version}
+
+    def stats(self) -> dict:
+        with self._lock:
+            served, passed = self.served, self.passed
+        total = served + passed
+        return {
+            "version": self.version,
+            "thresholds": self.thresholds,
+            "served": served,
+            "passed_to_llm": passed,
+            "coverage": round(served / total, 4) if total else None,
+            "holdout": self.meta.get("holdout")
+        }
+
+
+_preclassifier = None
+_preclassifier_loaded = False
+_preclassifier_lock = threading.Lock()
+
+def get_preclassifier():
+    """
+    Shared pre-classifier, or None when disabled, no model has been trained or the model
+    file cannot be loaded (the load is attempted once per process).
+    """
+    global _preclassifier, _preclassifier_loaded
+    with _preclassifier_lock:
+        if not _preclassifier_loaded:
+            _preclassifier_loaded = True
+            path = PRECLASSIFIER_PATH or latest_model_path()
+            if PRECLASSIFIER_ENABLED and path:
+                try:
+                    _preclassifier = Preclassifier(path)
+                except Exception:
+                    logger.exception("Could not load pre-classifier %s; every analysis goes to the LLM", path)
+        return _preclassifier
@@ -2,6 +2,8 @@ import os
 import requests
 from qdrant_client import QdrantClient
 from dotenv import load_dotenv
+from api.llm_scheduler import get_scheduler
+from api.llm_cache import cached_completion
 
 # ---------------------- Load Environment ----------------------
 load_dotenv()
@@ -41,11 +43,14 @@ def query_qdrant(embedding: list, collection_name: str, top_k: int = 5):
     return results
 
 def chat_with_ollama(messages: list) -> str:
-    """Send messages to Ollama chat model and return response."""
-    payload = {"model": OLLAMA_CHAT_MODEL, "messages": messages, "stream": False}
-    response = requests.post(f"{OLLAMA_URL}/api/chat", json=payload)
-    response.raise_for_status()
-    return response.json()["message"]["content"]
+    """Send messages to Ollama chat model and return response (served from the LLM cache when recorded)."""
+    def generate():
+        payload = {"model": OLLAMA_CHAT_MODEL, "messages": messages, "stream": False}
+        with get_scheduler("ollama_chat").slot():
+            response = requests.post(f"{OLLAMA_URL}/api/chat", json=payload)
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+    return cached_completion("ollama", OLLAMA_CHAT_MODEL, messages, generate)
 
 # ---------------------- Source Mapping ----------------------
 SOURCE_COLLECTION_MAP = {
@@ -0,0 +1,114 @@
+import os
+import json
+import threading
+from datetime import datetime
+import numpy as np
+
+# ---------------------- Router Settings ----------------------
+# Coarse-to-fine routing: a query is compared with one centroid per collection (and per
+# section, where chunks carry metadata.section_number) and the vector search then runs
+# only in the best few collections, restricted to their best sections. Centroids are
+# rebuilt by utils/embed_documents.py on every ingestion.
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+ROUTER_PATH = os.getenv("ROUTER_PATH", os.path.join(data_folder, "router_centroids.npz"))
+ROUTER_TOP_COLLECTIONS = int(os.getenv("ROUTER_TOP_COLLECTIONS", "2"))
+ROUTER_TOP_SECTIONS = int(os.getenv("ROUTER_TOP_SECTIONS", "3"))
+SECTION_FIELD = "section_number"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+# ---------------------- Building ----------------------
+
+def build_centroids(collections, sections, embeddings, path: str = ROUTER_PATH, model: str = None) -> dict:
+    """
+    Compute and save centroids. collections[i] is the collection of embeddings[i];
+    sections[i] is its section number or None. Each centroid is the normalized mean of
+    its members' normalized embeddings. Returns a summary of what was written.
+    """
+    vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    collection_names = sorted(set(collections))
+    collection_index = {name: i for i, name in enumerate(collection_names)}
+    collection_sums = np.zeros((len(collection_names), vectors.shape[1]), dtype=np.float32)
+    section_sums = {}
+    for vector, collection, section in zip(vectors, collections, sections):
+        collection_sums[collection_index[collection]] += vector
+        if section:
+            key = (collection, str(section))
+            section_sums[key] = section_sums.get(key, 0) + vector
+
+    section_keys = sorted(section_sums)
+    section_matrix = (np.stack([section_sums[key] for key in section_keys])
+                      if section_keys else np.zeros((0, vectors.shape[1]), dtype=np.float32))
+    meta = {"model": model, "created_at": datetime.now().isoformat(), "num_vectors": int(len(vectors))}
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(
+        tmp_path,
+        collection_names=np.array(collection_names, dtype=str),
+        collection_centroids=_normalize_rows(collection_sums),
+        section_collections=np.array([key[0] for key in section_keys], dtype=str),
+        section_numbers=np.array([key[1] for key in section_keys], dtype=str),
+        section_centroids=_normalize_rows(section_matrix),
+        meta=np.array(json.dumps(meta))
+    )
+    os.replace(tmp_path, path)
+    return {**meta, "collections": len(collection_names), "sections": len(section_keys)}
+
+# ---------------------- Routing ----------------------
+
+class Router:
+    """Centroid router loaded from ROUTER_PATH."""
+
+    def __init__(self, path: str = ROUTER_PATH):
+        with np.load(path) as data:
+            self.collection_names = data["collection_names"].tolist()
+            self.collection_centroids = data["collection_centroids"]
+            self.section_collections = data["section_collections"]
+            self.section_numbers = data["section_numbers"].tolist()
+            self.section_centroids = data["section_centroids"]
+            self.meta = json.loads(str(data["meta"]))
+        self.mtime = os.path.getmtime(path)
+
+    def route(self, embedding, collections=None, top_collections: int = ROUTER_TOP_COLLECTIONS,
+              top_sections: int = ROUTER_TOP_SECTIONS) -> list:
+        """
+        Best collections for a query as [{"collection", "score", "sections"}], best first.
+        sections lists the top section numbers to search within, or None to search the whole
+        collection. collections limits routing to those names (e.g. SOURCE_COLLECTION_MAP values).
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = self.collection_centroids @ query
+        ranked = [i for i in np.argsort(-scores)
+                  if collections is None or self.collection_names[i] in collections][:top_collections]
+
+        routes = []
+        for i in ranked:
+            name = self.collection_names[i]
+            sections = None
+            members = np.flatnonzero(self.section_collections == name)
+            if len(members):
+                section_scores = self.section_centroids[members] @ query
+                best = members[np.argsort(-section_scores)[:top_sections]]
+                sections = [self.section_numbers[j] for j in best]
+            routes.append({"collection": name, "score": float(scores[i]), "sections": sections})
+        return routes
+
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """Shared router, reloaded when the centroid file changes; None if no centroids have been built."""
+    global _router
+    with _router_lock:
+        if not os.path.exists(ROUTER_PATH):
+            return None
+        if _router is None or os.path.getmtime(ROUTER_PATH) != _router.mtime:
+            _router = Router(ROUTER_PATH)
+        return _router
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+
+# ---------------------- Semantic Cache Settings ----------------------
+# Analyses are cached under the embedding of their title + description. A new feature
+# whose embedding has cosine similarity >= SEMANTIC_CACHE_THRESHOLD with a cached one
+# (computed under the same cache version) gets that result instead of a pipeline run.
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", os.path.join(data_folder, "semantic_cache.sqlite"))
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+
+
+def cache_version(*parts) -> str:
+    """
+    Version string for the cache: the models and corpus that produced the results.
+    Entries written under another version are never served.
+    """
+    return "|".join(str(part) for part in parts)
+
+
+class SemanticCache:
+    """
+    Near-duplicate cache of analysis results. Entries persist in SQLite; the current
+    version's embeddings are held as one normalized float32 matrix, so a lookup is a
+    single matrix-vector product.
+    """
+
+    def __init__(self, version: str, path: str = SEMANTIC_CACHE_PATH,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.version = version
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._matrix = None   # (capacity, dim) normalized embeddings; rows [0, _size) are live
+        self._ids = []        # entry id of each matrix row
+        self._size = 0
+        self._oldest = 0      # next row to overwrite once max_entries is reached
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                version TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_semantic_cache_version ON semantic_cache (version, id)")
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        """Read the newest max_entries entries of this version into the matrix."""
+        rows = self._conn.execute(
+            "SELECT id, embedding FROM semantic_cache WHERE version = ? ORDER BY id DESC LIMIT ?",
+            (self.version, self.max_entries)
+        ).fetchall()
+        for entry_id, blob in reversed(rows):
+            self._append(entry_id, np.frombuffer(blob, dtype=np.float32))
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _append(self, entry_id: int, vector: np.ndarray):
+        if self._matrix is None:
+            self._matrix = np.empty((min(64, self.max_entries), vector.shape[0]), dtype=np.float32)
+        if self._size == self.max_entries:
+            # Full: overwrite the oldest row (the matrix is used as a ring buffer)
+            slot = self._oldest
+            self._oldest = (self._oldest + 1) % self.max_entries
+            self._matrix[slot] = vector
+            self._ids[slot] = entry_id
+            return
+        if self._size == self._matrix.shape[0]:
+            grown = np.empty((min(self._size * 2, self.max_entries), self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size] = vector
+        self._ids.append(entry_id)
+        self._size += 1
+
+    def lookup(self, embedding):
+        """(result, similarity) of the closest cached entry at or above the threshold, else None."""
+        query = self._normalize(embedding)
+        with self._lock:
+            if self._size == 0 or self._matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            scores = self._matrix[:self._size] @ query
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = self._ids[best]
+            row = self._conn.execute("SELECT result FROM semantic_cache WHERE id = ?", (entry_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0]), similarity
+
+    def add(self, embedding, result: dict):
+        vector = self._normalize(embedding)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO semantic_cache (version, embedding, result, created_at) VALUES (?, ?, ?, ?)",
+                (self.version, vector.tobytes(), json.dumps(result, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+            self._append(cursor.lastrowid, vector)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": self._size, "hits": self.hits, "misses": self.misses,
+                    "threshold": self.threshold, "version": self.version}
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+def get_semantic_cache(version: str) -> SemanticCache:
+    """Shared semantic cache for the process; reopened if the version changes."""
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None or _semantic_cache.version != version:
+            _semantic_cache = SemanticCache(version)
+        return _semantic_cache
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules import each other relative to src/ (and the stub servers live in utils/)
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(root, "src"))
+sys.path.insert(0, os.path.join(root, "utils"))
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from email_outbox import EmailOutbox, SMTPConnection
+from smtp_stub_server import make_handler, ThreadingSMTPServer
+
+
+@pytest.fixture
+def smtp_stub():
+    """Stub SMTP server that answers every fifth message with a temporary 451."""
+    handler, counter = make_handler(fail_every=5, verbose=False)
+    server = ThreadingSMTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1], counter
+    server.shutdown()
+    server.server_close()
+
+
+def make_outbox(tmp_path, port):
+    connection = SMTPConnection(host="127.0.0.1", port=port, username="", starttls=False, use_ssl=False)
+    return EmailOutbox(path=str(tmp_path / "outbox.sqlite"), connection=connection, batch_size=3, autostart=False)
+
+
+def test_drain_delivers_each_message_once_over_one_connection(tmp_path, smtp_stub):
+    port, counter = smtp_stub
+    outbox = make_outbox(tmp_path, port)
+    ids = [outbox.enqueue(f"user{i}@example.com", f"Report {i}", "<p>report</p>") for i in range(7)]
+
+    assert outbox.drain() == 7
+    statuses = {message_id: outbox.status(message_id) for message_id in ids}
+    # The fifth message got a 451: queued for a later retry, not lost and not resent yet
+    retried = [status for status in statuses.values() if status["status"] == "queued"]
+    assert len(retried) == 1
+    assert retried[0]["attempts"] == 1 and retried[0]["last_error"].startswith("451")
+    assert sum(status["status"] == "sent" for status in statuses.values()) == 6
+    assert counter["connections"] == 1 and outbox.connection.connects == 1
+
+    # Nothing is due until the retry's backoff has passed
+    assert outbox.drain() == 0
+    with outbox._lock:
+        outbox._conn.execute("UPDATE email_outbox SET next_attempt_at = 0 WHERE status = 'queued'")
+        outbox._conn.commit()
+    assert outbox.drain() == 1
+
+    delivered = [recipients[0] for recipients in counter["delivered"]]
+    assert sorted(delivered) == sorted(f"<user{i}@example.com>" for i in range(7))
+    assert all(outbox.status(message_id)["status"] == "sent" for message_id in ids)
+    stats = outbox.stats()
+    assert stats["sent"] == 7 and stats["queued"] == stats["sending"] == stats["failed"] == 0
+    assert outbox.connection.connects == 1
+    outbox.connection.close()
+
+
+def test_unsendable_message_fails_permanently_without_blocking_the_batch(tmp_path, smtp_stub):
+    port, counter = smtp_stub
+    outbox = make_outbox(tmp_path, port)
+    with pytest.raises(ValueError):
+        outbox.enqueue("user@example.com", "Report\nBcc: x@y.co", "<p>report</p>")
+
+    # A row queued before enqueue() checked headers
+    bad_id = outbox.enqueue("user@example.com", "Report", "<p>report</p>")
+    with outbox._lock:
+        outbox._conn.execute("UPDATE email_outbox SET subject = ? WHERE id = ?", ("Report\nBcc: x@y.co", bad_id))
+        outbox._conn.commit()
+    good_id = outbox.enqueue("other@example.com", "Report", "<p>report</p>")
+
+    assert outbox.drain() == 2
+    assert outbox.status(bad_id)["status"] == "failed"
+    assert outbox.status(good_id)["status"] == "sent"
+    assert [recipients[0] for recipients in counter["delivered"]] == ["<other@example.com>"]
+    outbox.connection.close()
@@ -0,0 +1,95 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+import pytest
+import api.llm_cache as llm_cache
+from api.gemini_api import GeminiClient, GeminiError, TokenBucket, retry_after_seconds
+from gemini_stub_server import make_handler
+
+
+@pytest.fixture(autouse=True)
+def no_llm_cache(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MODE", "off")
+
+
+def start_stub(throttle_every: int, retry_after: float):
+    handler, counter = make_handler(latency_ms=0, throttle_every=throttle_every, retry_after=retry_after)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counter, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def throttling_stub():
+    """Every second request is answered with 429 and Retry-After: 0.3."""
+    server, counter, url = start_stub(throttle_every=2, retry_after=0.3)
+    yield counter, url
+    server.shutdown()
+
+
+def test_retry_after_honoured_and_shared_through_bucket(throttling_stub):
+    counter, url = throttling_stub
+    client = GeminiClient(api_key="test", endpoint=url, rpm=6000, burst=5, max_retries=3)
+
+    assert "Stub response" in client.generate("first")
+    started = time.monotonic()
+    assert "Stub response" in client.generate("second")  # 429 once, then retried
+    elapsed = time.monotonic() - started
+
+    assert counter["requests"] == 3
+    assert elapsed >= 0.3
+    # The pause emptied the bucket, so the delay is shared with every other caller
+    assert client.limiter._tokens < client.limiter.capacity
+
+
+def test_gives_up_after_max_retries():
+    server, counter, url = start_stub(throttle_every=1, retry_after=0.05)
+    try:
+        client = GeminiClient(api_key="test", endpoint=url, rpm=6000, burst=5, max_retries=2)
+        with pytest.raises(GeminiError, match="HTTP 429"):
+            client.generate("always throttled")
+        assert counter["requests"] == 3
+    finally:
+        server.shutdown()
+
+
+def test_retry_after_seconds_reads_header_then_body():
+    class Response:
+        def __init__(self, headers, body):
+            self.headers = headers
+            self._body = body
+
+        def json(self):
+            return self._body
+
+    assert retry_after_seconds(Response({"Retry-After": "7"}, {})) == 7.0
+    body = {"error": {"details": [{"retryDelay": "12s"}]}}
+    assert retry_after_seconds(Response({}, body)) == 12.0
+    assert retry_after_seconds(Response({}, {})) is None
+
+
+def test_token_bucket_limits_rate_after_burst():
+    bucket = TokenBucket(rate=20, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two tokens from the burst, two more at 20/s
+    assert time.monotonic() - started >= 0.09
+
+    bucket.pause(0.2)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.2
+
+
+def test_stub_responses_are_cached_apart_from_the_real_api(throttling_stub, tmp_path, monkeypatch):
+    counter, url = throttling_stub
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MODE", "read_through")
+    monkeypatch.setattr(llm_cache, "_cache", llm_cache.LLMCache(str(tmp_path / "llm_cache.sqlite")))
+    stub_client = GeminiClient(api_key="test", endpoint=url, rpm=6000, burst=5)
+    stub_client.generate("same prompt")
+    messages = [{"role": "user", "content": "same prompt"}]
+    cache = llm_cache.get_llm_cache()
+    assert cache.get(llm_cache.make_key("gemini", stub_client.model, messages, {"endpoint": url})) is not None
+    # What a client of the real endpoint would look up
+    assert cache.get(llm_cache.make_key("gemini", stub_client.model, messages)) is None
@@ -0,0 +1,72 @@
+import time
+import pytest
+from api.health_monitor import CircuitBreaker, CircuitOpen
+
+
+def fail_through(breaker):
+    with pytest.raises(RuntimeError):
+        with breaker.protect():
+            raise RuntimeError("dependency down")
+
+
+def test_breaker_opens_then_half_opens_then_closes():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.1)
+    fail_through(breaker)
+    assert breaker.state == "closed"
+    fail_through(breaker)
+    assert breaker.state == "open" and breaker.is_open
+
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    assert breaker.snapshot()["rejected"] == 1
+
+    time.sleep(0.15)
+    assert not breaker.is_open
+    with breaker.protect():
+        # The trial call is the only one let through while it runs
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpen):
+            breaker.before_call()
+    assert breaker.snapshot() == {"state": "closed", "consecutive_failures": 0, "rejected": 2}
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0.05)
+    fail_through(breaker)
+    time.sleep(0.1)
+    fail_through(breaker)
+    assert breaker.state == "open" and breaker.is_open
+
+
+def test_probe_success_only_reaches_half_open():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=60)
+    fail_through(breaker)
+    breaker.record_probe_success()
+    assert breaker.state == "half_open" and not breaker.is_open
+
+    # The next real call is the trial, and only its success closes the breaker
+    with breaker.protect():
+        pass
+    assert breaker.state == "closed"
+
+
+def test_probe_failure_leaves_trial_in_flight():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=60)
+    fail_through(breaker)
+    breaker.record_probe_success()
+    breaker.before_call()  # the trial starts
+
+    breaker.record_probe_failure()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()  # no second trial alongside the first
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_probe_failures_open_a_closed_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+    breaker.record_probe_failure()
+    assert breaker.state == "closed"
+    breaker.record_probe_failure()
+    assert breaker.state == "open" and breaker.is_open
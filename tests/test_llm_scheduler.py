@@ -0,0 +1,101 @@
+import threading
+import time
+import pytest
+import api.llm_scheduler as llm_scheduler
+from api.llm_scheduler import LLMScheduler, SchedulerOverloaded
+
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.005)
+
+
+def queue_waiter(scheduler, priority: str, outcomes: list):
+    """Start a thread that takes a slot at this priority, records it and gives the slot back."""
+    def run():
+        try:
+            with scheduler.slot(priority):
+                outcomes.append(priority)
+        except Exception as e:
+            outcomes.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    wait_until(lambda: scheduler.metrics()["queued"][priority] == 1)
+    return thread
+
+
+def test_waiters_are_served_by_priority_class():
+    scheduler = LLMScheduler("test", max_concurrency=1)
+    scheduler.acquire("interactive")
+    served = []
+    # Queued lowest class first, so arrival order alone would get it wrong
+    threads = [queue_waiter(scheduler, priority, served) for priority in ("background", "batch", "interactive")]
+
+    scheduler.release()
+    for thread in threads:
+        thread.join(2)
+
+    assert served == ["interactive", "batch", "background"]
+    assert scheduler.metrics()["active"] == 0
+
+
+def test_full_queue_rejects_with_retry_after():
+    scheduler = LLMScheduler("test", max_concurrency=1, max_queue=1)
+    scheduler.acquire("batch")
+    served = []
+    thread = queue_waiter(scheduler, "batch", served)
+
+    with pytest.raises(SchedulerOverloaded, match="queue is full") as excinfo:
+        scheduler.acquire("batch")
+    assert excinfo.value.retry_after >= 1
+    assert scheduler.is_saturated("batch")
+    # The limit is per class: an interactive call still gets in line
+    assert not scheduler.is_saturated("interactive")
+
+    scheduler.release()
+    thread.join(2)
+    assert served == ["batch"]
+    assert scheduler.metrics()["rejected"]["batch"] == 1
+
+
+def test_estimated_wait_over_class_limit_rejects(monkeypatch):
+    monkeypatch.setitem(llm_scheduler.MAX_WAIT_SECONDS, "interactive", 4.0)
+    scheduler = LLMScheduler("test", max_concurrency=1)
+    scheduler.acquire("batch")  # busy, and the initial service estimate is 5s
+
+    assert scheduler.estimated_wait("interactive") == llm_scheduler.INITIAL_SERVICE_SECONDS
+    assert scheduler.is_saturated("interactive")
+    with pytest.raises(SchedulerOverloaded, match="estimated wait") as excinfo:
+        scheduler.acquire("interactive")
+    assert excinfo.value.retry_after == 5
+    # Batch calls have no wait limit
+    assert not scheduler.is_saturated("batch")
+
+    metrics = scheduler.metrics()
+    assert metrics["rejected"]["interactive"] == 1
+    assert metrics["queued"]["interactive"] == 0
+
+
+def test_timed_out_waiter_is_removed_from_queue(monkeypatch):
+    # Accept the wait up front (0.05s estimate), then give up after twice the class limit
+    monkeypatch.setitem(llm_scheduler.MAX_WAIT_SECONDS, "interactive", 0.1)
+    scheduler = LLMScheduler("test", max_concurrency=1)
+    scheduler._service_ewma = 0.05
+    scheduler.acquire("batch")
+
+    started = time.monotonic()
+    with pytest.raises(SchedulerOverloaded, match="not granted"):
+        scheduler.acquire("interactive")
+    assert time.monotonic() - started >= 0.2
+
+    metrics = scheduler.metrics()
+    assert scheduler._waiters == []
+    assert metrics["queued"]["interactive"] == 0
+    assert metrics["rejected"]["interactive"] == 1
+    # The slot is not handed to the caller that already left
+    scheduler.release()
+    assert scheduler.metrics()["active"] == 0
+    scheduler.acquire("interactive")
+    assert scheduler.metrics()["active"] == 1
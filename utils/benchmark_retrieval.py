@@ -0,0 +1,423 @@
+import os
+import sys
+import re
+import json
+import math
+import time
+import argparse
+from collections import Counter, defaultdict
+from datetime import datetime
+import numpy as np
+
+# Add src directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from api.ollama_api import get_embedding, OLLAMA_MODEL
+from api.qdrant_api import init_qdrant, query_qdrant, search_params_for_profile, get_profile
+from config.collections import SOURCE_COLLECTION_MAP
+from corpus_store import load_chunks_table, load_embeddings, load_manifest
+from docstore import docstore_rows, get_docstore
+
+# ---------------------- Benchmark Settings ----------------------
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+CHUNKS_FILE = os.path.join(data_folder, "chunks_output.json")
+QUERIES_FILE = os.path.join(data_folder, "retrieval_queries.json")
+EMBEDDINGS_CACHE = os.path.join(data_folder, "benchmark_embeddings.npy")
+REPORT_FILE = "retrieval_benchmark.json"
+
+K_VALUES = (1, 3, 5, 10)
+RRF_K = 60  # Reciprocal rank fusion constant
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Each config is one row in the report. "backend" is either "local" (brute force over
+# the chunk file, no server needed) or "qdrant" (the live collections). Qdrant configs
+# either spell out search params or name a profile from config/collections.py. A profile
+# config only measures that profile when the collections were built with it
+# (utils/embed_documents.py --profile <name> --recreate); the layout is checked before the
+# config runs and a mismatch is reported as an error row, so profile configs are best run
+# one at a time (--configs) against collections rebuilt for each.
+DEFAULT_CONFIGS = [
+    {"name": "local-dense", "backend": "local"},
+    {"name": "local-int8-rescore", "backend": "local", "quantization": "int8", "oversampling": 2.0},
+    {"name": "local-hybrid", "backend": "local", "hybrid": True},
+    {"name": "local-mrl-512", "backend": "local", "mrl_dim": 512, "candidate_multiplier": 4},
+    {"name": "local-mrl-256", "backend": "local", "mrl_dim": 256, "candidate_multiplier": 4},
+    {"name": "local-mrl-128", "backend": "local", "mrl_dim": 128, "candidate_multiplier": 8},
+    {"name": "qdrant-exact", "backend": "qdrant", "exact": True},
+    {"name": "qdrant-hnsw-ef32", "backend": "qdrant", "hnsw_ef": 32},
+    {"name": "qdrant-hnsw-ef128", "backend": "qdrant", "hnsw_ef": 128},
+    {"name": "qdrant-quant-only", "backend": "qdrant", "quantization": {"ignore": False, "rescore": False}},
+    {"name": "qdrant-quant-rescore", "backend": "qdrant", "quantization": {"rescore": True, "oversampling": 2.0}},
+    {"name": "qdrant-hybrid", "backend": "qdrant", "hnsw_ef": 128, "hybrid": True},
+    {"name": "qdrant-profile-balanced", "backend": "qdrant", "profile": "balanced"},
+    {"name": "qdrant-profile-compact", "backend": "qdrant", "profile": "compact"},
+    {"name": "qdrant-profile-matryoshka", "backend": "qdrant", "profile": "matryoshka"},
+]
+BASELINE_CONFIG = "local-dense"  # recall retained and memory saved are reported relative to this
+
+# ---------------------- Loading ----------------------
+
+def load_chunks(path=CHUNKS_FILE):
+    """Load (text, metadata) pairs produced by chunk_documents.py."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_queries(path=QUERIES_FILE):
+    """
+    Load the labelled query set. Each entry looks like:
+    {"id": ..., "feature_name": ..., "feature_description": ...,
+     "expected": [{"source_file": "FL_Bill.pdf", "chunk_index": 790}, ...]}
+    chunk_index is the row of the chunk in chunks_output.json.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def canonical_indices(chunks):
+    """Map every row to the first row with identical text so duplicate chunks count once."""
+    first_row = {}
+    canonical = []
+    for i, (text, _) in enumerate(chunks):
+        canonical.append(first_row.setdefault(text.strip(), i))
+    return canonical, first_row
+
+def load_corpus_embeddings(chunks, cache_path=EMBEDDINGS_CACHE):
+    """
+    Embeddings for every chunk. Uses the columnar corpus sidecar when it was built from
+    the same chunks (utils/build_corpus.py), then a cached .npy matrix whose row count
+    still matches, and only then embeds everything through Ollama.
+    """
+    manifest = load_manifest()
+    if manifest and OLLAMA_MODEL in manifest["embeddings"] and manifest["num_rows"] == len(chunks):
+        corpus_ids = load_chunks_table().column("chunk_id").to_pylist()
+        if corpus_ids == [row[0] for row in docstore_rows(chunks)]:
+            return load_embeddings(OLLAMA_MODEL)
+        print("Ignoring corpus embeddings: corpus was built from a different chunk file")
+
+    if cache_path and os.path.exists(cache_path):
+        matrix = np.load(cache_path)
+        if matrix.shape[0] == len(chunks):
+            return matrix
+        print(f"Ignoring stale embedding cache {cache_path} ({matrix.shape[0]} rows, expected {len(chunks)})")
+
+    print(f"Embedding {len(chunks)} chunks through Ollama ...")
+    matrix = np.asarray([get_embedding(text) for text, _ in chunks], dtype=np.float32)
+    if cache_path:
+        np.save(cache_path, matrix)
+    return matrix
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+# ---------------------- Lexical Index ----------------------
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """Small in-memory BM25 index used for the lexical half of hybrid retrieval."""
+
+    def __init__(self, texts):
+        self.n_docs = len(texts)
+        self.postings = defaultdict(list)
+        self.doc_len = np.zeros(self.n_docs, dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.doc_len[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                self.postings[term].append((doc_id, tf))
+        self.avg_len = float(self.doc_len.mean()) if self.n_docs else 0.0
+
+    def search(self, query, limit):
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (self.n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[doc_id] / self.avg_len)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return top_indices(scores, limit)
+
+def top_indices(scores, limit):
+    """Indices of the highest scores, best first."""
+    limit = min(limit, len(scores))
+    if limit <= 0:
+        return []
+    candidates = np.argpartition(-scores, limit - 1)[:limit]
+    return candidates[np.argsort(-scores[candidates])].tolist()
+
+def reciprocal_rank_fusion(*rankings):
+    """Fuse several ranked lists of chunk rows into one ranking."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[row] += 1.0 / (RRF_K + rank + 1)
+    return [row for row, _ in sorted(fused.items(), key=lambda item: item[1], reverse=True)]
+
+# ---------------------- Backends ----------------------
+
+class LocalBackend:
+    """
+    Brute-force cosine search over the chunk embeddings. Optionally the first phase runs
+    over int8-quantized vectors or over Matryoshka-truncated vectors (mrl_dim), and the
+    candidates are rescored with the full vectors.
+    """
+
+    def __init__(self, matrix, config):
+        self.config = config
+        self.full = normalize_rows(matrix.astype(np.float32))
+        self.quantized = None
+        self.truncated = None
+        if config.get("quantization") == "int8":
+            self.scale = np.abs(self.full).max(axis=0) / 127.0
+            self.scale[self.scale == 0] = 1.0
+            self.quantized = np.round(self.full / self.scale).astype(np.int8)
+        elif config.get("mrl_dim"):
+            self.truncated = normalize_rows(self.full[:, :config["mrl_dim"]])
+
+    def index_bytes(self):
+        """Bytes scanned by the first phase; full vectors used for rescoring can stay on disk."""
+        if self.quantized is not None:
+            return int(self.quantized.nbytes + self.scale.nbytes)
+        if self.truncated is not None:
+            return int(self.truncated.nbytes)
+        return int(self.full.nbytes)
+
+    def search(self, query_vector, limit):
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32))
+        if self.quantized is not None:
+            # Score on int8 vectors, then rescore an oversampled candidate set with full vectors
+            candidates = top_indices(self.quantized @ (query * self.scale), int(limit * self.config.get("oversampling", 1.0)))
+        elif self.truncated is not None:
+            # Score on truncated vectors, then rescore limit * candidate_multiplier candidates at full dimension
+            head = normalize_rows(query[:self.config["mrl_dim"]])
+            candidates = top_indices(self.truncated @ head, limit * self.config.get("candidate_multiplier", 4))
+        else:
+            return top_indices(self.full @ query, limit)
+        exact = self.full[candidates] @ query
+        return [candidates[i] for i in np.argsort(-exact)[:limit]]
+
+def check_profile_layout(qdrant_client, profile):
+    """Raise ValueError unless every collection has the vector layout and quantization of the profile."""
+    from qdrant_client.http.models import ScalarQuantization, BinaryQuantization
+
+    settings = get_profile(profile)
+    expected_quantization = {"scalar": ScalarQuantization, "binary": BinaryQuantization}.get(settings.get("quantization"))
+    rebuild = f"rebuild with utils/embed_documents.py --profile {profile} --recreate"
+    for collection_name in SOURCE_COLLECTION_MAP.values():
+        info = qdrant_client.get_collection(collection_name)
+        named_vectors = isinstance(info.config.params.vectors, dict)
+        if named_vectors != bool(settings.get("matryoshka_dim")):
+            raise ValueError(f"{collection_name} does not have the vector layout of profile {profile}; {rebuild}")
+        if expected_quantization and not isinstance(info.config.quantization_config, expected_quantization):
+            raise ValueError(f"{collection_name} is not {settings['quantization']}-quantized as profile {profile} expects; {rebuild}")
+
+class QdrantBackend:
+    """
+    Search every collection in SOURCE_COLLECTION_MAP and merge hits by score. Hits are
+    matched to chunk rows by text: from the payload, or from the docstore for collections
+    built with embed_documents.py --no-text-payload (as fetch_texts does).
+    """
+
+    def __init__(self, qdrant_client, text_to_row, config):
+        from qdrant_client.http.models import SearchParams, QuantizationSearchParams
+
+        self.profile = config.get("profile")
+        if self.profile:
+            check_profile_layout(qdrant_client, self.profile)
+            self.search_params = search_params_for_profile(self.profile)
+        else:
+            quantization = config.get("quantization")
+            self.search_params = SearchParams(
+                hnsw_ef=config.get("hnsw_ef"),
+                exact=config.get("exact", False),
+                quantization=QuantizationSearchParams(**quantization) if quantization else None
+            )
+        self.qdrant_client = qdrant_client
+        self.text_to_row = text_to_row
+
+    def index_bytes(self):
+        return None
+
+    def search(self, query_vector, limit):
+        hits = []
+        for collection_name in SOURCE_COLLECTION_MAP.values():
+            hits.extend(query_qdrant(self.qdrant_client, query_vector, collection_name,
+                                     top_k=limit, search_params=self.search_params, profile=self.profile))
+        hits.sort(key=lambda doc: doc.score, reverse=True)
+        hits = hits[:limit]
+        texts = {str(doc.id): (doc.payload or {}).get("text", "") for doc in hits}
+        missing = [point_id for point_id, text in texts.items() if not text]
+        if missing:
+            texts.update({point_id: entry["text"] for point_id, entry in get_docstore().get_many(missing).items()})
+        return [self.text_to_row.get(texts[str(doc.id)].strip(), -1) for doc in hits]
+
+# ---------------------- Metrics ----------------------
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100.0
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def score_rankings(rankings, relevant_sets, relevant_sources, chunks):
+    """recall@k, MRR and top-1 source accuracy over all queries."""
+    max_k = max(K_VALUES)
+    metrics = {f"recall@{k}": 0.0 for k in K_VALUES}
+    metrics["mrr"] = 0.0
+    metrics["source_hit@1"] = 0.0
+    for ranking, relevant, sources in zip(rankings, relevant_sets, relevant_sources):
+        for k in K_VALUES:
+            metrics[f"recall@{k}"] += len(relevant & set(ranking[:k])) / len(relevant)
+        for rank, row in enumerate(ranking[:max_k], start=1):
+            if row in relevant:
+                metrics["mrr"] += 1.0 / rank
+                break
+        if ranking and ranking[0] >= 0 and chunks[ranking[0]][1].get("source_file") in sources:
+            metrics["source_hit@1"] += 1
+    return {name: round(value / len(rankings), 4) for name, value in metrics.items()}
+
+# ---------------------- Runner ----------------------
+
+def run_benchmark(configs, chunks_path=CHUNKS_FILE, queries_path=QUERIES_FILE, cache_path=EMBEDDINGS_CACHE,
+                  baseline=BASELINE_CONFIG):
+    chunks = load_chunks(chunks_path)
+    queries = load_queries(queries_path)
+    canonical, text_to_row = canonical_indices(chunks)
+    max_k = max(K_VALUES)
+
+    relevant_sets = [{canonical[e["chunk_index"]] for e in q["expected"]} for q in queries]
+    relevant_sources = [{e["source_file"] for e in q["expected"]} for q in queries]
+    query_texts = [f"{q['feature_name']}\n{q['feature_description']}" for q in queries]
+    # Query embeddings are shared by every config so only search time is measured
+    query_vectors = [get_embedding(text) for text in query_texts]
+
+    corpus_matrix = None
+    lexical_index = None
+    qdrant_client = None
+    results = []
+
+    for config in configs:
+        if config["backend"] == "local":
+            if corpus_matrix is None:
+                corpus_matrix = load_corpus_embeddings(chunks, cache_path)
+        elif config["backend"] == "qdrant":
+            if qdrant_client is None:
+                qdrant_client = init_qdrant()
+        else:
+            raise ValueError(f"Unknown backend in config {config['name']}: {config['backend']}")
+
+        if config.get("hybrid") and lexical_index is None:
+            lexical_index = BM25Index([text for text, _ in chunks])
+
+        rankings = []
+        latencies = []
+        try:
+            if config["backend"] == "local":
+                backend = LocalBackend(corpus_matrix, config)
+            else:
+                backend = QdrantBackend(qdrant_client, text_to_row, config)
+            for text, vector in zip(query_texts, query_vectors):
+                start = time.perf_counter()
+                if config.get("hybrid"):
+                    depth = max_k * 4
+                    ranking = reciprocal_rank_fusion(backend.search(vector, depth),
+                                                     lexical_index.search(text, depth))
+                else:
+                    ranking = backend.search(vector, max_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                rankings.append([canonical[row] if row >= 0 else -1 for row in ranking[:max_k]])
+        except Exception as e:
+            print(f"Config {config['name']} failed: {e}")
+            results.append({"config": config["name"], "settings": config, "error": str(e)})
+            continue
+
+        results.append({
+            "config": config["name"],
+            "settings": config,
+            **score_rankings(rankings, relevant_sets, relevant_sources, chunks),
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 3),
+                "p50": round(percentile(latencies, 50), 3),
+                "p95": round(percentile(latencies, 95), 3)
+            },
+            "index_bytes": backend.index_bytes()
+        })
+
+    compare_to_baseline(results, baseline)
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "baseline": baseline,
+        "chunks_file": os.path.basename(chunks_path),
+        "num_chunks": len(chunks),
+        "num_queries": len(queries),
+        "k_values": list(K_VALUES),
+        "results": results
+    }
+
+def compare_to_baseline(results, baseline_name):
+    """Add recall retained and memory saved relative to the baseline config, when it ran."""
+    baseline = next((r for r in results if r["config"] == baseline_name and "error" not in r), None)
+    if baseline is None:
+        return
+    recall_key = f"recall@{max(K_VALUES)}"
+    for row in results:
+        if "error" in row:
+            continue
+        row["vs_baseline"] = {
+            "recall_retained": round(row[recall_key] / baseline[recall_key], 4) if baseline[recall_key] else None,
+            "memory_saved": round(1 - row["index_bytes"] / baseline["index_bytes"], 4) if row["index_bytes"] else None
+        }
+
+def format_table(report):
+    columns = [f"recall@{k}" for k in report["k_values"]] + ["mrr", "source_hit@1"]
+    header = (f"{'config':<26}" + "".join(f"{c:>14}" for c in columns)
+              + f"{'p50 ms':>10}{'p95 ms':>10}{'index MB':>10}{'kept':>8}{'saved':>8}")
+    lines = [header, "-" * len(header)]
+    for row in report["results"]:
+        if "error" in row:
+            lines.append(f"{row['config']:<26}  error: {row['error']}")
+            continue
+        size = f"{row['index_bytes'] / 1e6:.1f}" if row["index_bytes"] else "-"
+        versus = row.get("vs_baseline", {})
+        kept = f"{versus['recall_retained']:.0%}" if versus.get("recall_retained") is not None else "-"
+        saved = f"{versus['memory_saved']:.0%}" if versus.get("memory_saved") is not None else "-"
+        lines.append(
+            f"{row['config']:<26}" + "".join(f"{row[c]:>14.3f}" for c in columns)
+            + f"{row['latency_ms']['p50']:>10.2f}{row['latency_ms']['p95']:>10.2f}{size:>10}{kept:>8}{saved:>8}"
+        )
+    return "\n".join(lines)
+
+# ---------------------- Main ----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality vs latency over the regulation corpus.")
+    parser.add_argument("--chunks", default=CHUNKS_FILE, help="chunk file produced by chunk_documents.py")
+    parser.add_argument("--queries", default=QUERIES_FILE, help="labelled query set")
+    parser.add_argument("--configs", help="JSON file with a list of configs (defaults to DEFAULT_CONFIGS)")
+    parser.add_argument("--backend", choices=["local", "qdrant"], help="only run configs for this backend")
+    parser.add_argument("--embeddings-cache", default=EMBEDDINGS_CACHE, help="cached corpus embeddings (.npy)")
+    parser.add_argument("--output", default=REPORT_FILE, help="where to write the JSON report")
+    parser.add_argument("--baseline", default=BASELINE_CONFIG, help="config that recall retained / memory saved are measured against")
+    args = parser.parse_args()
+
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs, "r", encoding="utf-8") as f:
+            configs = json.load(f)
+    if args.backend:
+        configs = [c for c in configs if c["backend"] == args.backend]
+
+    report = run_benchmark(configs, args.chunks, args.queries, args.embeddings_cache, args.baseline)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(format_table(report))
+    print(f"\nSaved report to {args.output}")
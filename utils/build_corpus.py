@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# Add src directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from api.ollama_api import get_embedding, OLLAMA_MODEL
+from corpus_store import CORPUS_DIR, write_corpus, write_embeddings
+
+# ---------------------- Build Corpus ----------------------
+# Converts chunks_output.json into the versioned columnar corpus (see src/corpus_store.py)
+# and embeds every chunk once, so re-indexing and benchmarks can reuse the vectors.
+data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+chunks_file = os.path.join(data_folder, "chunks_output.json")
+
+parser = argparse.ArgumentParser(description="Build the columnar corpus and its embedding sidecar.")
+parser.add_argument("--chunks", default=chunks_file, help="chunk file produced by chunk_documents.py")
+parser.add_argument("--corpus-dir", default=CORPUS_DIR, help="corpus version directory to write")
+parser.add_argument("--dtype", default="float16", choices=["float16", "float32"], help="embedding storage type")
+parser.add_argument("--skip-embeddings", action="store_true", help="only write the chunk file")
+args = parser.parse_args()
+
+with open(args.chunks, "r", encoding="utf-8") as f:
+    chunks = json.load(f)
+
+manifest = write_corpus(chunks, args.corpus_dir, source=os.path.basename(args.chunks))
+print(f"Wrote {manifest['num_rows']} chunks to {args.corpus_dir}")
+
+if not args.skip_embeddings:
+    start = time.time()
+    embeddings = []
+    for i, (chunk_text, _) in enumerate(chunks, start=1):
+        embeddings.append(get_embedding(chunk_text))
+        if i % 100 == 0:
+            print(f"Embedded {i}/{len(chunks)} chunks")
+    manifest = write_embeddings(np.asarray(embeddings, dtype=np.float32), OLLAMA_MODEL, args.corpus_dir, dtype=args.dtype)
+    entry = manifest["embeddings"][OLLAMA_MODEL]
+    print(f"Saved {OLLAMA_MODEL} embeddings ({entry['dim']}-d {entry['dtype']}) in {time.time() - start:.1f}s")
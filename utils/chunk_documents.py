@@ -1,9 +1,19 @@
 import os
 import re
+import sys
 import fitz  # PyMuPDF
 from pdf2image import convert_from_path
 import pytesseract
 import json
+from near_duplicates import deduplicate_chunks, format_report
+
+# Add src directory to path for the shared chunk id
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from docstore import chunk_id
+
+# Chunks are kept small for precise search; at query time a hit is expanded to its
+# parent (the paragraph or numbered section it was cut from) or its neighbours.
+CHILD_CHUNK_SIZE = 400
 
 # ---------------------- Helper Functions ----------------------
 
@@ -48,24 +58,29 @@ def split_numbered_clauses(text):
     return clauses
 
 def split_paragraphs(text, max_chunk_size=800):
-    """Regular paragraph splitting with optional max chunk size."""
+    """
+    Regular paragraph splitting with optional max chunk size.
+    Returns (chunk, paragraph index) pairs; chunks of one paragraph share its index.
+    """
     lines = text.split("\n")
     paragraphs = []
     current_para = []
+    paragraph_index = 0
 
     for line in lines:
         line = line.strip()
         if not line:
             if current_para:
                 paragraph_text = " ".join(current_para)
-                paragraphs.extend(split_long_paragraph(paragraph_text, max_chunk_size))
+                paragraphs.extend((chunk, paragraph_index) for chunk in split_long_paragraph(paragraph_text, max_chunk_size))
+                paragraph_index += 1
                 current_para = []
         else:
             current_para.append(line)
 
     if current_para:
         paragraph_text = " ".join(current_para)
-        paragraphs.extend(split_long_paragraph(paragraph_text, max_chunk_size))
+        paragraphs.extend((chunk, paragraph_index) for chunk in split_long_paragraph(paragraph_text, max_chunk_size))
 
     return paragraphs
 
@@ -79,18 +94,28 @@ def split_long_paragraph(paragraph, max_chunk_size):
         if len(current_chunk) + len(sentence) + 1 <= max_chunk_size:
             current_chunk += " " + sentence if current_chunk else sentence
         else:
-            chunks.append(current_chunk)
+            if current_chunk:
+                chunks.append(current_chunk)
             current_chunk = sentence
     if current_chunk:
         chunks.append(current_chunk)
     return chunks
 
 def assign_metadata(paragraphs_or_clauses, source_file, numbered=False):
-    """Assign metadata to each paragraph or clause."""
+    """
+    Assign metadata to each (text, heading, parent index) chunk: its stable chunk id,
+    position in document order, and the id of the parent paragraph/section it was cut from.
+    """
     enriched = []
 
-    for text, heading in paragraphs_or_clauses:
-        metadata = {"source_file": source_file}
+    for position, (text, heading, parent_index) in enumerate(paragraphs_or_clauses):
+        parent_id = f"{source_file}#s{parent_index}"
+        metadata = {
+            "source_file": source_file,
+            "chunk_id": chunk_id(source_file, text, position, parent_id),
+            "position": position,
+            "parent_id": parent_id
+        }
         if numbered and heading:
             metadata["section_heading"] = heading
             sec_match = re.match(r"(\d{2,3}-\d{2,3}-\d{3})", heading)
@@ -114,7 +139,9 @@ for filename in os.listdir(file_path):
         if filename.lower() == "utah_regulation_act.pdf":
             # OCR + numbered clause splitting
             text = ocr_pdf(file_full_path)
-            chunks = split_numbered_clauses(text)
+            chunks = [(piece, heading, section_index)
+                      for section_index, (section_text, heading) in enumerate(split_numbered_clauses(text))
+                      for piece in split_long_paragraph(section_text, CHILD_CHUNK_SIZE)]
             enriched_chunks = assign_metadata(chunks, filename, numbered=True)
         else:
             # Regular PDF extraction + paragraph splitting
@@ -122,9 +149,9 @@ for filename in os.listdir(file_path):
             text = ""
             for page in doc:
                 text += page.get_text("text")
-            paragraphs = [(p, None) for p in split_paragraphs(text)]
+            paragraphs = [(p, None, parent) for p, parent in split_paragraphs(text, CHILD_CHUNK_SIZE)]
             enriched_chunks = assign_metadata(paragraphs, filename, numbered=False)
-            all_chunks.extend(enriched_chunks)
+        all_chunks.extend(enriched_chunks)
 
         # print(f"Total chunks: {len(enriched_chunks)}")
         # # Inspect first few chunks
@@ -133,6 +160,10 @@ for filename in os.listdir(file_path):
         #     print(chunk_text[:1000], "...")
         #     print("Metadata:", meta)
 
+# Collapse repeated headers, recitals and definitions into one canonical chunk each
+all_chunks, dedup_report = deduplicate_chunks(all_chunks)
+print(format_report(dedup_report))
+
 # Save all chunks to a JSON file
 with open(output_file, "w", encoding="utf-8") as f:
     json.dump(all_chunks, f, indent=2, ensure_ascii=False)
\ No newline at end of file
@@ -1,29 +1,61 @@
 import json
+import argparse
 import requests
-from api.qdrant_api import init_qdrant
-from api.ollama_api import get_embedding
-from qdrant_client.http.models import PointStruct, VectorParams
-from config.collections import SOURCE_COLLECTION_MAP
+from api.qdrant_api import init_qdrant, create_collection, point_vector
+from api.ollama_api import get_embedding, OLLAMA_MODEL
+from qdrant_client.http.models import PointStruct, PayloadSchemaType
+from config.collections import SOURCE_COLLECTION_MAP, COLLECTION_PROFILES, DEFAULT_COLLECTION_PROFILE
+from docstore import get_docstore, docstore_rows
+from corpus_store import load_chunks, load_embeddings
+from router import build_centroids, ROUTER_PATH, SECTION_FIELD
 import os
-import uuid
 
 EMBED_DIM = 1024  # Must match your Ollama embedding model output dimension
 
+parser = argparse.ArgumentParser(description="Embed chunks_output.json and upload it to Qdrant.")
+parser.add_argument("--profile", default=DEFAULT_COLLECTION_PROFILE, choices=list(COLLECTION_PROFILES),
+                    help="collection layout (HNSW, quantization, on-disk storage) from config/collections.py")
+parser.add_argument("--recreate", action="store_true",
+                    help="drop and recreate existing collections so the profile takes effect")
+parser.add_argument("--no-text-payload", action="store_true",
+                    help="store chunk text only in the local docstore, not in Qdrant payloads")
+parser.add_argument("--from-corpus", action="store_true",
+                    help="read chunks and stored embeddings from the columnar corpus instead of re-embedding")
+args = parser.parse_args()
+
 # ---------------------- Load Chunks ----------------------
 # with open("chunks_output.json", "r", encoding="utf-8") as f:
 #     chunks = json.load(f)  # Expecting a list of (chunk_text, metadata) tuples
 data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
 chunks_file = os.path.join(data_folder, "chunks_output.json")
 
-with open(chunks_file, "r", encoding="utf-8") as f:
-    chunks = json.load(f) 
+corpus_embeddings = None
+if args.from_corpus:
+    # Built by utils/build_corpus.py; rows are aligned with the embedding matrix
+    chunks = load_chunks()
+    corpus_embeddings = load_embeddings(OLLAMA_MODEL)
+    if corpus_embeddings is None:
+        print(f"No stored {OLLAMA_MODEL} embeddings in the corpus, embedding through Ollama")
+else:
+    with open(chunks_file, "r", encoding="utf-8") as f:
+        chunks = json.load(f) 
+
+# ---------------------- Fill Docstore ----------------------
+# Chunk texts live in the local docstore keyed by deterministic chunk id,
+# which is also the Qdrant point id
+rows = docstore_rows(chunks)
+docstore = get_docstore()
+docstore.put_many(rows)
+print(f"Docstore at {docstore.path} holds {docstore.count()} chunks")
 
 # ---------------------- Upload Chunks ----------------------
 qdrant_client = init_qdrant()
 # Keep track of collections already created in this run
 created_collections = set()
+# Uploaded vectors, for the router centroids
+routed_collections, routed_sections, routed_embeddings = [], [], []
 
-for chunk_text, meta in chunks:
+for row_index, (chunk_id, _, _, chunk_text, meta) in enumerate(rows):
     source_file = meta.get("source_file", "").lower()
     collection_name = SOURCE_COLLECTION_MAP.get(source_file)
 
@@ -34,29 +66,48 @@ for chunk_text, meta in chunks:
     # 1. Create collection if it doesn't exist
     if collection_name not in created_collections:
         existing_collections = [c.name for c in qdrant_client.get_collections().collections]
+        if collection_name in existing_collections and args.recreate:
+            qdrant_client.delete_collection(collection_name=collection_name)
+            existing_collections.remove(collection_name)
+            print(f"Dropped collection: {collection_name}")
         if collection_name not in existing_collections:
-            qdrant_client.create_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(size=EMBED_DIM, distance="Cosine")
-            )
-            print(f"Created collection: {collection_name}")
+            create_collection(qdrant_client, collection_name, EMBED_DIM, profile=args.profile)
+            # Routed searches filter on the section number
+            qdrant_client.create_payload_index(collection_name, f"metadata.{SECTION_FIELD}", PayloadSchemaType.KEYWORD)
+            print(f"Created collection: {collection_name} (profile: {args.profile})")
         created_collections.add(collection_name)
 
     try:
-        # 2. Get embedding from Ollama
-        embedding = get_embedding(chunk_text)
+        # 2. Get embedding from the corpus sidecar, or from Ollama
+        if corpus_embeddings is not None:
+            embedding = corpus_embeddings[row_index].astype("float32").tolist()
+        else:
+            embedding = get_embedding(chunk_text)
 
         # 3. Prepare payload
         payload = {
             "text": chunk_text,  # actual chunk text
             "metadata": meta     # metadata dictionary
         }
+        if args.no_text_payload:
+            del payload["text"]
 
         # 4. Upsert to Qdrant
-        point = PointStruct(id=str(uuid.uuid4()), vector=embedding, payload=payload)
+        point = PointStruct(id=chunk_id, vector=point_vector(embedding, args.profile), payload=payload)
         qdrant_client.upsert(collection_name=collection_name, points=[point])
 
+        routed_collections.append(collection_name)
+        routed_sections.append(meta.get(SECTION_FIELD))
+        routed_embeddings.append(embedding)
+
         print(f"Uploaded chunk to {collection_name}: {meta.get('section_heading', '')}")
 
     except Exception as e:
         print(f"Error uploading chunk from {source_file}: {e}")
+
+# ---------------------- Rebuild Router Centroids ----------------------
+# Their created_at also stamps this ingestion: it is part of the analysis cache version,
+# so cached analyses from before a re-index are not served afterwards
+if routed_embeddings:
+    summary = build_centroids(routed_collections, routed_sections, routed_embeddings, model=OLLAMA_MODEL)
+    print(f"Router centroids for {summary['collections']} collections and {summary['sections']} sections saved to {ROUTER_PATH}")
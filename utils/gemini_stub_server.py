@@ -0,0 +1,78 @@
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------------- Gemini Stub Server ----------------------
+# Minimal stand-in for the Gemini generateContent endpoint, for exercising the
+# reward pipeline's concurrency, rate limiting and retry handling offline:
+#
+#   python utils/gemini_stub_server.py --port 8089 --latency-ms 800 --throttle-every 5
+#   GEMINI_API_ENDPOINT=http://127.0.0.1:8089 python rl/batch_runner.py reward features.xlsx out.csv
+
+STUB_RESPONSE = {
+    "classification": "Maybe",
+    "reasoning": "Stub response from the local Gemini test server.",
+    "related_regulation": "None"
+}
+
+
+def make_handler(latency_ms: int, throttle_every: int, retry_after: float):
+    counter = {"requests": 0}
+    lock = threading.Lock()
+
+    class GeminiStubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            with lock:
+                counter["requests"] += 1
+                count = counter["requests"]
+
+            if not self.path.split("?")[0].endswith(":generateContent"):
+                self._send(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+                return
+            if throttle_every and count % throttle_every == 0:
+                body = {"error": {
+                    "code": 429,
+                    "status": "RESOURCE_EXHAUSTED",
+                    "message": "Stub quota exceeded",
+                    "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_after}s"}]
+                }}
+                self._send(429, body, {"Retry-After": str(retry_after)})
+                return
+
+            time.sleep(latency_ms / 1000)
+            text = "```json\n" + json.dumps(STUB_RESPONSE) + "\n```"
+            self._send(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]})
+
+        def _send(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return GeminiStubHandler, counter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the Gemini generateContent endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=int, default=500, help="delay before each successful response")
+    parser.add_argument("--throttle-every", type=int, default=0, help="answer every Nth request with HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="seconds advertised on throttled responses")
+    args = parser.parse_args()
+
+    handler, _ = make_handler(args.latency_ms, args.throttle_every, args.retry_after)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Gemini stub listening on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,136 @@
+import os
+import re
+import sys
+import json
+import zlib
+import argparse
+from collections import Counter
+import numpy as np
+
+# ---------------------- Near-Duplicate Settings ----------------------
+# MinHash signatures over word shingles, bucketed with LSH so each chunk is only compared
+# with the few chunks sharing a band. 16 bands x 8 rows make chunks with Jaccard similarity
+# above ~0.7 likely candidates; candidates are kept as duplicates at DEDUP_THRESHOLD.
+NUM_PERM = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Fixed seed: signatures (and so dedup results) are reproducible across runs
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 29, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 29, size=NUM_PERM).astype(np.uint64)
+
+WORD_RE = re.compile(r"\w+")
+
+# ---------------------- MinHash ----------------------
+
+def shingles(text: str) -> set:
+    """Lowercased word n-grams, so layout, punctuation and case differences do not matter."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash_signature(text: str) -> np.ndarray:
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text)), dtype=np.uint64)
+    # (a * h + b) mod p for every permutation at once; a, b < 2^29 and h < 2^32 keep it in 64 bits
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % MERSENNE_PRIME & MAX_HASH
+    return permuted.min(axis=0)
+
+def estimated_jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+# ---------------------- Deduplication ----------------------
+
+def deduplicate_chunks(chunks, threshold: float = DEDUP_THRESHOLD):
+    """
+    Collapse near-duplicate (text, metadata) chunks within each source file.
+    The first occurrence is kept as the canonical chunk and its metadata gains
+    duplicate_locations: [{"source_file", "chunk_index"}] for every chunk folded into it,
+    chunk_index being the dropped chunk's position (document order) in its file.
+    Returns (deduplicated chunks, report).
+    """
+    kept = []
+    buckets = {}          # (source_file, band, band hash) -> indices into kept
+    signatures = []       # signature of each kept chunk
+    positions = Counter()
+    removed = Counter()
+    totals = Counter()
+
+    for text, meta in chunks:
+        source_file = meta.get("source_file", "")
+        chunk_index = meta.get("position", positions[source_file])
+        positions[source_file] += 1
+        totals[source_file] += 1
+
+        signature = minhash_signature(text)
+        band_keys = [(source_file, band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+                     for band in range(BANDS)]
+
+        best, best_score = None, threshold
+        for key in band_keys:
+            for candidate in buckets.get(key, ()):
+                score = estimated_jaccard(signature, signatures[candidate])
+                if score >= best_score:
+                    best, best_score = candidate, score
+        if best is not None:
+            kept[best][1].setdefault("duplicate_locations", []).append(
+                {"source_file": source_file, "chunk_index": chunk_index}
+            )
+            removed[source_file] += 1
+            continue
+
+        kept.append((text, dict(meta)))
+        signatures.append(signature)
+        for key in band_keys:
+            buckets.setdefault(key, []).append(len(kept) - 1)
+
+    total = sum(totals.values())
+    report = {
+        "total_chunks": total,
+        "unique_chunks": len(kept),
+        "duplicates_removed": total - len(kept),
+        "dedup_ratio": round((total - len(kept)) / total, 4) if total else 0.0,
+        "threshold": threshold,
+        "by_source": {
+            source: {"total": totals[source], "removed": removed[source],
+                     "dedup_ratio": round(removed[source] / totals[source], 4)}
+            for source in totals
+        }
+    }
+    return kept, report
+
+def format_report(report: dict) -> str:
+    lines = [f"Near-duplicate chunks: {report['duplicates_removed']} of {report['total_chunks']} removed "
+             f"(dedup ratio {report['dedup_ratio']:.1%}, Jaccard >= {report['threshold']})"]
+    for source, stats in sorted(report["by_source"].items()):
+        lines.append(f"  {source}: {stats['removed']}/{stats['total']} ({stats['dedup_ratio']:.1%})")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Deduplicate an existing chunk file without re-running OCR/extraction
+    data_folder = os.path.join(os.path.dirname(__file__), "..", "data")
+    parser = argparse.ArgumentParser(description="Collapse near-duplicate chunks in a chunk file.")
+    parser.add_argument("--chunks", default=os.path.join(data_folder, "chunks_output.json"), help="input chunk file")
+    parser.add_argument("--output", help="output chunk file (default: overwrite the input)")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD, help="estimated Jaccard to count as duplicate")
+    parser.add_argument("--report", help="also write the dedup report as JSON here")
+    args = parser.parse_args()
+
+    with open(args.chunks, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    if any("duplicate_locations" in meta for _, meta in chunks):
+        sys.exit(f"{args.chunks} has already been deduplicated")
+
+    deduplicated, report = deduplicate_chunks(chunks, args.threshold)
+    with open(args.output or args.chunks, "w", encoding="utf-8") as f:
+        json.dump(deduplicated, f, indent=2, ensure_ascii=False)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(format_report(report))
@@ -0,0 +1,85 @@
+import argparse
+import threading
+import socketserver
+
+# ---------------------- SMTP Stub Server ----------------------
+# Minimal plain-text SMTP stand-in for exercising the email outbox offline: accepts
+# every message, counts connections and deliveries (and records the recipients of each
+# accepted message), and can answer every Nth message
+# with a temporary 451 to exercise retries:
+#
+#   python utils/smtp_stub_server.py --port 8025 --fail-every 4
+#   SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=false python src/app.py
+
+
+def make_handler(fail_every: int, verbose: bool):
+    counter = {"connections": 0, "messages": 0, "delivered": []}
+    lock = threading.Lock()
+
+    class SMTPStubHandler(socketserver.StreamRequestHandler):
+        def reply(self, line: str):
+            self.wfile.write((line + "\r\n").encode("utf-8"))
+
+        def handle(self):
+            with lock:
+                counter["connections"] += 1
+                connection = counter["connections"]
+            self.reply("220 smtp-stub ready")
+            recipients = []
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode("utf-8", "replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb in ("EHLO", "HELO"):
+                    self.reply("250 smtp-stub")
+                elif verb == "MAIL":
+                    recipients = []
+                    self.reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[-1].strip())
+                    self.reply("250 OK")
+                elif verb == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                        pass
+                    with lock:
+                        counter["messages"] += 1
+                        count = counter["messages"]
+                    if fail_every and count % fail_every == 0:
+                        self.reply("451 Stub temporary failure")
+                        continue
+                    with lock:
+                        counter["delivered"].append(list(recipients))
+                    if verbose:
+                        print(f"connection {connection}: message {count} to {', '.join(recipients)}")
+                    self.reply("250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    self.reply("250 OK")
+                elif verb == "QUIT":
+                    self.reply("221 Bye")
+                    return
+                else:
+                    self.reply("502 Command not implemented")
+
+    return SMTPStubHandler, counter
+
+
+class ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in for the email outbox.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every Nth message with 451")
+    parser.add_argument("--quiet", action="store_true", help="do not print each delivery")
+    args = parser.parse_args()
+
+    handler, _ = make_handler(args.fail_every, not args.quiet)
+    server = ThreadingSMTPServer((args.host, args.port), handler)
+    print(f"SMTP stub listening on {args.host}:{args.port}")
+    server.serve_forever()